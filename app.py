@@ -9,6 +9,8 @@ from PIL import Image
 import base64
 from io import BytesIO
 
+from core.face_detectors import create_face_detector, detect_downscaled
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'vercel-deployment-key')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
@@ -97,6 +99,17 @@ def home():
     </html>
     """
 
+_face_detector = None
+
+
+def get_face_detector():
+    """Face detector selected by FACE_DETECTOR, built once per process"""
+    global _face_detector
+    if _face_detector is None:
+        _face_detector = create_face_detector()
+    return _face_detector
+
+
 @app.route('/api/detect', methods=['POST'])
 def detect_faces():
     """Simple face detection API endpoint"""
@@ -118,10 +131,8 @@ def detect_faces():
         else:
             image_bgr = image_array
         
-        # Simple face detection using OpenCV
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+        # Simple face detection using OpenCV, on a copy downscaled to DETECTION_WIDTH
+        faces = detect_downscaled(get_face_detector(), image_bgr)
         
         # Draw rectangles around faces
         for (x, y, w, h) in faces:
@@ -29,6 +29,11 @@ def create_app(config_name=None):
     app.register_blueprint(main_bp)
     app.register_blueprint(errors_bp)
     app.register_blueprint(api_bp)
+
+    # Load and warm the model off the request path; /api/v1/ready reports progress
+    if app.config.get('WARMUP_ON_START'):
+        from core.engine import get_engine
+        get_engine().start_warmup()
     
     return app
 
@@ -4,8 +4,9 @@ API routes for health checks and monitoring
 import psutil
 import time
 from datetime import datetime, timezone
-from flask import jsonify, current_app, Response
+from flask import jsonify, current_app, request, Response
 from app.api import api_bp
+from app.streaming import request_stream, requires_ready_engine
 from core.logger import get_logger
 
 logger = get_logger(__name__)
@@ -20,6 +21,28 @@ def health_check():
         'service': 'mask-detection-system'
     })
 
+@api_bp.route('/ready')
+def readiness_check():
+    """Readiness probe: 200 once the model is loaded and warmed, 503 before or if it could not load"""
+    from core.engine import get_engine
+    engine = get_engine()
+    # Starts warm-up on instances created without WARMUP_ON_START; no-op otherwise
+    engine.start_warmup()
+
+    body = {
+        'status': engine.readiness,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'model': engine.status,
+    }
+    if engine.load_error:
+        body['error'] = engine.load_error
+    if not engine.is_ready:
+        response = jsonify(body)
+        response.status_code = 503
+        response.headers['Retry-After'] = str(current_app.config.get('READY_RETRY_AFTER', 5))
+        return response
+    return jsonify(body)
+
 @api_bp.route('/health/detailed')
 def detailed_health_check():
     """Detailed health check with system metrics"""
@@ -29,9 +52,9 @@ def detailed_health_check():
         memory = psutil.virtual_memory()
         disk = psutil.disk_usage('/')
         
-        # Check model availability
-        from core.video_detector import model
-        model_status = 'loaded' if model is not None else 'fallback'
+        # Check model availability (does not force a load)
+        from core.engine import get_engine
+        engine = get_engine()
         
         return jsonify({
             'status': 'healthy',
@@ -52,8 +75,11 @@ def detailed_health_check():
                 }
             },
             'model': {
-                'status': model_status,
-                'path': str(current_app.config.get('MODEL_PATH', 'N/A'))
+                'status': engine.status,
+                'readiness': engine.readiness,
+                'path': str(current_app.config.get('MODEL_PATH', 'N/A')),
+                'error': engine.load_error,
+                'batching': engine.stats().get('batching')
             }
         })
     except Exception as e:
@@ -64,6 +90,98 @@ def detailed_health_check():
             'error': str(e)
         }), 500
 
+def _prometheus_lines(prefix, stats, spec):
+    """Render ``stats[key]`` for each ``(key, type, help)`` in ``spec`` as Prometheus text"""
+    lines = []
+    for key, kind, help_text in spec:
+        name = f"{prefix}_{key}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {stats[key]}")
+    return lines
+
+
+def _engine_metrics():
+    """Prometheus lines for the inference engine and caches (empty until they are used)"""
+    from core.cache import get_result_cache
+    from core.broadcast import broadcast_stats
+    from core.capture import capture_stats
+    from core.encoding import encoding_stats
+    from core.engine import get_engine
+    from core.pipeline import pipeline_stats
+
+    stats = get_engine().stats()
+    lines = []
+    batching = stats.get('batching')
+    if batching:
+        lines += _prometheus_lines('mask_batch', batching, (
+            ('queue_depth', 'gauge', 'Faces waiting for a batched forward pass'),
+            ('max_queue_depth', 'gauge', 'Highest observed batch queue depth in faces'),
+            ('batches', 'counter', 'Batched forward passes run'),
+            ('faces', 'counter', 'Faces classified through the batcher'),
+            ('requests', 'counter', 'Classification requests served by the batcher'),
+            ('avg_batch_size', 'gauge', 'Average faces per batched forward pass'),
+            ('max_batch_size', 'gauge', 'Configured maximum faces per batch'),
+            ('max_wait_ms', 'gauge', 'Configured maximum batch collection window'),
+        ))
+
+    prediction_cache = stats.get('prediction_cache')
+    if prediction_cache:
+        lines += _prometheus_lines('mask_prediction_cache', prediction_cache, (
+            ('hits', 'counter', 'Face crops that reused a cached prediction'),
+            ('misses', 'counter', 'Face crops sent to the classifier'),
+            ('hit_rate', 'gauge', 'Fraction of face crops served from the prediction cache'),
+            ('entries', 'gauge', 'Live prediction cache entries'),
+        ))
+
+    lines += _prometheus_lines('mask_capture_frames', capture_stats(), (
+        ('captured', 'counter', 'Video frames read from capture devices and files'),
+        ('delivered', 'counter', 'Video frames handed to the detection pipeline'),
+        ('dropped', 'counter', 'Stale video frames dropped in latest-frame mode'),
+    ))
+
+    lines += _prometheus_lines('mask_pipeline', pipeline_stats(), (
+        ('streams', 'gauge', 'Video feed pipelines running'),
+        ('detect_queue_depth', 'gauge', 'Captured frames waiting for face detection'),
+        ('classify_queue_depth', 'gauge', 'Frames with located faces waiting for classification'),
+        ('encode_queue_depth', 'gauge', 'Classified frames waiting for JPEG encoding'),
+        ('output_queue_depth', 'gauge', 'Encoded frames waiting to be sent to the client'),
+        ('detect', 'counter', 'Frames through the detect stage'),
+        ('classify', 'counter', 'Frames through the classify stage'),
+        ('encode', 'counter', 'Frames through the encode stage'),
+        ('detect_seconds', 'counter', 'Time spent in the detect stage'),
+        ('classify_seconds', 'counter', 'Time spent in the classify stage'),
+        ('encode_seconds', 'counter', 'Time spent in the encode stage'),
+    ))
+
+    lines += _prometheus_lines('mask_stream_frames', encoding_stats(), (
+        ('encoded', 'counter', 'Video feed frames encoded to JPEG'),
+        ('throttled', 'counter', 'Video feed frames skipped by a viewer max_fps'),
+        ('unchanged', 'counter', 'Video feed frames skipped as identical to the previous output'),
+    ))
+
+    lines += _prometheus_lines('mask_broadcast', broadcast_stats(), (
+        ('broadcasters', 'gauge', 'Shared camera streams running'),
+        ('subscribers', 'gauge', 'Viewers attached to shared camera streams'),
+        ('frames', 'counter', 'Frames produced by shared camera streams'),
+        ('delivered', 'counter', 'Shared frames sent to viewers'),
+        ('dropped', 'counter', 'Shared frames dropped for viewers that fell behind'),
+    ))
+
+    cache = get_result_cache()
+    if cache is not None:
+        lines += _prometheus_lines('mask_result_cache', cache.stats(), (
+            ('hits', 'counter', 'Image results served from memory'),
+            ('disk_hits', 'counter', 'Image results served from the disk tier'),
+            ('misses', 'counter', 'Image results computed'),
+            ('coalesced', 'counter', 'Requests that waited on an identical in-flight upload'),
+            ('evictions', 'counter', 'Entries evicted from memory or disk'),
+            ('entries', 'gauge', 'Entries held in memory'),
+            ('bytes', 'gauge', 'Bytes held in memory'),
+        ))
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
 @api_bp.route('/metrics')
 def metrics():
     """Prometheus-style metrics endpoint"""
@@ -83,7 +201,32 @@ memory_usage_percent {memory.percent}
 # TYPE memory_available_bytes gauge
 memory_available_bytes {memory.available}
 """
+        metrics_text += _engine_metrics()
         return Response(metrics_text, status=200, content_type='text/plain; charset=utf-8')
     except Exception as e:
         logger.error(f"Metrics collection failed: {e}")
-        return Response("# Metrics collection failed", status=500, content_type='text/plain; charset=utf-8')
\ No newline at end of file
+        return Response("# Metrics collection failed", status=500, content_type='text/plain; charset=utf-8')
+
+
+@api_bp.route('/stream/<source>')
+@requires_ready_engine
+def detection_stream(source):
+    """Per-frame detection metadata (no images) as Server-Sent Events or NDJSON"""
+    from core.encoding import METADATA_FORMATS, metadata_message, metadata_settings
+
+    if source not in ('camera', 'video'):
+        return jsonify({'error': f"Unknown source '{source}' (expected camera or video)"}), 404
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'ndjson' if request.accept_mimetypes.best == 'application/x-ndjson' else 'sse'
+    if fmt not in METADATA_FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}' (expected sse or ndjson)"}), 400
+
+    settings = metadata_settings(fmt, max_fps=request.args.get('max_fps', type=float))
+    stream = request_stream(source, settings,
+                            lambda message: metadata_message(fmt, 'error', {'error': message}))
+    response = Response(stream, mimetype='text/event-stream' if fmt == 'sse' else 'application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -3,16 +3,19 @@ from io import BytesIO
 import cv2
 import numpy as np
 from PIL import Image
-from flask import render_template, Response, flash, request, current_app
+from flask import render_template, Response, flash, request
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileAllowed
 from werkzeug.exceptions import abort
 from wtforms import FileField, SubmitField
 from app.main import main_bp
+from app.streaming import error_frame, request_stream, requires_ready_engine
 
 
-from core.video_detector import detect_mask_in_frame
 from core.image_processor import detect_mask_in_image
+from core.cache import content_key, get_result_cache
+from core.encoding import stream_settings
+from core.engine import get_engine
 from core.logger import get_logger
 
 logger = get_logger(__name__)
@@ -23,64 +26,15 @@ def home_page():
     return render_template("home_page.html")
 
 
-def gen(source, camera_index, video_path):
-    # Decide capture source
-    if source == "video" and video_path:
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            logger.error(f"Failed to open video file: {video_path}")
-            # Yield a single error frame for user feedback
-            error_frame = np.zeros((360, 640, 3), dtype=np.uint8)
-            cv2.putText(error_frame, "Error: cannot open video", (20, 50),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
-            ret, jpeg = cv2.imencode('.jpg', error_frame)
-            if ret:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n')
-            return
-    else:
-        cap = cv2.VideoCapture(camera_index)
-        if not cap.isOpened():
-            logger.error(f"Failed to open camera index: {camera_index}")
-            # Yield a single error frame for user feedback
-            error_frame = np.zeros((360, 640, 3), dtype=np.uint8)
-            cv2.putText(error_frame, "Error: cannot access camera", (20, 50),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
-            ret, jpeg = cv2.imencode('.jpg', error_frame)
-            if ret:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n')
-            return
-
-    try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                logger.warning("Frame read failed or end of stream reached")
-                break
-
-            # Process frame
-            frame = detect_mask_in_frame(frame)
-
-            # Convert to JPEG
-            ret, jpeg = cv2.imencode('.jpg', frame)
-            if ret:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n')
-    except Exception as e:
-        logger.exception(f"Video feed error: {e}")
-    finally:
-        cap.release()
-
-
 @main_bp.route('/video_feed')
+@requires_ready_engine
 def video_feed():
-    # Extract query params within request context
-    source = request.args.get("source", "camera")
-    camera_index = int(request.args.get("camera_index", 0))
-    video_path = request.args.get("path")
-    return Response(gen(source, camera_index, video_path),
-        mimetype='multipart/x-mixed-replace; boundary=frame')
+    # Output size, JPEG quality and frame rate of this viewer
+    settings = stream_settings(width=request.args.get("width", type=int),
+                               quality=request.args.get("quality", type=int),
+                               max_fps=request.args.get("max_fps", type=float))
+    stream = request_stream(request.args.get("source", "camera"), settings, error_frame)
+    return Response(stream, mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
 
@@ -91,6 +45,7 @@ def image_mask_detection():
 
 
 @main_bp.route("/image-processing", methods=["POST"])
+@requires_ready_engine
 def image_processing():
     form = PhotoMaskForm()
 
@@ -102,23 +57,31 @@ def image_processing():
         from core.validators import validate_image_file
         validate_image_file(form.image.data)
 
-        pil_image = Image.open(form.image.data)
-        image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-        array_image = detect_mask_in_image(image)
-        rgb_image = cv2.cvtColor(array_image, cv2.COLOR_BGR2RGB)
-        image_detected = Image.fromarray(rgb_image, 'RGB')
-
-        with BytesIO() as img_io:
-            image_detected.save(img_io, 'PNG')
-            img_io.seek(0)
-            base64img = "data:image/png;base64," + b64encode(img_io.getvalue()).decode('ascii')
-            return base64img
+        image_bytes = form.image.data.read()
+        cache = get_result_cache()
+        if cache is None:
+            return render_detection(image_bytes)
+        key = content_key(image_bytes, get_engine().fingerprint())
+        return cache.get_or_compute(key, lambda: render_detection(image_bytes).encode('ascii')).decode('ascii')
     except Exception as e:
         logger.exception(f"Image processing failed: {e}")
         flash("Image processing failed. Please check the file and try again.", "danger")
         abort(Response("Image processing failed", 400))
 
 
+def render_detection(image_bytes):
+    """Run detection on an encoded upload and return the annotated image as a PNG data URL"""
+    pil_image = Image.open(BytesIO(image_bytes)).convert('RGB')
+    image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+    array_image = detect_mask_in_image(image)
+    rgb_image = cv2.cvtColor(array_image, cv2.COLOR_BGR2RGB)
+    image_detected = Image.fromarray(rgb_image, 'RGB')
+
+    with BytesIO() as img_io:
+        image_detected.save(img_io, 'PNG')
+        return "data:image/png;base64," + b64encode(img_io.getvalue()).decode('ascii')
+
+
 # form
 class PhotoMaskForm(FlaskForm):
     image = FileField('Choose image:',
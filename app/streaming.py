@@ -0,0 +1,149 @@
+"""
+Video streaming helpers shared by the page and API blueprints
+
+Opens capture sources into a :class:`~core.pipeline.VideoPipeline`, shares
+camera pipelines between viewers and turns them into response generators.
+The output (MJPEG or detection metadata) is chosen by the settings tuple
+passed in, so ``/video_feed`` and ``/api/v1/stream/<source>`` run the same
+capture/detect loop.
+"""
+import functools
+
+import cv2
+import numpy as np
+from flask import Response, current_app, request
+
+from core.broadcast import subscribe
+from core.capture import FrameGrabber
+from core.encoding import multipart_chunk
+from core.engine import get_engine
+from core.logger import get_logger
+from core.pipeline import VideoPipeline
+from core.tracking import FaceTracker
+from core import utils
+
+logger = get_logger(__name__)
+
+
+def requires_ready_engine(view):
+    """Wait up to READY_WAIT_TIMEOUT for engine warm-up, then answer 503 with Retry-After.
+
+    An engine that only loaded face detection (``'degraded'``) still serves,
+    without classification; one that failed to load answers 503. Engines
+    that were never warmed in the background load lazily on the request as
+    before.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        engine = get_engine()
+        if engine.warmup_started and not engine.wait_until_ready(current_app.config.get('READY_WAIT_TIMEOUT', 0),
+                                                                 allow_degraded=True):
+            logger.info(f"Rejecting {request.path} while engine is {engine.readiness}")
+            response = Response("Model is warming up, please retry shortly", 503, mimetype='text/plain')
+            response.headers['Retry-After'] = str(current_app.config.get('READY_RETRY_AFTER', 5))
+            return response
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def error_frame(message):
+    """Single multipart JPEG frame showing ``message``, for user feedback"""
+    frame = np.zeros((360, 640, 3), dtype=np.uint8)
+    cv2.putText(frame, message, (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
+    ret, jpeg = cv2.imencode('.jpg', frame)
+    return multipart_chunk(jpeg.tobytes()) if ret else b''
+
+
+def open_pipeline(source, camera_index, video_path, tracker=None, latest_only=None, settings=None):
+    """Start the detection pipeline for a capture source; ``None`` if it cannot be opened."""
+    # Decide capture source
+    if source == "video" and video_path:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            logger.error(f"Failed to open video file: {video_path}")
+            return None
+    else:
+        cap = cv2.VideoCapture(camera_index)
+        if not cap.isOpened():
+            logger.error(f"Failed to open camera index: {camera_index}")
+            return None
+
+    # Cameras: process the newest frame and drop stale ones so latency stays
+    # bounded; video files: process every frame unless asked otherwise
+    if latest_only is None:
+        latest_only = source != "video"
+    grabber = FrameGrabber(cap, latest_only=latest_only)
+    # Detection, classification and encoding run as overlapping stages
+    return VideoPipeline(grabber, get_engine(), tracker=tracker, settings=settings)
+
+
+def gen(source, camera_index, video_path, settings, error, tracker=None, latest_only=None):
+    """Frames of a pipeline of its own; yields ``error(message)`` once if the source cannot be opened"""
+    pipeline = open_pipeline(source, camera_index, video_path, tracker=tracker, latest_only=latest_only,
+                             settings=settings)
+    if pipeline is None:
+        yield error("Error: cannot open video" if source == "video" and video_path
+                    else "Error: cannot access camera")
+        return
+
+    try:
+        yield from pipeline
+        logger.warning("Frame read failed or end of stream reached")
+    except Exception as e:
+        logger.exception(f"Video feed error: {e}")
+    finally:
+        pipeline.close()
+
+
+def shared_stream_key(camera_index, tracker=None, latest_only=None):
+    """Broadcast key of a camera: only viewers with the same tracking and frame mode share a pipeline.
+
+    Output settings are not part of it; the broadcaster encodes one variant
+    per distinct ``settings`` of its viewers.
+    """
+    frames = {None: 'default', True: 'latest', False: 'every'}[latest_only]
+    return f"camera:{camera_index}:tracking={'on' if tracker is not None else 'off'}:frames={frames}"
+
+
+def gen_shared(camera_index, settings, error, tracker=None, latest_only=None, buffer_size=2):
+    """Camera feed shared by every viewer of ``camera_index`` with the same pipeline options"""
+    subscription = subscribe(shared_stream_key(camera_index, tracker, latest_only),
+                             lambda: open_pipeline("camera", camera_index, None, tracker=tracker,
+                                                   latest_only=latest_only, settings=settings),
+                             settings, buffer_size=buffer_size)
+    if subscription is None:
+        yield error("Error: cannot access camera")
+        return
+
+    try:
+        yield from subscription
+    finally:
+        subscription.close()
+        logger.info(f"Video feed viewer stats: {subscription.stats()}")
+
+
+def request_stream(source, settings, error):
+    """Response generator for ``source`` configured from the current request's query params.
+
+    Reads ``camera_index``, ``path``, ``tracking`` and ``frames``; must run
+    inside the request context (the generator itself runs outside it).
+    """
+    camera_index = int(request.args.get("camera_index", 0))
+    video_path = request.args.get("path")
+    # One tracker per stream: detect on keyframes, follow faces in between
+    tracker = None
+    if request.args.get("tracking", str(current_app.config['TRACKING_ENABLED'])).lower() in ("1", "true"):
+        tracker = FaceTracker(keyframe_interval=current_app.config['TRACKING_KEYFRAME_INTERVAL'],
+                              iou_threshold=current_app.config['TRACKING_IOU_THRESHOLD'],
+                              ema_alpha=current_app.config['TRACK_EMA_ALPHA'],
+                              max_age=current_app.config['TRACK_MAX_AGE'],
+                              max_hash_distance=current_app.config['TRACK_REUSE_MAX_DISTANCE'],
+                              ambiguous_gap=utils.CONF_DELTA_THRESHOLD)
+    # 'latest' drops stale frames, 'every' processes all of them (default: per source)
+    frame_mode = request.args.get("frames")
+    latest_only = None if frame_mode not in ("latest", "every") else frame_mode == "latest"
+    # Camera viewers share one pipeline; video files play separately for each viewer
+    if source != "video" and current_app.config['SHARE_CAMERA_STREAMS']:
+        return gen_shared(camera_index, settings, error, tracker=tracker, latest_only=latest_only,
+                          buffer_size=current_app.config['STREAM_CLIENT_BUFFER'])
+    return gen(source, camera_index, video_path, settings, error, tracker=tracker, latest_only=latest_only)
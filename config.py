@@ -20,7 +20,86 @@ class Config:
     
     # Model settings
     MODEL_PATH = Path("models/mask_mobilenet_v2_compat.h5")
+    # Persist the first successful .h5 load as <model>.keras + manifest and load that on later boots
+    MODEL_ARTIFACT_CACHE = os.environ.get('MODEL_ARTIFACT_CACHE', 'true').lower() == 'true'
+
+    # Inference settings
+    # Classifier backend: 'keras', 'tflite' or 'onnx' (converted once next to MODEL_PATH)
+    INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras').lower()
+    # TFLite interpreter / ONNX Runtime intra-op threads (unset = runtime default)
+    INFERENCE_THREADS = int(os.environ['INFERENCE_THREADS']) if os.environ.get('INFERENCE_THREADS') else None
+    # ONNX Runtime only: inter-op threads and graph optimization level
+    # ('disable', 'basic', 'extended' or 'all')
+    ONNX_INTER_OP_THREADS = int(os.environ['ONNX_INTER_OP_THREADS']) if os.environ.get('ONNX_INTER_OP_THREADS') else None
+    ONNX_GRAPH_OPTIMIZATION = os.environ.get('ONNX_GRAPH_OPTIMIZATION', 'all').lower()
+    # Cross-request micro-batching of face crops in front of the classifier
+    BATCHING_ENABLED = os.environ.get('BATCHING_ENABLED', 'true').lower() == 'true'
+    BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 32))
+    BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 3))
+    # Shape-bucketed tf.function fast path instead of Keras model.predict
+    FAST_INFERENCE = os.environ.get('FAST_INFERENCE', 'true').lower() == 'true'
+    FAST_INFERENCE_MAX_BUCKET = int(os.environ.get('FAST_INFERENCE_MAX_BUCKET', 32))
     
+    # Faces are detected on a copy downscaled to this width (0 = full size) and
+    # cropped for classification from the full-resolution frame
+    DETECTION_WIDTH = int(os.environ.get('DETECTION_WIDTH', 320))
+
+    # Video feed: run the face detector every N frames (or when a track is lost)
+    # and follow faces with optical flow in between
+    TRACKING_ENABLED = os.environ.get('TRACKING_ENABLED', 'true').lower() == 'true'
+    TRACKING_KEYFRAME_INTERVAL = int(os.environ.get('TRACKING_KEYFRAME_INTERVAL', 5))
+    TRACKING_IOU_THRESHOLD = float(os.environ.get('TRACKING_IOU_THRESHOLD', 0.3))
+    # Tracked faces keep an EMA of their probabilities and are re-classified only when
+    # the crop dHash moves more than TRACK_REUSE_MAX_DISTANCE bits, the smoothed
+    # prediction is ambiguous (CONF_DELTA_THRESHOLD) or TRACK_MAX_AGE frames have passed
+    TRACK_EMA_ALPHA = float(os.environ.get('TRACK_EMA_ALPHA', 0.5))
+    TRACK_MAX_AGE = int(os.environ.get('TRACK_MAX_AGE', 15))
+    TRACK_REUSE_MAX_DISTANCE = int(os.environ.get('TRACK_REUSE_MAX_DISTANCE', 6))
+
+    # Video feed stages (detect, classify, encode) run on their own threads with
+    # bounded queues of this many frames in between
+    PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', 2))
+    # Viewers of the same camera share one pipeline; each viewer buffers at most
+    # STREAM_CLIENT_BUFFER encoded frames and drops the oldest when it falls behind
+    SHARE_CAMERA_STREAMS = os.environ.get('SHARE_CAMERA_STREAMS', 'true').lower() == 'true'
+    STREAM_CLIENT_BUFFER = int(os.environ.get('STREAM_CLIENT_BUFFER', 2))
+
+    # Face detector backend: 'haar' (default), 'lbp', 'yunet' or 'ssd'. LBP/YuNet/SSD
+    # read local model files (FACE_DETECTOR_MODEL, default under models/); the SSD
+    # also needs its prototxt (FACE_DETECTOR_CONFIG)
+    FACE_DETECTOR = os.environ.get('FACE_DETECTOR', 'haar').lower()
+    FACE_DETECTOR_MODEL = os.environ.get('FACE_DETECTOR_MODEL') or None
+    FACE_DETECTOR_CONFIG = os.environ.get('FACE_DETECTOR_CONFIG') or None
+    # Cascade (haar/lbp) parameters
+    DETECTOR_SCALE_FACTOR = float(os.environ.get('DETECTOR_SCALE_FACTOR', 1.05))
+    DETECTOR_MIN_NEIGHBORS = int(os.environ.get('DETECTOR_MIN_NEIGHBORS', 4))
+    # Smallest face in pixels of the input frame (all backends); scaled down with
+    # the frame when detecting at DETECTION_WIDTH
+    DETECTOR_MIN_SIZE = int(os.environ.get('DETECTOR_MIN_SIZE', 40))
+    # DNN (yunet/ssd) parameters
+    DETECTOR_SCORE_THRESHOLD = float(os.environ.get('DETECTOR_SCORE_THRESHOLD', 0.6))
+    DETECTOR_NMS_THRESHOLD = float(os.environ.get('DETECTOR_NMS_THRESHOLD', 0.3))
+
+    # Load and warm the model in a background thread when the app starts.
+    # Detection requests wait up to READY_WAIT_TIMEOUT seconds for it, then get
+    # a 503 with Retry-After: READY_RETRY_AFTER.
+    WARMUP_ON_START = os.environ.get('WARMUP_ON_START', 'true').lower() == 'true'
+    READY_WAIT_TIMEOUT = float(os.environ.get('READY_WAIT_TIMEOUT', 5))
+    READY_RETRY_AFTER = int(os.environ.get('READY_RETRY_AFTER', 5))
+
+    # Reuse predictions for near-identical face crops (dHash within a Hamming distance)
+    PREDICTION_CACHE_ENABLED = os.environ.get('PREDICTION_CACHE_ENABLED', 'false').lower() == 'true'
+    PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 1024))
+    PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 2.0))
+    PREDICTION_CACHE_MAX_DISTANCE = int(os.environ.get('PREDICTION_CACHE_MAX_DISTANCE', 4))
+
+    # Result cache for /image-processing (keyed by upload hash + model/threshold config)
+    RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+    RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    # Optional on-disk tier shared by workers on the same host (unset = memory only)
+    RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR') or None
+    RESULT_CACHE_DISK_MAX_BYTES = int(os.environ.get('RESULT_CACHE_DISK_MAX_BYTES', 512 * 1024 * 1024))
+
     # Upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
@@ -29,6 +108,17 @@ class Config:
     CAMERA_WIDTH = 500
     VIDEO_WIDTH = 600
 
+    # Video feed output defaults, overridable per viewer with ?width=&quality=&max_fps=
+    # (max_fps 0 = as fast as frames are processed). JPEG_ENCODER: 'auto' uses
+    # TurboJPEG when PyTurboJPEG and libturbojpeg are installed, else OpenCV
+    STREAM_WIDTH = int(os.environ.get('STREAM_WIDTH', VIDEO_WIDTH))
+    STREAM_JPEG_QUALITY = int(os.environ.get('STREAM_JPEG_QUALITY', 80))
+    STREAM_MAX_FPS = float(os.environ.get('STREAM_MAX_FPS', 0))
+    # Frames identical to the previous output are not re-encoded; the last one is
+    # re-sent after this many seconds so idle viewers still get writes (0 = never)
+    STREAM_KEEPALIVE_SECONDS = float(os.environ.get('STREAM_KEEPALIVE_SECONDS', 2.0))
+    JPEG_ENCODER = os.environ.get('JPEG_ENCODER', 'auto')
+
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
@@ -48,6 +138,8 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     DEBUG = True
+    # Tests inject engines; don't load TensorFlow in the background
+    WARMUP_ON_START = False
 
 # Configuration dictionary
 config = {
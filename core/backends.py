@@ -0,0 +1,373 @@
+"""
+Non-Keras inference backends for the mask classifier
+
+Every backend exposes the same ``predict(x, verbose=0) -> [N, C]`` call as a
+Keras model, so ``core.model_loader.load_mask_model`` can hand any of them to
+the engine and the routes never need to know which one is active.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from core.exceptions import ModelLoadError
+
+BACKENDS = ("keras", "tflite", "onnx")
+
+
+# ----------------------------------------------------------------------
+# Artifact manifests
+# ----------------------------------------------------------------------
+def manifest_path(artifact: Path | str) -> Path:
+    """``models/x.tflite`` -> ``models/x.tflite.manifest.json``."""
+    artifact = Path(artifact)
+    return artifact.with_name(artifact.name + ".manifest.json")
+
+
+def read_manifest(artifact: Path | str) -> dict:
+    """Manifest written next to an exported artifact, or ``{}`` if there is none."""
+    path = manifest_path(artifact)
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+
+def write_manifest(artifact: Path | str, **fields) -> Path:
+    path = manifest_path(artifact)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(fields, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, path)
+    return path
+
+
+def file_sha256(path: Path | str) -> str:
+    """SHA-256 of a model file; for a directory (SavedModel), of every file's name and contents."""
+    path = Path(path)
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    digest = hashlib.sha256()
+    for file in files:
+        if path.is_dir():
+            digest.update(file.relative_to(path).as_posix().encode("utf-8") + b"\0")
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _artifact_is_fresh(artifact: Path, source_hash: str) -> bool:
+    """Whether ``artifact`` was built from the source whose SHA-256 is ``source_hash`` (per its manifest)."""
+    return artifact.exists() and read_manifest(artifact).get("source_sha256") == source_hash
+
+
+def _input_contract(classifier, manifest: dict, uint8_input: bool) -> None:
+    """Set ``input_dtype``/``normalizes_input`` so the engine picks host preprocessing.
+
+    A uint8 serving signature takes raw BGR crops and does everything in-graph.
+    """
+    classifier.input_dtype = np.uint8 if uint8_input else np.float32
+    classifier.normalizes_input = uint8_input or bool(manifest.get("normalizes_input", False))
+
+
+# ----------------------------------------------------------------------
+# TFLite
+# ----------------------------------------------------------------------
+def _tflite_interpreter_class():
+    """Prefer the standalone LiteRT/tflite runtimes; fall back to full TensorFlow."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter  # type: ignore
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter  # type: ignore
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        import tensorflow as tf
+        return tf.lite.Interpreter
+    except ImportError as e:
+        raise ModelLoadError(
+            "TFLite backend needs ai-edge-litert, tflite-runtime or tensorflow installed"
+        ) from e
+
+
+def convert_to_tflite(model, output_path: Path | str) -> Path:
+    """Convert a loaded Keras model to a ``.tflite`` flatbuffer (input dtype kept as-is)."""
+    import tensorflow as tf
+
+    output_path = Path(output_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    tflite_bytes = converter.convert()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix(output_path.suffix + ".tmp")
+    tmp_path.write_bytes(tflite_bytes)
+    os.replace(tmp_path, output_path)
+    print(f"💾 Wrote TFLite model: {output_path} ({len(tflite_bytes) / 1e6:.1f} MB)")
+    return output_path
+
+
+class TFLiteClassifier:
+    """Mask classifier served by the TFLite interpreter.
+
+    The interpreter is resized to the incoming batch size on demand; it is
+    not thread-safe, so calls are serialized (the micro-batcher already
+    funnels them through a single thread). Full-integer models (see
+    ``scripts/quantize_int8.py``) are quantized on the way in and
+    dequantized on the way out, so callers always see float probabilities.
+    """
+
+    def __init__(self, tflite_path: Path | str, num_threads: Optional[int] = None):
+        self.path = Path(tflite_path)
+        interpreter_cls = _tflite_interpreter_class()
+        self._interpreter = interpreter_cls(model_path=str(self.path), num_threads=num_threads)
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self.input_shape = tuple(int(d) for d in self._input["shape"][1:])
+        self._tensor_dtype = self._input["dtype"]
+        scale, _ = self._input["quantization"]
+        _input_contract(self, read_manifest(self.path),
+                        uint8_input=self._tensor_dtype == np.uint8 and not scale)
+        self._batch = None
+        self._lock = threading.Lock()
+
+    def _resize(self, batch: int) -> None:
+        if batch != self._batch:
+            self._interpreter.resize_tensor_input(self._input["index"], [batch, *self.input_shape])
+            self._interpreter.allocate_tensors()
+            self._batch = batch
+
+    def _quantize_input(self, x) -> np.ndarray:
+        scale, zero_point = self._input["quantization"]
+        if np.issubdtype(self._tensor_dtype, np.integer) and scale:
+            info = np.iinfo(self._tensor_dtype)
+            x = np.clip(np.round(np.asarray(x, dtype=np.float32) / scale + zero_point), info.min, info.max)
+        return np.ascontiguousarray(x, dtype=self._tensor_dtype)
+
+    def _dequantize_output(self, y) -> np.ndarray:
+        scale, zero_point = self._output["quantization"]
+        if np.issubdtype(y.dtype, np.integer) and scale:
+            return (y.astype(np.float32) - zero_point) * scale
+        return y.copy()
+
+    def predict(self, x, verbose=0) -> np.ndarray:
+        x = self._quantize_input(x)
+        with self._lock:
+            self._resize(len(x))
+            self._interpreter.set_tensor(self._input["index"], x)
+            self._interpreter.invoke()
+            return self._dequantize_output(self._interpreter.get_tensor(self._output["index"]))
+
+
+def load_tflite_classifier(model_path: Path, keras_loader, num_threads: Optional[int] = None) -> TFLiteClassifier:
+    """Load ``<model>.tflite`` next to ``model_path``, converting it once if missing or stale.
+
+    ``keras_loader`` is only called when a conversion is needed. A ``.tflite``
+    path is used as-is.
+    """
+    model_path = Path(model_path)
+    if model_path.suffix == ".tflite":
+        tflite_path = model_path
+    else:
+        tflite_path = model_path.with_suffix(".tflite")
+        source_hash = file_sha256(model_path)
+        if not _artifact_is_fresh(tflite_path, source_hash):
+            print(f"🔄 Converting {model_path.name} to TFLite...")
+            model = keras_loader(model_path)
+            if model is None:
+                raise ModelLoadError(f"Could not load {model_path} for TFLite conversion")
+            convert_to_tflite(model, tflite_path)
+            write_manifest(tflite_path, source=model_path.name, source_sha256=source_hash,
+                           input_dtype="float32", normalizes_input=model_normalizes_input(model))
+    print(f"✅ Using TFLite backend: {tflite_path} (threads={num_threads or 'default'})")
+    return TFLiteClassifier(tflite_path, num_threads=num_threads)
+
+
+# ----------------------------------------------------------------------
+# ONNX Runtime
+# ----------------------------------------------------------------------
+ONNX_OPTIMIZATION_LEVELS = ("disable", "basic", "extended", "all")
+
+
+def convert_to_onnx(model, output_path: Path | str, opset: int = 13) -> Path:
+    """Export a loaded Keras model to ONNX via tf2onnx (dynamic batch dimension)."""
+    import tensorflow as tf
+    try:
+        import tf2onnx  # type: ignore
+    except ImportError as e:
+        raise ModelLoadError("ONNX export needs tf2onnx: pip install tf2onnx") from e
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    input_shape = tuple(int(d) for d in model.input_shape[1:])
+    input_dtype = tf.as_dtype(getattr(model.inputs[0], "dtype", None) or tf.float32)
+    spec = (tf.TensorSpec((None,) + input_shape, input_dtype, name="input"),)
+
+    @tf.function
+    def serve(x):
+        return model(x, training=False)
+
+    tmp_path = output_path.with_suffix(output_path.suffix + ".tmp")
+    tf2onnx.convert.from_function(serve, input_signature=spec, opset=opset, output_path=str(tmp_path))
+    os.replace(tmp_path, output_path)
+    print(f"💾 Wrote ONNX model: {output_path} ({output_path.stat().st_size / 1e6:.1f} MB)")
+    return output_path
+
+
+class OnnxClassifier:
+    """Mask classifier served by ONNX Runtime's CPU execution provider.
+
+    ``intra_op_threads``/``inter_op_threads`` of ``None`` keep the runtime
+    defaults; ``graph_optimization`` is one of ``ONNX_OPTIMIZATION_LEVELS``.
+    ``InferenceSession.run`` is thread-safe, so no lock is needed.
+    """
+
+    def __init__(self, onnx_path: Path | str, intra_op_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None, graph_optimization: str = "all"):
+        try:
+            import onnxruntime as ort  # type: ignore
+        except ImportError as e:
+            raise ModelLoadError("ONNX backend needs onnxruntime: pip install onnxruntime") from e
+
+        level = (graph_optimization or "all").lower()
+        if level not in ONNX_OPTIMIZATION_LEVELS:
+            raise ValueError(f"graph_optimization must be one of {', '.join(ONNX_OPTIMIZATION_LEVELS)}")
+
+        self.path = Path(onnx_path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = {
+            "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }[level]
+        if intra_op_threads:
+            options.intra_op_num_threads = int(intra_op_threads)
+        if inter_op_threads:
+            options.inter_op_num_threads = int(inter_op_threads)
+
+        self._session = ort.InferenceSession(str(self.path), options, providers=["CPUExecutionProvider"])
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        self.input_shape = tuple(model_input.shape[1:])
+        _input_contract(self, read_manifest(self.path), uint8_input=model_input.type == "tensor(uint8)")
+
+    def predict(self, x, verbose=0) -> np.ndarray:
+        x = np.ascontiguousarray(x, dtype=self.input_dtype)
+        return self._session.run(None, {self._input_name: x})[0]
+
+
+def load_onnx_classifier(model_path: Path, keras_loader, intra_op_threads: Optional[int] = None,
+                         inter_op_threads: Optional[int] = None,
+                         graph_optimization: str = "all") -> OnnxClassifier:
+    """Load ``<model>.onnx`` next to ``model_path``, exporting it once if missing or stale.
+
+    ``keras_loader`` is only called when an export is needed. A ``.onnx``
+    path is used as-is.
+    """
+    model_path = Path(model_path)
+    if model_path.suffix == ".onnx":
+        onnx_path = model_path
+    else:
+        onnx_path = model_path.with_suffix(".onnx")
+        source_hash = file_sha256(model_path)
+        if not _artifact_is_fresh(onnx_path, source_hash):
+            print(f"🔄 Exporting {model_path.name} to ONNX...")
+            model = keras_loader(model_path)
+            if model is None:
+                raise ModelLoadError(f"Could not load {model_path} for ONNX export")
+            convert_to_onnx(model, onnx_path)
+            write_manifest(onnx_path, source=model_path.name, source_sha256=source_hash,
+                           input_dtype="float32", normalizes_input=model_normalizes_input(model))
+    print(f"✅ Using ONNX Runtime backend: {onnx_path} "
+          f"(intra={intra_op_threads or 'default'}, inter={inter_op_threads or 'default'}, "
+          f"optimization={graph_optimization})")
+    return OnnxClassifier(onnx_path, intra_op_threads=intra_op_threads,
+                          inter_op_threads=inter_op_threads, graph_optimization=graph_optimization)
+
+
+# ----------------------------------------------------------------------
+# SavedModel (uint8 serving export)
+# ----------------------------------------------------------------------
+class SavedModelClassifier:
+    """Mask classifier loaded from a SavedModel's ``serving_default`` signature."""
+
+    def __init__(self, saved_model_dir: Path | str):
+        import tensorflow as tf
+
+        self.path = Path(saved_model_dir)
+        self._tf = tf
+        self._loaded = tf.saved_model.load(str(self.path))
+        self._fn = self._loaded.signatures["serving_default"]
+        _, spec = self._fn.structured_input_signature
+        self._input_name, input_spec = next(iter(spec.items()))
+        self.input_shape = tuple(input_spec.shape[1:])
+        _input_contract(self, read_manifest(self.path), uint8_input=input_spec.dtype == tf.uint8)
+
+    def predict(self, x, verbose=0) -> np.ndarray:
+        x = self._tf.constant(np.ascontiguousarray(x, dtype=self.input_dtype))
+        outputs = self._fn(**{self._input_name: x})
+        return next(iter(outputs.values())).numpy()
+
+
+def is_saved_model_dir(path: Path | str) -> bool:
+    path = Path(path)
+    return path.is_dir() and (path / "saved_model.pb").exists()
+
+
+# ----------------------------------------------------------------------
+# Input normalization detection
+# ----------------------------------------------------------------------
+_NORMALIZING_OPS = ("truedivide", "true_divide", "truediv")
+
+
+def model_normalizes_input(model) -> bool:
+    """True if ``model`` maps raw [0, 255] pixels to MobileNetV2's [-1, 1] range in-graph.
+
+    Backends report this via a ``normalizes_input`` attribute. For Keras
+    models the top-level graph is scanned for a ``Rescaling`` layer (the
+    compat architecture) or the ``TrueDivide`` op that
+    ``mobilenet_v2.preprocess_input`` leaves in trained/legacy models.
+    """
+    flag = getattr(model, "normalizes_input", None)
+    if flag is not None:
+        return bool(flag)
+
+    ops = getattr(model, "operations", None) or getattr(model, "layers", None) or []
+    for op in ops:
+        kind = type(op).__name__.lower()
+        name = getattr(op, "name", "").lower()
+        if kind == "rescaling":
+            return True
+        if any(tag in kind or tag in name for tag in _NORMALIZING_OPS):
+            return True
+        if kind == "functional" or kind == "model":
+            # Reached the backbone; preprocessing always sits before it.
+            break
+    return False
+
+
+def host_preprocess_mode(model) -> str:
+    """Preprocessing ``core.utils.preprocess_face_frame`` must apply for ``model``.
+
+    ``'raw'`` for uint8 serving signatures (resize only), ``'none'`` when the
+    model normalizes in-graph, otherwise ``PREPROCESS_MODE`` (with ``'auto'``
+    meaning MobileNetV2 normalization on the host).
+    """
+    from core.utils import PREPROCESS_MODE
+
+    if getattr(model, "input_dtype", None) == np.uint8:
+        return "raw"
+    if PREPROCESS_MODE != "auto":
+        return PREPROCESS_MODE
+    return "none" if model_normalizes_input(model) else "mobilenet_v2"
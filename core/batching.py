@@ -0,0 +1,157 @@
+"""
+Cross-request dynamic micro-batching for the mask classifier
+
+Concurrent requests (waitress threads, video streams) each submit a small
+batch of face crops. A single worker thread collects submissions until
+``max_batch_size`` faces are queued or ``max_wait_ms`` has elapsed since the
+first one arrived, runs one forward pass and hands every caller its slice
+of the predictions.
+"""
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Request:
+    __slots__ = ('faces', 'event', 'result', 'error')
+
+    def __init__(self, faces):
+        self.faces = faces
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Coalesce concurrent ``predict`` calls into batched forward passes.
+
+    ``predict_fn`` receives a ``[N, ...]`` array and must return an ``[N, C]``
+    array. A single submission larger than ``max_batch_size`` is run on its
+    own rather than split.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=3.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._pending = deque()
+        self._pending_faces = 0
+        self._cond = threading.Condition()
+        self._worker = None
+        self._closed = False
+
+        # Metrics
+        self._batches = 0
+        self._faces = 0
+        self._requests = 0
+        self._max_batch_seen = 0
+        self._max_queue_depth = 0
+
+    def predict(self, faces):
+        """Submit ``faces`` and block until their predictions are available."""
+        if len(faces) == 0:
+            return self.predict_fn(faces)
+
+        request = _Request(faces)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._ensure_worker()
+            self._pending.append(request)
+            self._pending_faces += len(faces)
+            self._max_queue_depth = max(self._max_queue_depth, self._pending_faces)
+            self._cond.notify()
+
+        request.event.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def close(self):
+        """Stop the worker thread once the queue has drained."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queue_depth': self._pending_faces,
+                'queue_requests': len(self._pending),
+                'max_queue_depth': self._max_queue_depth,
+                'batches': self._batches,
+                'faces': self._faces,
+                'requests': self._requests,
+                'avg_batch_size': (self._faces / self._batches) if self._batches else 0.0,
+                'max_batch_size_seen': self._max_batch_seen,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+            }
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='mask-micro-batcher', daemon=True)
+            self._worker.start()
+
+    def _collect(self):
+        """Wait for the next batch of requests; returns ``[]`` when closed and drained."""
+        with self._cond:
+            while not self._pending:
+                if self._closed:
+                    return []
+                self._cond.wait()
+
+            deadline = time.monotonic() + self.max_wait
+            while self._pending_faces < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = [self._pending.popleft()]
+            size = len(batch[0].faces)
+            while self._pending and size + len(self._pending[0].faces) <= self.max_batch_size:
+                request = self._pending.popleft()
+                batch.append(request)
+                size += len(request.faces)
+            self._pending_faces -= size
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            try:
+                faces = batch[0].faces if len(batch) == 1 else np.concatenate([r.faces for r in batch])
+                preds = self.predict_fn(faces)
+                offset = 0
+                for request in batch:
+                    n = len(request.faces)
+                    request.result = preds[offset:offset + n]
+                    offset += n
+            except Exception as e:
+                logger.error(f"Batched prediction failed: {e}")
+                for request in batch:
+                    request.error = e
+            with self._cond:
+                self._batches += 1
+                self._requests += len(batch)
+                self._faces += sum(len(r.faces) for r in batch)
+                self._max_batch_seen = max(self._max_batch_seen, sum(len(r.faces) for r in batch))
+            for request in batch:
+                request.event.set()
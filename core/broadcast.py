@@ -0,0 +1,192 @@
+"""
+Shared video streams for the Mask Detection System
+
+A ``StreamBroadcaster`` runs one capture/inference/encode pipeline per source
+and fans its encoded frames out to every subscriber, so five viewers of the
+same camera cost one pipeline and one ``cv2.VideoCapture``. Frames are
+encoded once per distinct ``(width, quality, max_fps)`` output requested by
+the subscribers. Each subscriber has a small bounded buffer: a slow client
+loses its oldest frames instead of stalling the others; an idle one gets
+its last frame again every ``Config.STREAM_KEEPALIVE_SECONDS``, so a viewer
+that disconnected from a stalled source is still noticed. The pipeline stops
+when the last subscriber leaves.
+"""
+import threading
+from collections import deque
+
+from config import Config
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+_broadcasters = {}
+_totals = {'frames': 0, 'delivered': 0, 'dropped': 0}
+# Guards the registry, every subscriber set and the totals
+_lock = threading.Lock()
+
+
+def broadcast_stats():
+    """Live broadcasters and subscribers plus frame counters of this process."""
+    with _lock:
+        stats = {
+            'broadcasters': len(_broadcasters),
+            'subscribers': sum(len(b.subscribers) for b in _broadcasters.values()),
+        }
+        stats.update(_totals)
+    return stats
+
+
+def subscribe(key, open_stream, settings, buffer_size=2):
+    """Subscribe to the ``settings`` output of the shared stream ``key``, starting it if needed.
+
+    ``open_stream()`` returns a :class:`~core.pipeline.VideoPipeline` (or any
+    object with ``outputs(variants)`` and ``close()``), or ``None`` when the
+    source cannot be opened; ``subscribe`` then returns ``None`` as well.
+    """
+    with _lock:
+        broadcaster = _broadcasters.get(key)
+        if broadcaster is not None:
+            return broadcaster._add(settings, buffer_size)
+    # Open outside the lock: capture devices can take a while
+    stream = open_stream()
+    if stream is None:
+        return None
+    with _lock:
+        broadcaster = _broadcasters.get(key)
+        if broadcaster is None:
+            broadcaster = _broadcasters[key] = StreamBroadcaster(key, stream)
+            stream = None
+        subscription = broadcaster._add(settings, buffer_size)
+    if stream is not None:
+        # another request started the same source meanwhile
+        stream.close()
+    else:
+        broadcaster.start()
+    return subscription
+
+
+class Subscription:
+    """One viewer of a broadcast; iterating yields frames until the broadcast ends.
+
+    Without a new frame for ``keepalive`` seconds the last one is yielded
+    again (not counted as delivered), so the server keeps writing to the client.
+    """
+
+    def __init__(self, broadcaster, settings, buffer_size):
+        self.broadcaster = broadcaster
+        self.settings = settings
+        self._frames = deque(maxlen=max(1, buffer_size))
+        self._cond = threading.Condition()
+        self._ended = False
+        self._last = None
+        self.keepalive = Config.STREAM_KEEPALIVE_SECONDS
+        self.delivered = 0
+        self.dropped = 0
+
+    def push(self, frame):
+        with self._cond:
+            dropped = len(self._frames) == self._frames.maxlen
+            self._frames.append(frame)
+            self._cond.notify()
+        if dropped:
+            self.dropped += 1
+            with _lock:
+                _totals['dropped'] += 1
+
+    def end(self):
+        with self._cond:
+            self._ended = True
+            self._cond.notify()
+
+    def __iter__(self):
+        while True:
+            with self._cond:
+                fresh = bool(self._cond.wait_for(lambda: self._frames or self._ended, self.keepalive or None))
+                if fresh and not self._frames:
+                    return
+                frame = self._frames.popleft() if fresh else self._last
+            if frame is None:
+                continue
+            if fresh:
+                self._last = frame
+                self.delivered += 1
+                with _lock:
+                    _totals['delivered'] += 1
+            yield frame
+
+    def stats(self):
+        return {'delivered': self.delivered, 'dropped': self.dropped}
+
+    def close(self):
+        """Leave the broadcast; the last subscriber to leave stops it."""
+        self.end()
+        self.broadcaster._remove(self)
+
+
+class StreamBroadcaster:
+    """Pumps one stream of encoded frames to all current subscribers."""
+
+    def __init__(self, key, stream):
+        self.key = key
+        self.subscribers = set()
+        self.frames = 0
+        # Newest chunk per output, so a new viewer of a static scene gets a picture
+        self._latest = {}
+        self._stream = stream
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f'broadcast-{key}', daemon=True)
+
+    def start(self):
+        logger.info(f"Starting shared stream {self.key}")
+        self._thread.start()
+
+    def variants(self):
+        """Outputs currently requested by the subscribers."""
+        with _lock:
+            return {subscription.settings for subscription in self.subscribers}
+
+    def _add(self, settings, buffer_size):
+        subscription = Subscription(self, settings, buffer_size)
+        self.subscribers.add(subscription)
+        if settings in self._latest:
+            subscription.push(self._latest[settings])
+        return subscription
+
+    def _remove(self, subscription):
+        with _lock:
+            self.subscribers.discard(subscription)
+            if not any(s.settings == subscription.settings for s in self.subscribers):
+                self._latest.pop(subscription.settings, None)
+            if self.subscribers or self._closed:
+                return
+            self._closed = True
+            if _broadcasters.get(self.key) is self:
+                del _broadcasters[self.key]
+        logger.info(f"Last viewer left shared stream {self.key}, stopping it")
+        # Releases the capture before a new broadcaster may reopen the device
+        self._stream.close()
+
+    def _run(self):
+        try:
+            for chunks in self._stream.outputs(self.variants):
+                with _lock:
+                    subscribers = list(self.subscribers)
+                    live = {subscription.settings for subscription in subscribers}
+                    self._latest.update((k, v) for k, v in chunks.items() if k in live)
+                    _totals['frames'] += 1
+                self.frames += 1
+                for subscription in subscribers:
+                    chunk = chunks.get(subscription.settings)
+                    if chunk is not None:
+                        subscription.push(chunk)
+        except Exception as e:
+            logger.exception(f"Shared stream {self.key} failed: {e}")
+        finally:
+            with _lock:
+                self._closed = True
+                if _broadcasters.get(self.key) is self:
+                    del _broadcasters[self.key]
+                subscribers = list(self.subscribers)
+            for subscription in subscribers:
+                subscription.end()
+            self._stream.close()
@@ -0,0 +1,324 @@
+"""
+Result caching for repeated detection requests
+
+``ResultCache`` memoizes rendered detection results keyed by a hash of the
+uploaded bytes plus the active model/threshold configuration. It keeps a
+byte-bounded in-memory LRU, an optional on-disk tier, and coalesces
+concurrent identical requests so each distinct upload is computed once.
+
+``PredictionCache`` sits in front of the classifier and reuses the
+probability vector of a near-identical face crop (perceptual dHash within a
+Hamming distance), so static scenes skip most forward passes.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from config import Config
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def content_key(data, fingerprint=''):
+    """SHA-256 of ``data`` (bytes) salted with a configuration ``fingerprint``."""
+    digest = hashlib.sha256()
+    digest.update(fingerprint.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class _Flight:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """Byte-bounded LRU of ``bytes`` values with optional disk tier and single-flight.
+
+    ``max_bytes`` bounds the in-memory tier; ``disk_dir``/``disk_max_bytes``
+    enable a second tier that survives restarts and is shared by workers on
+    the same host. Values larger than ``max_bytes`` are not kept in memory.
+    """
+
+    # The disk tier is pruned every N writes rather than on each one
+    DISK_PRUNE_EVERY = 32
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=512 * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = int(disk_max_bytes)
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+        self._disk_writes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+        value = self._disk_get(key)
+        if value is not None:
+            with self._lock:
+                self.disk_hits += 1
+                self._put_memory(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._put_memory(key, value)
+        self._disk_put(key, value)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key`` or run ``compute()`` exactly once.
+
+        Concurrent callers with the same key wait for the first one; an
+        exception raised by ``compute`` is re-raised in every waiter and
+        nothing is cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            self.put(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    # ------------------------------------------------------------------
+    # Tiers
+    # ------------------------------------------------------------------
+    def _put_memory(self, key, value):
+        """Insert under ``self._lock`` and evict least recently used entries."""
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[key] = value
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        return self.disk_dir / key[:2] / key
+
+    def _disk_get(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            value = path.read_bytes()
+            os.utime(path)  # keep recently used files from being pruned
+            return value
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Result cache disk read failed for {path}: {e}")
+            return None
+
+    def _disk_put(self, key, value):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(value)
+            os.replace(tmp_path, path)
+            self._disk_writes += 1
+            if self._disk_writes % self.DISK_PRUNE_EVERY == 0:
+                self._disk_prune()
+        except OSError as e:
+            logger.warning(f"Result cache disk write failed for {path}: {e}")
+
+    def _disk_prune(self):
+        """Delete least recently used files until the disk tier fits ``disk_max_bytes``."""
+        files = []
+        for path in self.disk_dir.glob('*/*'):
+            try:
+                st = path.stat()
+            except FileNotFoundError:  # removed by another worker
+                continue
+            if not path.name.endswith('.tmp'):
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide cache for ``/image-processing`` results, or ``None`` when disabled."""
+    global _result_cache
+    if not Config.RESULT_CACHE_ENABLED:
+        return None
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache(max_bytes=Config.RESULT_CACHE_MAX_BYTES,
+                                            disk_dir=Config.RESULT_CACHE_DIR,
+                                            disk_max_bytes=Config.RESULT_CACHE_DISK_MAX_BYTES)
+    return _result_cache
+
+
+# ----------------------------------------------------------------------
+# Face-crop prediction cache
+# ----------------------------------------------------------------------
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def dhash(image, hash_size=8):
+    """64-bit difference hash of a BGR or grayscale crop (horizontal gradients)."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def hamming_distances(hashes, value):
+    """Bit distance between every entry of a ``uint64`` array and ``value``.
+
+    ``value`` is one hash or an array of hashes compared element-wise.
+    """
+    diff = np.bitwise_xor(hashes, np.asarray(value, dtype=np.uint64))
+    return _POPCOUNT8[diff.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class PredictionCache:
+    """Probability vectors of recent face crops, looked up by dHash similarity.
+
+    A lookup hits when a stored hash younger than ``ttl`` seconds lies within
+    ``max_distance`` bits of the query. Entries live in fixed-size arrays so a
+    lookup is one vectorized XOR/popcount; when full, the least recently used
+    slot is replaced.
+    """
+
+    def __init__(self, max_entries=1024, ttl=2.0, max_distance=4):
+        self.max_entries = int(max_entries)
+        self.ttl = float(ttl)
+        self.max_distance = int(max_distance)
+
+        self._hashes = np.zeros(self.max_entries, dtype=np.uint64)
+        self._created = np.full(self.max_entries, -np.inf)
+        self._used = np.full(self.max_entries, -np.inf)
+        self._probs = [None] * self.max_entries
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, crop_hash):
+        now = time.monotonic()
+        with self._lock:
+            live = self._created > now - self.ttl
+            if live.any():
+                distances = hamming_distances(self._hashes, crop_hash)
+                distances[~live] = 64 + 1
+                slot = int(np.argmin(distances))
+                if distances[slot] <= self.max_distance:
+                    self._used[slot] = now
+                    self.hits += 1
+                    return self._probs[slot]
+            self.misses += 1
+            return None
+
+    def put(self, crop_hash, probs):
+        now = time.monotonic()
+        with self._lock:
+            expired = self._created <= now - self.ttl
+            slot = int(np.argmax(expired)) if expired.any() else int(np.argmin(self._used))
+            self._hashes[slot] = np.uint64(crop_hash)
+            self._created[slot] = now
+            self._used[slot] = now
+            self._probs[slot] = np.array(probs, copy=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'entries': int((self._created > time.monotonic() - self.ttl).sum()),
+                'max_entries': self.max_entries,
+            }
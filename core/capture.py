@@ -0,0 +1,142 @@
+"""
+Threaded frame capture for the video feed
+
+``FrameGrabber`` reads a ``cv2.VideoCapture`` on its own thread so capture
+never waits on detection or encoding. In latest-frame mode (cameras) only
+the newest frame is kept and stale frames are dropped and counted, which
+bounds glass-to-glass latency when processing is slower than the camera.
+In every-frame mode (video files) frames are buffered in a small blocking
+queue so none are skipped, while reading still overlaps processing.
+"""
+import queue
+import threading
+
+import cv2
+
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+_totals = {'captured': 0, 'delivered': 0, 'dropped': 0}
+_totals_lock = threading.Lock()
+
+
+def capture_stats():
+    """Frame counters summed over every grabber of this process."""
+    with _totals_lock:
+        return dict(_totals)
+
+
+class FrameGrabber:
+    """Background reader for one ``cv2.VideoCapture``.
+
+    ``latest_only=True`` keeps a single slot that each new frame overwrites;
+    ``latest_only=False`` blocks the reader once ``max_buffered`` frames are
+    waiting. :meth:`read` mirrors ``VideoCapture.read`` and returns
+    ``(False, None)`` at the end of the stream.
+    """
+
+    def __init__(self, cap, latest_only=True, max_buffered=4, name='capture'):
+        self._cap = cap
+        self.latest_only = latest_only
+        if latest_only:
+            # Don't let the driver queue frames behind our back (best effort)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self._queue = None if latest_only else queue.Queue(maxsize=max(1, max_buffered))
+        self._frame = None
+        self._seq = 0
+        self._consumed = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._finished = False
+
+        self.captured = 0
+        self.delivered = 0
+        self.dropped = 0
+
+        self._thread = threading.Thread(target=self._run, name=f'{name}-grabber', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stopped:
+                ret, frame = self._cap.read()
+                if not ret:
+                    break
+                self._count('captured')
+                if self.latest_only:
+                    with self._cond:
+                        if self._seq > self._consumed:
+                            self._count('dropped')
+                        self._frame = frame
+                        self._seq += 1
+                        self._cond.notify_all()
+                else:
+                    while not self._stopped:
+                        try:
+                            self._queue.put(frame, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+        except Exception as e:
+            logger.exception(f"Frame capture failed: {e}")
+        finally:
+            with self._cond:
+                self._finished = True
+                self._cond.notify_all()
+            while self._queue is not None:
+                try:
+                    self._queue.put(None, timeout=0.1)  # end-of-stream marker
+                    break
+                except queue.Full:
+                    if self._stopped:
+                        break
+
+    def _count(self, key):
+        setattr(self, key, getattr(self, key) + 1)
+        with _totals_lock:
+            _totals[key] += 1
+
+    def read(self, timeout=None):
+        """Next frame to process: the newest one (latest mode) or the next in order."""
+        if self.latest_only:
+            with self._cond:
+                if not self._cond.wait_for(lambda: self._seq > self._consumed or self._finished, timeout):
+                    return False, None
+                if self._seq == self._consumed:  # finished, nothing new
+                    return False, None
+                self._consumed = self._seq
+                frame = self._frame
+        else:
+            try:
+                frame = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                return False, None
+            if frame is None:
+                self._queue.put(None)  # keep reporting end of stream
+                return False, None
+        self._count('delivered')
+        return True, frame
+
+    def pending(self):
+        """Frames captured but not read yet."""
+        if self.latest_only:
+            with self._cond:
+                return int(self._seq > self._consumed)
+        return self._queue.qsize()
+
+    def stats(self):
+        return {'captured': self.captured, 'delivered': self.delivered, 'dropped': self.dropped}
+
+    def release(self, timeout=2.0):
+        """Stop the reader thread and release the capture."""
+        self._stopped = True
+        if self._queue is not None:
+            # unblock a reader waiting on a full queue
+            try:
+                while True:
+                    self._queue.get_nowait()
+            except queue.Empty:
+                pass
+        self._thread.join(timeout)
+        self._cap.release()
@@ -0,0 +1,98 @@
+"""
+Typed detection results for the Mask Detection System
+
+``Detections`` keeps a whole frame's results as NumPy arrays (boxes, label
+ids, confidences) straight from :func:`core.utils.decode_predictions`.
+Iterating yields lightweight ``Detection`` records; label names and
+percentage strings are only produced when a result is rendered.
+"""
+import numpy as np
+
+from core.utils import format_confidence, label_name
+
+# Label id of faces that were detected but not classified (no model loaded)
+UNCLASSIFIED = -1
+
+
+class Detection:
+    """One face: ``box`` ``(x, y, w, h)``, ``label_id``, ``confidence`` in [0, 1] and ``track_id``."""
+
+    __slots__ = ('box', 'label_id', 'confidence', 'track_id')
+
+    def __init__(self, box, label_id=UNCLASSIFIED, confidence=float('nan'), track_id=None):
+        self.box = box
+        self.label_id = label_id
+        self.confidence = confidence
+        self.track_id = track_id
+
+    @property
+    def classified(self):
+        return self.label_id != UNCLASSIFIED
+
+    @property
+    def label(self):
+        """``'Mask'``, ``'No mask'``, ``'Improper'`` (or ``'Class<i>'``); ``None`` if unclassified."""
+        return label_name(self.label_id) if self.classified else None
+
+    @property
+    def confidence_text(self):
+        return format_confidence(self.confidence) if self.classified else None
+
+    def to_dict(self):
+        result = {
+            'box': list(self.box),
+            'label': self.label,
+            'confidence': round(self.confidence, 4) if self.classified else None,
+        }
+        if self.track_id is not None:
+            result['track_id'] = self.track_id
+        return result
+
+    def __repr__(self):
+        return f"Detection(box={self.box}, label={self.label!r}, confidence={self.confidence:.4f})"
+
+
+class Detections:
+    """Array-backed results of one frame.
+
+    ``boxes`` is ``int32 [N, 4]`` (``x, y, w, h``), ``label_ids`` ``int8 [N]``
+    (``UNCLASSIFIED`` without a classifier), ``confidences`` ``float32 [N]``
+    and ``track_ids`` ``int32 [N]`` in tracking mode, otherwise ``None``.
+    """
+
+    __slots__ = ('boxes', 'label_ids', 'confidences', 'track_ids')
+
+    def __init__(self, boxes, label_ids=None, confidences=None, track_ids=None):
+        self.boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        n = len(self.boxes)
+        self.label_ids = (np.full(n, UNCLASSIFIED, dtype=np.int8) if label_ids is None
+                          else np.asarray(label_ids, dtype=np.int8))
+        self.confidences = (np.full(n, np.nan, dtype=np.float32) if confidences is None
+                            else np.asarray(confidences, dtype=np.float32))
+        self.track_ids = None if track_ids is None else np.asarray(track_ids, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __getitem__(self, i):
+        return Detection(tuple(int(v) for v in self.boxes[i]), int(self.label_ids[i]), float(self.confidences[i]),
+                         None if self.track_ids is None else int(self.track_ids[i]))
+
+    def __iter__(self):
+        track_ids = [None] * len(self) if self.track_ids is None else self.track_ids.tolist()
+        for box, label_id, confidence, track_id in zip(self.boxes.tolist(), self.label_ids.tolist(),
+                                                       self.confidences.tolist(), track_ids):
+            yield Detection(tuple(box), label_id, confidence, track_id)
+
+    def scaled(self, factor):
+        """Copy with boxes scaled by ``factor`` (e.g. to draw on a resized frame)."""
+        if factor == 1.0:
+            return self
+        return Detections(np.rint(self.boxes * factor), self.label_ids, self.confidences, self.track_ids)
+
+    @property
+    def labels(self):
+        return [d.label for d in self]
+
+    def to_list(self):
+        return [d.to_dict() for d in self]
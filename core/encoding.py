@@ -0,0 +1,242 @@
+"""
+Output encoding for the video feed
+
+Stream output is described by a settings tuple: ``(width, quality,
+max_fps)`` for MJPEG (see :func:`stream_settings`) or ``(format, max_fps)``
+for detection metadata (see :func:`metadata_settings`). ``FrameEncoder``
+turns annotated frames into multipart JPEG chunks: it throttles to
+``max_fps``, resizes into reused buffers and skips frames whose annotated
+output is identical to the previous one, re-sending the last chunk every
+``Config.STREAM_KEEPALIVE_SECONDS`` so a static scene still writes to the
+client (which is how a closed connection is noticed). JPEGs are written by TurboJPEG
+(``PyTurboJPEG`` plus ``libturbojpeg``) when installed, otherwise by OpenCV.
+``MetadataEncoder`` emits boxes, labels and confidences as Server-Sent
+Events or NDJSON without drawing or encoding an image.
+"""
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from config import Config
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+JPEG_ENCODERS = ('auto', 'turbojpeg', 'opencv')
+METADATA_FORMATS = ('sse', 'ndjson')
+
+_totals = {'encoded': 0, 'throttled': 0, 'unchanged': 0}
+_totals_lock = threading.Lock()
+
+
+def encoding_stats():
+    """Frame counters summed over every :class:`FrameEncoder` of this process."""
+    with _totals_lock:
+        return dict(_totals)
+
+
+def multipart_chunk(jpeg):
+    """One ``multipart/x-mixed-replace`` part for an encoded JPEG."""
+    return b''.join((b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: ',
+                     str(len(jpeg)).encode(), b'\r\n\r\n', jpeg, b'\r\n'))
+
+
+def stream_settings(width=None, quality=None, max_fps=None):
+    """``(width, quality, max_fps)`` with defaults from ``Config`` and values clamped to sane ranges."""
+    width = Config.STREAM_WIDTH if width is None else width
+    quality = Config.STREAM_JPEG_QUALITY if quality is None else quality
+    max_fps = Config.STREAM_MAX_FPS if max_fps is None else max_fps
+    return (min(max(int(width), 64), 3840),
+            min(max(int(quality), 10), 100),
+            min(max(float(max_fps), 0.0), 120.0))
+
+
+def metadata_settings(fmt='sse', max_fps=None):
+    """``(format, max_fps)`` of a metadata stream; ``format`` is ``'sse'`` or ``'ndjson'``."""
+    if fmt not in METADATA_FORMATS:
+        raise ValueError(f"Unknown metadata format '{fmt}' (expected one of {', '.join(METADATA_FORMATS)})")
+    max_fps = Config.STREAM_MAX_FPS if max_fps is None else max_fps
+    return (fmt, min(max(float(max_fps), 0.0), 120.0))
+
+
+def metadata_message(fmt, event, payload, event_id=None):
+    """Frame a JSON ``payload`` as an SSE ``event`` or as one NDJSON line."""
+    data = json.dumps(payload, separators=(',', ':'))
+    if fmt == 'ndjson':
+        return (data + "\n").encode()
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {data}\n\n".encode()
+
+
+def create_frame_encoder(settings, jpeg_encoder=None):
+    """``MetadataEncoder`` for metadata settings, ``FrameEncoder`` for MJPEG settings."""
+    if isinstance(settings[0], str):
+        return MetadataEncoder(settings)
+    return FrameEncoder(settings, jpeg_encoder)
+
+
+class OpenCVJpegEncoder:
+    name = 'opencv'
+
+    def encode(self, image, quality):
+        ret, jpeg = cv2.imencode('.jpg', image, (cv2.IMWRITE_JPEG_QUALITY, quality))
+        return jpeg.tobytes() if ret else None
+
+
+class TurboJpegEncoder:
+    name = 'turbojpeg'
+
+    def __init__(self):
+        from turbojpeg import TurboJPEG  # type: ignore
+        # Raises when libturbojpeg itself cannot be found
+        self._turbo = TurboJPEG()
+
+    def encode(self, image, quality):
+        return self._turbo.encode(image, quality=quality)
+
+
+def create_jpeg_encoder(name=None):
+    """JPEG encoder ``name`` (default ``Config.JPEG_ENCODER``); ``auto`` prefers TurboJPEG."""
+    name = (name or Config.JPEG_ENCODER).lower()
+    if name not in JPEG_ENCODERS:
+        raise ValueError(f"Unknown JPEG encoder '{name}' (expected one of {', '.join(JPEG_ENCODERS)})")
+    if name != 'opencv':
+        try:
+            return TurboJpegEncoder()
+        except (ImportError, OSError, RuntimeError) as e:
+            if name == 'turbojpeg':
+                raise
+            logger.debug(f"TurboJPEG unavailable, encoding with OpenCV: {e}")
+    return OpenCVJpegEncoder()
+
+
+_default_encoder = None
+
+
+def get_jpeg_encoder():
+    """Process-wide encoder from ``Config.JPEG_ENCODER``."""
+    global _default_encoder
+    if _default_encoder is None:
+        _default_encoder = create_jpeg_encoder()
+        logger.info(f"Video feed JPEG encoder: {_default_encoder.name}")
+    return _default_encoder
+
+
+class _OutputEncoder:
+    """Frame-rate cap and counters shared by the output encoders."""
+
+    def __init__(self, settings, max_fps):
+        self.settings = settings
+        self.max_fps = max_fps
+        self._next_time = 0.0
+        self.keepalive = Config.STREAM_KEEPALIVE_SECONDS
+        self._last_sent = 0.0
+        self.last_chunk = None
+
+        self.encoded = 0
+        self.throttled = 0
+        self.unchanged = 0
+
+    def _count(self, key):
+        setattr(self, key, getattr(self, key) + 1)
+        with _totals_lock:
+            _totals[key] += 1
+
+    def _throttle(self):
+        """``True`` (and counted) when this frame exceeds ``max_fps``."""
+        if not self.max_fps:
+            return False
+        now = time.monotonic()
+        if now < self._next_time:
+            self._count('throttled')
+            return True
+        # keep a steady cadence under jitter without bursting after a pause
+        interval = 1.0 / self.max_fps
+        self._next_time = max(self._next_time, now - interval / 2) + interval
+        return False
+
+    def _sent(self, chunk):
+        self.last_chunk = chunk
+        self._last_sent = time.monotonic()
+        return chunk
+
+    def _resend(self):
+        """``last_chunk`` once ``keepalive`` seconds passed without output, else ``None``."""
+        if not self.keepalive or self.last_chunk is None:
+            return None
+        if time.monotonic() - self._last_sent < self.keepalive:
+            return None
+        return self._sent(self.last_chunk)
+
+    def stats(self):
+        return {'encoded': self.encoded, 'throttled': self.throttled, 'unchanged': self.unchanged}
+
+
+class FrameEncoder(_OutputEncoder):
+    """Annotate and encode frames for one ``(width, quality, max_fps)`` output.
+
+    :meth:`encode` returns a multipart chunk, or ``None`` when the frame is
+    throttled by ``max_fps`` or looks exactly like the previous output (then
+    the previous chunk is repeated if ``keepalive`` seconds passed without one).
+    Not thread-safe; the pipeline's encode stage owns it.
+    """
+
+    def __init__(self, settings, jpeg_encoder=None):
+        self.width, self.quality, max_fps = settings
+        super().__init__(settings, max_fps)
+        self.jpeg_encoder = jpeg_encoder or get_jpeg_encoder()
+        # Two resize buffers, swapped every frame: current and previous output
+        self._buffers = [None, None]
+
+    def encode(self, engine, image, detections, index=None, timestamp=None):
+        if self._throttle():
+            return None
+
+        h, w = image.shape[:2]
+        shape = (max(1, int(h * self.width / float(w))), self.width) + image.shape[2:]
+        out = self._buffers[0]
+        if out is None or out.shape != shape:
+            out = self._buffers[0] = np.empty(shape, dtype=image.dtype)
+        annotated = engine.annotate(image, detections, width=self.width, out=out)
+
+        previous = self._buffers[1]
+        self._buffers.reverse()
+        if previous is not None and previous.shape == shape and np.array_equal(annotated, previous):
+            self._count('unchanged')
+            return self._resend()
+
+        jpeg = self.jpeg_encoder.encode(annotated, self.quality)
+        if jpeg is None:
+            return None
+        self._count('encoded')
+        return self._sent(multipart_chunk(jpeg))
+
+
+class MetadataEncoder(_OutputEncoder):
+    """Per-frame detection JSON for one ``(format, max_fps)`` output; never touches pixels.
+
+    Each frame becomes ``{"timestamp", "frame", "width", "height",
+    "detections": [{"box", "label", "confidence"[, "track_id"]}]}``, framed
+    as an SSE ``detections`` event or as one NDJSON line.
+    """
+
+    def __init__(self, settings):
+        self.format, max_fps = settings
+        super().__init__(settings, max_fps)
+
+    def encode(self, engine, image, detections, index=None, timestamp=None):
+        if self._throttle():
+            return None
+        h, w = image.shape[:2]
+        chunk = metadata_message(self.format, 'detections', {
+            'timestamp': timestamp if timestamp is not None else time.time(),
+            'frame': index,
+            'width': w,
+            'height': h,
+            'detections': detections.to_list(),
+        }, event_id=index)
+        self._count('encoded')
+        return self._sent(chunk)
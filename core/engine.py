@@ -0,0 +1,446 @@
+"""
+Process-wide inference engine for the Mask Detection System
+
+Owns the single mask classifier and face detector of a worker process and
+runs the detect -> crop -> classify -> annotate pipeline shared by the image
+upload path, the video feed and the health API. Models are loaded lazily on
+first use, never at import time.
+"""
+import os
+import threading
+import time
+
+import cv2
+import imutils
+import numpy as np
+
+from config import Config
+from core.batching import MicroBatcher
+from core.cache import PredictionCache, dhash
+from core.exceptions import ModelLoadError
+from core.face_detectors import (DEFAULT_DETECTOR_MODELS, as_face_detector, create_face_detector,
+                                 downscale_for_detection, scaled_min_size)
+from core.logger import get_logger
+from core import utils
+from core.detections import Detections
+from core.utils import FaceBatchBuffer, decode_predictions, write_bb
+
+logger = get_logger(__name__)
+
+# Configurable crop margin (fraction of width/height)
+FACE_CROP_MARGIN = float(os.environ.get('FACE_CROP_MARGIN', '0.15'))
+
+
+class InferenceEngine:
+    """Lazily loaded mask classifier + face detector shared across requests.
+
+    ``model`` and ``face_detector`` may be injected (e.g. in tests); anything
+    left as ``None`` is loaded on first use. A failed model load is not
+    fatal: the engine keeps serving face detection without classification.
+
+    :meth:`start_warmup` loads and warms the engine in a background thread;
+    ``readiness`` then moves through ``'loading'`` and ``'warming'`` to
+    ``'ready'`` (``'degraded'`` when only face detection loaded, ``'failed'``
+    when loading raised), and :meth:`wait_until_ready` lets requests wait
+    for it.
+    """
+
+    def __init__(self, model_path=None, model=None, face_detector=None, batching=None,
+                 prediction_cache=None):
+        self.model_path = model_path if model_path is not None else Config.MODEL_PATH
+        self._model = model
+        self._face_detector = face_detector
+        self._batching = Config.BATCHING_ENABLED if batching is None else batching
+        self._batcher = None
+        if prediction_cache is None and Config.PREDICTION_CACHE_ENABLED:
+            prediction_cache = PredictionCache(max_entries=Config.PREDICTION_CACHE_SIZE,
+                                               ttl=Config.PREDICTION_CACHE_TTL,
+                                               max_distance=Config.PREDICTION_CACHE_MAX_DISTANCE)
+        self._prediction_cache = prediction_cache
+        self._preprocess_mode = None
+        # Digest of the loaded weights, so result cache keys change when they do
+        self._model_sha256 = None
+        self._buffers = threading.local()
+        self._loaded = False
+        self._load_error = None
+        self._lock = threading.Lock()
+
+        self._readiness = 'idle'
+        # Set once warm-up has finished, whatever the outcome
+        self._settled = threading.Event()
+        self._warmup_thread = None
+        self._warmup_seconds = None
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def load(self):
+        """Load the classifier and face detector once; safe to call repeatedly."""
+        if self._loaded:
+            return self
+        with self._lock:
+            if self._loaded:
+                return self
+            self._face_detector = self._load_face_detector()
+            if self._model is None:
+                self._model = self._load_model()
+            if self._model is not None:
+                from core.backends import host_preprocess_mode
+                self._preprocess_mode = host_preprocess_mode(self._model)
+                logger.info(f"Host preprocessing mode: {self._preprocess_mode}")
+            if self._model is not None and self._batching:
+                self._batcher = MicroBatcher(self._predict,
+                                             max_batch_size=Config.BATCH_MAX_SIZE,
+                                             max_wait_ms=Config.BATCH_MAX_WAIT_MS)
+            self._loaded = True
+        return self
+
+    def warmup(self):
+        """Run the face detector once and a forward pass for every batch bucket.
+
+        Graph tracing, kernel selection and interpreter tensor allocation then
+        happen here instead of in the first requests of each batch size.
+        """
+        self.load()
+        start = time.perf_counter()
+        self.detect_faces(np.zeros((Config.VIDEO_WIDTH * 3 // 4, Config.VIDEO_WIDTH, 3), dtype=np.uint8))
+        if self._model is not None:
+            dtype = np.uint8 if self._preprocess_mode == 'raw' else np.float32
+            buckets = getattr(self._model, 'buckets', None)
+            if buckets is None:
+                buckets = [1 << i for i in range(Config.BATCH_MAX_SIZE.bit_length())]
+            for bucket in buckets:
+                self._predict(np.zeros((bucket, 224, 224, 3), dtype=dtype))
+        self._warmup_seconds = time.perf_counter() - start
+        logger.info(f"Engine warm-up finished in {self._warmup_seconds:.2f}s")
+
+    def start_warmup(self):
+        """Load and warm the engine in a daemon thread; later calls are no-ops."""
+        with self._lock:
+            if self._warmup_thread is not None or self._settled.is_set():
+                return self._warmup_thread
+            self._readiness = 'loading'
+            self._warmup_thread = threading.Thread(target=self._run_warmup, name='engine-warmup', daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    def _run_warmup(self):
+        try:
+            self.load()
+        except Exception as e:
+            logger.error(f"Engine failed to load: {e}")
+            self._load_error = self._load_error or str(e)
+            self._readiness = 'failed'
+            self._settled.set()
+            return
+        try:
+            self._readiness = 'warming'
+            self.warmup()
+        except Exception as e:
+            # A cold but loaded engine still serves; only the first requests are slower
+            logger.warning(f"Engine warm-up failed: {e}")
+        finally:
+            # Without a classifier the engine only detects faces
+            self._readiness = 'ready' if self._model is not None else 'degraded'
+            self._settled.set()
+
+    @property
+    def readiness(self):
+        """'idle' until warm-up starts, then 'loading', 'warming' and 'ready', 'degraded' or 'failed'."""
+        return self._readiness
+
+    @property
+    def is_ready(self):
+        return self._readiness == 'ready'
+
+    @property
+    def warmup_started(self):
+        return self._warmup_thread is not None
+
+    def wait_until_ready(self, timeout=None, allow_degraded=False):
+        """Block up to ``timeout`` seconds for warm-up; returns whether the engine is ready.
+
+        ``allow_degraded`` also accepts an engine serving face detection only.
+        """
+        self._settled.wait(timeout)
+        return self.is_ready or (allow_degraded and self._readiness == 'degraded')
+
+    def _load_face_detector(self):
+        if self._face_detector is not None:
+            return as_face_detector(self._face_detector)
+        try:
+            detector = create_face_detector()
+        except Exception as e:
+            logger.warning(f"Could not load '{Config.FACE_DETECTOR}' face detector: {e}. "
+                           "Falling back to the bundled Haar cascade")
+            detector = create_face_detector('haar', model_path=DEFAULT_DETECTOR_MODELS['haar'])
+        logger.info(f"Face detector: {detector.name}")
+        return detector
+
+    def _load_model(self):
+        try:
+            from core.model_loader import load_mask_model, make_fast_predictor, resolve_model_path
+
+            model_path = resolve_model_path(self.model_path)
+            logger.info(f"Resolved model path: {model_path}")
+            if model_path is None:
+                raise ModelLoadError("Mask model file not found")
+            from core.backends import file_sha256
+            self._model_sha256 = file_sha256(model_path)
+
+            model = load_mask_model(model_path,
+                                    backend=Config.INFERENCE_BACKEND,
+                                    num_threads=Config.INFERENCE_THREADS,
+                                    inter_op_threads=Config.ONNX_INTER_OP_THREADS,
+                                    graph_optimization=Config.ONNX_GRAPH_OPTIMIZATION,
+                                    persist_artifact=Config.MODEL_ARTIFACT_CACHE)
+            if model is None:
+                raise ModelLoadError("Model loading returned None")
+            if Config.FAST_INFERENCE:
+                model = make_fast_predictor(model, max_bucket=Config.FAST_INFERENCE_MAX_BUCKET)
+            return model
+        except Exception as e:
+            self._load_error = str(e)
+            logger.warning(f"Could not load model: {e}. Falling back to face detection only")
+            return None
+
+    @property
+    def is_loaded(self):
+        return self._loaded
+
+    @property
+    def model(self):
+        return self.load()._model
+
+    @property
+    def face_detector(self):
+        return self.load()._face_detector
+
+    @property
+    def status(self):
+        """'not_loaded' before first use, then 'loaded' or 'fallback'."""
+        if not self._loaded:
+            return 'not_loaded'
+        return 'loaded' if self._model is not None else 'fallback'
+
+    @property
+    def load_error(self):
+        return self._load_error
+
+    @property
+    def batcher(self):
+        return self._batcher
+
+    def fingerprint(self):
+        """Everything that changes detection output, for result cache keys."""
+        self.load()
+        return '|'.join(str(v) for v in (
+            self.model_path, self._model_sha256, Config.INFERENCE_BACKEND, self.status, self._preprocess_mode,
+            getattr(self._face_detector, 'params', getattr(self._face_detector, 'name', None)),
+            Config.VIDEO_WIDTH, Config.DETECTION_WIDTH, FACE_CROP_MARGIN,
+            utils.MASK_CLASS_ORDER, utils.MASK_CONF_THRESHOLD, utils.NO_MASK_CONF_THRESHOLD,
+            utils.IMPROPER_CONF_THRESHOLD, utils.CONF_DELTA_THRESHOLD, utils.FORCE_ARGMAX,
+        ))
+
+    def stats(self):
+        """Engine metrics for the health/metrics endpoints."""
+        stats = {'status': self.status, 'readiness': self.readiness}
+        if self._warmup_seconds is not None:
+            stats['warmup_seconds'] = self._warmup_seconds
+        if self._batcher is not None:
+            stats['batching'] = self._batcher.stats()
+        if self._prediction_cache is not None:
+            stats['prediction_cache'] = self._prediction_cache.stats()
+        return stats
+
+    # ------------------------------------------------------------------
+    # Pipeline
+    # ------------------------------------------------------------------
+    def locate_faces(self, image, tracker=None):
+        """Return ``(boxes, track_ids)``: face boxes ``int32 [N, 4]`` (``x, y, w, h``) in ``image``.
+
+        The detector runs on a copy downscaled to ``Config.DETECTION_WIDTH``
+        (grayscale for cascades) with the detector's minimum face size scaled
+        along; boxes are mapped back to ``image`` so crops keep the full input
+        resolution, and expanded by the crop margin. Boxes left without area
+        after clipping to ``image`` are dropped. Smaller inputs are never
+        upscaled. With a
+        :class:`~core.tracking.FaceTracker` the detector only runs on
+        keyframes and boxes are propagated by optical flow in between;
+        ``track_ids`` is ``None`` without a tracker.
+        """
+        detector = self.face_detector
+        h_img, w_img = image.shape[:2]
+        scale, gray, detector_input = downscale_for_detection(image, detector)
+
+        # DETECTOR_MIN_SIZE is in input pixels; shrink it with the frame
+        def detect():
+            if scale == 1.0:
+                return detector.detect(detector_input)
+            return detector.detect(detector_input, min_size=scaled_min_size(detector, scale))
+
+        track_ids = None
+        if tracker is None:
+            faces = detect()
+        else:
+            faces, track_ids = tracker.update(gray, detect)
+        if scale != 1.0:
+            faces = np.rint(faces / scale).astype(np.int32)
+        # expand crop by margin, clipped to the image
+        margin = (FACE_CROP_MARGIN * faces[:, 2:]).astype(np.int32)
+        top_left = np.maximum(faces[:, :2] - margin, 0)
+        bottom_right = np.minimum(faces[:, :2] + faces[:, 2:] + margin, (w_img, h_img))
+        rects = np.hstack([top_left, bottom_right - top_left])
+        # boxes at or past the image edge can collapse to nothing; empty crops break resizing
+        keep = (rects[:, 2] >= 1) & (rects[:, 3] >= 1)
+        if not keep.all():
+            rects = rects[keep]
+            track_ids = None if track_ids is None else track_ids[keep]
+        return rects, track_ids
+
+    def detect_faces(self, image, tracker=None):
+        """Face boxes only; see :meth:`locate_faces`."""
+        return self.locate_faces(image, tracker=tracker)[0]
+
+    def preprocess(self, image, rects):
+        """Crop and preprocess ``rects`` into this thread's reusable face buffer.
+
+        The result is a view that is overwritten by the thread's next call.
+        """
+        buffer = getattr(self._buffers, 'faces', None)
+        if buffer is None:
+            buffer = self._buffers.faces = FaceBatchBuffer()
+        return buffer.fill(image, rects, mode=self._preprocess_mode)
+
+    def _predict(self, faces_array):
+        return self._model.predict(faces_array, verbose=0)
+
+    def classify(self, faces_array):
+        """Run the classifier on a ``[N, 224, 224, 3]`` batch of preprocessed faces.
+
+        With batching enabled the faces are coalesced with concurrent callers
+        into a single forward pass.
+        """
+        self.load()
+        if self._batcher is not None:
+            return self._batcher.predict(faces_array)
+        return self._predict(faces_array)
+
+    def classify_faces(self, image, rects):
+        """Probability vectors for the ``rects`` crops of ``image``.
+
+        With the prediction cache enabled, crops whose dHash matches a recent
+        crop reuse its probabilities and only the rest are classified.
+        """
+        cache = self._prediction_cache
+        if cache is None:
+            return self.classify(self.preprocess(image, rects))
+
+        hashes = [dhash(image[y:y + h, x:x + w]) for (x, y, w, h) in rects]
+        preds = [cache.get(crop_hash) for crop_hash in hashes]
+        missing = [i for i, pred in enumerate(preds) if pred is None]
+        if missing:
+            fresh = self.classify(self.preprocess(image, rects[missing]))
+            for i, pred in zip(missing, fresh):
+                cache.put(hashes[i], pred)
+                preds[i] = pred
+        return preds
+
+    def classify_tracks(self, image, rects, track_ids, tracker):
+        """Smoothed probabilities for the tracked ``rects``, re-classifying only stale tracks.
+
+        Track state is looked up by ``track_ids``, so this may run on another
+        thread while ``tracker`` is already following the next frame.
+        """
+        hashes = [dhash(image[y:y + h, x:x + w]) for (x, y, w, h) in rects]
+        stale = tracker.stale(track_ids, hashes)
+        preds = self.classify(self.preprocess(image, rects[stale])) if stale.any() else None
+        return tracker.update_probabilities(track_ids, stale, preds, hashes)
+
+    def classify_detections(self, image, rects, track_ids=None, tracker=None):
+        """Classify the located ``rects`` of ``image`` into array-backed :class:`Detections`.
+
+        Label ids stay ``UNCLASSIFIED`` when no classifier is available.
+        """
+        if not len(rects) or self.model is None:
+            return Detections(rects, track_ids=track_ids)
+
+        if tracker is not None:
+            preds = self.classify_tracks(image, rects, track_ids, tracker)
+        else:
+            preds = self.classify_faces(image, rects)
+        label_ids, confidences = decode_predictions(preds)
+        return Detections(rects, label_ids, confidences, track_ids=track_ids)
+
+    def detect(self, image, tracker=None):
+        """Detect and classify faces; returns array-backed :class:`Detections`.
+
+        ``tracker`` enables keyframe detection for video (see :meth:`locate_faces`).
+        """
+        rects, track_ids = self.locate_faces(image, tracker=tracker)
+        return self.classify_detections(image, rects, track_ids, tracker=tracker)
+
+    def detect_many(self, images):
+        """Detect faces on every image, then classify the crops of all of them in one call.
+
+        Offline jobs use this to turn many small per-frame batches into one
+        large forward pass; returns one :class:`Detections` per image.
+        """
+        rects = [self.detect_faces(image) for image in images]
+        if self.model is None or not sum(len(r) for r in rects):
+            return [Detections(r) for r in rects]
+        # Own buffer: the batch can be much larger than the per-request one
+        buffer = getattr(self._buffers, 'many', None)
+        if buffer is None:
+            buffer = self._buffers.many = FaceBatchBuffer()
+        preds = self.classify(buffer.fill_many(zip(images, rects), mode=self._preprocess_mode))
+        label_ids, confidences = decode_predictions(preds)
+        bounds = np.cumsum([0] + [len(r) for r in rects])
+        return [Detections(r, label_ids[start:end], confidences[start:end])
+                for r, start, end in zip(rects, bounds[:-1], bounds[1:])]
+
+    def annotate(self, image, detections, width=None, out=None):
+        """Copy of ``image`` resized to the display width with ``detections`` drawn on it.
+
+        ``out`` is an optional preallocated buffer of the resized shape to draw into.
+        """
+        if out is None:
+            annotated = imutils.resize(image, width=width or Config.VIDEO_WIDTH)
+        else:
+            annotated = cv2.resize(image, out.shape[1::-1], dst=out, interpolation=cv2.INTER_AREA)
+        for detection in detections.scaled(annotated.shape[1] / image.shape[1]):
+            if not detection.classified:
+                # Fallback: just draw face detection without mask classification
+                (x, y, w, h) = detection.box
+                cv2.rectangle(annotated, (x, y), (x + w, y + h), (255, 0, 0), 2)
+                cv2.putText(annotated, 'Face Detected', (x, y - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 0, 0), 2)
+            else:
+                write_bb(detection.label, detection.confidence_text, detection.box, annotated)
+        return annotated
+
+    def process(self, image, width=None, tracker=None):
+        """Detect on ``image`` at full resolution and return a copy annotated at the display width."""
+        return self.annotate(image, self.detect(image, tracker=tracker), width=width)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Return the process-wide :class:`InferenceEngine` (created, not loaded, on first call)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = InferenceEngine()
+    return _engine
+
+
+def set_engine(engine):
+    """Replace the process-wide engine (used by tests and alternative entry points)."""
+    global _engine
+    with _engine_lock:
+        _engine = engine
+    return engine
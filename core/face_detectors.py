@@ -0,0 +1,249 @@
+"""
+Pluggable face detectors for the Mask Detection System
+
+Every detector exposes ``detect(image)`` on a BGR ``uint8`` frame and returns
+``int32 [N, 4]`` boxes ``(x, y, w, h)`` in image coordinates, so the engine
+does not care which backend found the faces. ``min_size`` (smallest face
+side in pixels) may be overridden per call, which the downscaled detection
+path uses to keep it in input-image pixels. ``params`` lists everything
+that changes which boxes a detector finds (for result cache keys). Backends:
+
+    haar   OpenCV Haar cascade (default, ships with opencv-python)
+    lbp    OpenCV LBP cascade, several times cheaper than Haar
+    yunet  OpenCV ``FaceDetectorYN`` (YuNet ONNX model)
+    ssd    OpenCV DNN ResNet-10 SSD (Caffe model + prototxt)
+
+LBP, YuNet and SSD models are read from local files (``models/`` by default
+or ``FACE_DETECTOR_MODEL``); nothing is downloaded at runtime.
+"""
+import os
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from config import BASE_DIR, Config
+from core.exceptions import ModelLoadError
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+FACE_DETECTORS = ('haar', 'lbp', 'yunet', 'ssd')
+
+# Model files looked up under models/ when FACE_DETECTOR_MODEL is not set
+DEFAULT_DETECTOR_MODELS = {
+    'haar': Path(os.path.dirname(cv2.__file__)) / 'data' / 'haarcascade_frontalface_alt2.xml',
+    'lbp': BASE_DIR / 'models' / 'lbpcascade_frontalface_improved.xml',
+    'yunet': BASE_DIR / 'models' / 'face_detection_yunet_2023mar.onnx',
+    'ssd': BASE_DIR / 'models' / 'res10_300x300_ssd_iter_140000.caffemodel',
+}
+DEFAULT_SSD_CONFIG = BASE_DIR / 'models' / 'deploy.prototxt'
+
+
+def _empty_boxes():
+    return np.zeros((0, 4), dtype=np.int32)
+
+
+def _clip_boxes(boxes, image_shape):
+    """Round ``[N, 4]`` float ``(x, y, w, h)`` boxes and clip them to the image."""
+    if not len(boxes):
+        return _empty_boxes()
+    h_img, w_img = image_shape[:2]
+    top_left = np.clip(np.rint(boxes[:, :2]), 0, (w_img, h_img))
+    bottom_right = np.clip(np.rint(boxes[:, :2] + boxes[:, 2:4]), 0, (w_img, h_img))
+    boxes = np.hstack([top_left, bottom_right - top_left]).astype(np.int32)
+    return boxes[(boxes[:, 2] > 0) & (boxes[:, 3] > 0)]
+
+
+def _require_file(path, backend):
+    path = Path(path)
+    if not path.is_file():
+        raise ModelLoadError(f"{backend} face detector model not found: {path}")
+    return path
+
+
+class CascadeFaceDetector:
+    """Haar or LBP cascade through ``detectMultiScale``.
+
+    ``cascade`` is a cascade XML path or an already constructed object with a
+    ``detectMultiScale`` method (e.g. ``cv2.CascadeClassifier``).
+    """
+
+    # Callers may pass a grayscale frame and skip the color conversion
+    accepts_gray = True
+
+    def __init__(self, cascade, scale_factor=1.05, min_neighbors=4, min_size=40, name='haar'):
+        if hasattr(cascade, 'detectMultiScale'):
+            self._cascade = cascade
+            self.model = type(cascade).__name__
+        else:
+            self.model = str(cascade)
+            self._cascade = cv2.CascadeClassifier(str(_require_file(cascade, name)))
+            if self._cascade.empty():
+                raise ModelLoadError(f"Could not load {name} cascade: {cascade}")
+        self.name = name
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    @property
+    def params(self):
+        return {'name': self.name, 'model': self.model, 'scale_factor': self.scale_factor,
+                'min_neighbors': self.min_neighbors, 'min_size': self.min_size}
+
+    def detect(self, image, min_size=None):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        min_size = self.min_size if min_size is None else min_size
+        faces = self._cascade.detectMultiScale(gray,
+                                               scaleFactor=self.scale_factor,
+                                               minNeighbors=self.min_neighbors,
+                                               minSize=(min_size, min_size),
+                                               flags=cv2.CASCADE_SCALE_IMAGE,
+                                               )
+        return np.asarray(faces, dtype=np.int32).reshape(-1, 4)
+
+
+class YuNetFaceDetector:
+    """OpenCV ``FaceDetectorYN`` (YuNet) on the full frame."""
+
+    def __init__(self, model_path, score_threshold=0.6, nms_threshold=0.3, top_k=5000, min_size=40):
+        model_path = _require_file(model_path, 'yunet')
+        self.name = 'yunet'
+        self.model = str(model_path)
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.top_k = top_k
+        self.min_size = min_size
+        self._detector = cv2.FaceDetectorYN.create(str(model_path), "", (320, 320),
+                                                   score_threshold, nms_threshold, top_k)
+        self._input_size = None
+        # FaceDetectorYN keeps per-call state; one frame at a time
+        self._lock = threading.Lock()
+
+    @property
+    def params(self):
+        return {'name': self.name, 'model': self.model, 'score_threshold': self.score_threshold,
+                'nms_threshold': self.nms_threshold, 'top_k': self.top_k, 'min_size': self.min_size}
+
+    def detect(self, image, min_size=None):
+        h, w = image.shape[:2]
+        min_size = self.min_size if min_size is None else min_size
+        with self._lock:
+            if self._input_size != (w, h):
+                self._detector.setInputSize((w, h))
+                self._input_size = (w, h)
+            _, faces = self._detector.detect(image)
+        if faces is None:
+            return _empty_boxes()
+        boxes = _clip_boxes(faces[:, :4], image.shape)
+        return boxes[(boxes[:, 2] >= min_size) & (boxes[:, 3] >= min_size)]
+
+
+class SsdFaceDetector:
+    """OpenCV DNN ResNet-10 SSD face detector (``300x300`` input)."""
+
+    MEAN = (104.0, 177.0, 123.0)
+
+    def __init__(self, model_path, config_path, score_threshold=0.6, input_size=300, min_size=40):
+        model_path = _require_file(model_path, 'ssd')
+        config_path = _require_file(config_path, 'ssd')
+        self.name = 'ssd'
+        self.model = str(model_path)
+        self.config = str(config_path)
+        self.score_threshold = score_threshold
+        self.input_size = (input_size, input_size)
+        self.min_size = min_size
+        self._net = cv2.dnn.readNet(str(model_path), str(config_path))
+        # cv2.dnn.Net is not safe to run from several threads at once
+        self._lock = threading.Lock()
+
+    @property
+    def params(self):
+        return {'name': self.name, 'model': self.model, 'config': self.config,
+                'score_threshold': self.score_threshold, 'input_size': self.input_size[0],
+                'min_size': self.min_size}
+
+    def detect(self, image, min_size=None):
+        h, w = image.shape[:2]
+        min_size = self.min_size if min_size is None else min_size
+        blob = cv2.dnn.blobFromImage(image, 1.0, self.input_size, self.MEAN, swapRB=False, crop=False)
+        with self._lock:
+            self._net.setInput(blob)
+            out = self._net.forward()
+        rows = out.reshape(-1, 7)
+        rows = rows[rows[:, 2] >= self.score_threshold]
+        if not len(rows):
+            return _empty_boxes()
+        corners = rows[:, 3:7] * (w, h, w, h)
+        boxes = _clip_boxes(np.hstack([corners[:, :2], corners[:, 2:] - corners[:, :2]]), image.shape)
+        return boxes[(boxes[:, 2] >= min_size) & (boxes[:, 3] >= min_size)]
+
+
+def downscale_for_detection(image, detector, width=None):
+    """Detector input for ``image`` shrunk to ``width`` (default ``Config.DETECTION_WIDTH``, 0 = full size).
+
+    Returns ``(scale, gray, detector_input)``: the factor applied to ``image``,
+    the grayscale downscaled frame and what ``detector`` should be given
+    (grayscale for cascades). Smaller images are never upscaled.
+    """
+    width = Config.DETECTION_WIDTH if width is None else width
+    h_img, w_img = image.shape[:2]
+    scale = width / w_img if 0 < width < w_img else 1.0
+    small = image
+    if scale != 1.0:
+        small = cv2.resize(image, (width, max(1, round(h_img * scale))), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    return scale, gray, gray if getattr(detector, 'accepts_gray', False) else small
+
+
+def scaled_min_size(detector, scale):
+    """``detector.min_size`` (pixels of the input image) in pixels of a frame resized by ``scale``."""
+    return max(1, round(detector.min_size * scale))
+
+
+def detect_downscaled(detector, image, width=None):
+    """Run ``detector`` on a downscaled copy of ``image``; boxes are in ``image`` coordinates.
+
+    The detector's ``min_size`` is scaled along, so the smallest face found
+    stays the same in ``image`` pixels.
+    """
+    scale, _, detector_input = downscale_for_detection(image, detector, width)
+    if scale == 1.0:
+        return detector.detect(detector_input)
+    faces = detector.detect(detector_input, min_size=scaled_min_size(detector, scale))
+    return np.rint(faces / scale).astype(np.int32)
+
+
+def create_face_detector(name=None, model_path=None, config_path=None):
+    """Build the face detector ``name`` (default ``Config.FACE_DETECTOR``) with its config parameters."""
+    name = (name or Config.FACE_DETECTOR).lower()
+    if name not in FACE_DETECTORS:
+        raise ValueError(f"Unknown face detector '{name}' (expected one of {', '.join(FACE_DETECTORS)})")
+    model_path = model_path or Config.FACE_DETECTOR_MODEL or DEFAULT_DETECTOR_MODELS[name]
+
+    if name in ('haar', 'lbp'):
+        return CascadeFaceDetector(model_path,
+                                   scale_factor=Config.DETECTOR_SCALE_FACTOR,
+                                   min_neighbors=Config.DETECTOR_MIN_NEIGHBORS,
+                                   min_size=Config.DETECTOR_MIN_SIZE,
+                                   name=name)
+    if name == 'yunet':
+        return YuNetFaceDetector(model_path,
+                                 score_threshold=Config.DETECTOR_SCORE_THRESHOLD,
+                                 nms_threshold=Config.DETECTOR_NMS_THRESHOLD,
+                                 min_size=Config.DETECTOR_MIN_SIZE)
+    return SsdFaceDetector(model_path,
+                           config_path or Config.FACE_DETECTOR_CONFIG or DEFAULT_SSD_CONFIG,
+                           score_threshold=Config.DETECTOR_SCORE_THRESHOLD,
+                           min_size=Config.DETECTOR_MIN_SIZE)
+
+
+def as_face_detector(detector):
+    """Wrap a bare ``detectMultiScale`` object (legacy/injected cascade) in the common interface."""
+    if hasattr(detector, 'detect'):
+        return detector
+    return CascadeFaceDetector(detector,
+                               scale_factor=Config.DETECTOR_SCALE_FACTOR,
+                               min_neighbors=Config.DETECTOR_MIN_NEIGHBORS,
+                               min_size=Config.DETECTOR_MIN_SIZE)
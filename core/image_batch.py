@@ -0,0 +1,173 @@
+"""
+Batch mask detection for directories of still images
+
+    python -m core.image_batch snapshots/
+    python -m core.image_batch "snapshots/**/*.jpg" --results results.jsonl --no-annotate --workers 16
+
+Images are decoded (and annotated outputs encoded) on a thread pool while
+the next window of ``--batch-images`` images is prefetched. Faces are
+detected per image and the crops of the whole window are classified in one
+``predict`` call. Every image gets one line in a JSON Lines results file;
+re-running with the same results file skips images already recorded there,
+so an interrupted run resumes where it stopped. A progress line and a
+throughput summary are printed.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+
+from core.engine import get_engine
+from core.image_processor import POSSIBLE_EXT
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Suffix of annotated outputs; such files are never picked up as inputs
+ANNOTATED_SUFFIX = "_mask_detected"
+PROGRESS_INTERVAL = 5.0
+
+
+def collect_images(source):
+    """Sorted image paths under a directory (recursively) or matching a glob pattern."""
+    if os.path.isdir(source):
+        paths = (str(p) for p in Path(source).rglob("*"))
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths
+                  if os.path.splitext(p)[1].lower() in POSSIBLE_EXT
+                  and not Path(p).stem.endswith(ANNOTATED_SUFFIX)
+                  and os.path.isfile(p))
+
+
+def load_done(results_path):
+    """Image paths already recorded in ``results_path`` (resume support)."""
+    done = set()
+    if results_path and os.path.exists(results_path):
+        with open(results_path) as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)['path'])
+                except (ValueError, KeyError):
+                    continue  # truncated last line of an interrupted run
+    return done
+
+
+def annotated_path(path, root=None, output_dir=None):
+    """``<name>_mask_detected.png`` beside ``path``, or mirrored under ``output_dir``."""
+    path = Path(path)
+    name = f"{path.stem}{ANNOTATED_SUFFIX}.png"
+    if output_dir is None:
+        return str(path.with_name(name))
+    relative = path.parent.relative_to(root) if root and path.is_relative_to(root) else Path()
+    return str(Path(output_dir) / relative / name)
+
+
+def _write_annotated(path, image):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if not cv2.imwrite(path, image):
+        raise IOError(f"Cannot write {path}")
+    return path
+
+
+def _windows(paths, pool, size):
+    """Yield ``(paths, images)`` windows, decoding the next window while one is processed."""
+    chunks = [paths[i:i + size] for i in range(0, len(paths), size)]
+    pending = [pool.submit(cv2.imread, p) for p in chunks[0]] if chunks else []
+    for i, chunk in enumerate(chunks):
+        current = pending
+        pending = [pool.submit(cv2.imread, p) for p in chunks[i + 1]] if i + 1 < len(chunks) else []
+        yield chunk, [future.result() for future in current]
+
+
+def process_images(paths, results_path, annotate=True, output_dir=None, root=None,
+                   workers=8, batch_images=32, resume=True, progress=print):
+    """Run detection on ``paths``, appending one JSON line per image to ``results_path``.
+
+    Returns ``{"total", "skipped", "processed", "failed", "faces", "seconds", "images_per_sec"}``.
+    """
+    done = load_done(results_path) if resume else set()
+    todo = [p for p in paths if p not in done]
+    stats = {'total': len(paths), 'skipped': len(paths) - len(todo), 'processed': 0, 'failed': 0, 'faces': 0}
+    engine = get_engine()
+    engine.load()  # keep model loading out of the throughput figure
+
+    started = last_report = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool, \
+            open(results_path, 'a' if resume else 'w') as results:
+        for chunk, images in _windows(todo, pool, max(1, batch_images)):
+            readable = [i for i, image in enumerate(images) if image is not None]
+            detections = engine.detect_many([images[i] for i in readable])
+            records = [{'path': p, 'error': 'unreadable image'} for p in chunk]
+            writes = []
+            for i, result in zip(readable, detections):
+                h, w = images[i].shape[:2]
+                records[i] = {'path': chunk[i], 'width': w, 'height': h,
+                              'detections': result.to_list(), 'annotated': None}
+                if annotate:
+                    out = annotated_path(chunk[i], root, output_dir)
+                    annotated = engine.annotate(images[i], result, width=w)
+                    writes.append((i, pool.submit(_write_annotated, out, annotated)))
+                stats['faces'] += len(result)
+            for i, future in writes:
+                try:
+                    records[i]['annotated'] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to write annotated image for {chunk[i]}: {e}")
+            for record in records:
+                stats['failed' if 'error' in record else 'processed'] += 1
+                results.write(json.dumps(record, separators=(',', ':')) + "\n")
+            results.flush()
+
+            now = time.perf_counter()
+            if progress and now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                done_now = stats['processed'] + stats['failed']
+                progress(f"… {done_now}/{len(todo)} images ({done_now / (now - started):.1f} images/sec)")
+
+    stats['seconds'] = time.perf_counter() - started
+    stats['images_per_sec'] = (stats['processed'] + stats['failed']) / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m core.image_batch',
+                                     description="Detect masks in a directory (or glob) of images.")
+    parser.add_argument("source", type=str, help="Image directory (searched recursively) or glob pattern")
+    parser.add_argument("--results", type=str, default=None,
+                        help="JSON Lines results file (default: mask_results.jsonl in the directory)")
+    parser.add_argument("--output-dir", type=str, default=None,
+                        help=f"Where annotated images go (default: beside each image as <name>{ANNOTATED_SUFFIX}.png)")
+    parser.add_argument("--no-annotate", action="store_true", help="Only write the results file")
+    parser.add_argument("--no-resume", action="store_true", help="Start over instead of skipping recorded images")
+    parser.add_argument("--workers", type=int, default=8, help="Decode/encode threads (default: 8)")
+    parser.add_argument("--batch-images", type=int, default=32,
+                        help="Images whose face crops are classified in one call (default: 32)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = collect_images(args.source)
+    if not paths:
+        raise SystemExit(f"No images found for {args.source}")
+    root = args.source if os.path.isdir(args.source) else os.path.commonpath([os.path.dirname(p) or "." for p in paths])
+    results = args.results or os.path.join(root, "mask_results.jsonl")
+
+    stats = process_images(paths, results, annotate=not args.no_annotate, output_dir=args.output_dir, root=root,
+                           workers=args.workers, batch_images=args.batch_images, resume=not args.no_resume)
+    print(f"✅ {stats['processed']} images processed, {stats['faces']} faces, {stats['failed']} failed, "
+          f"{stats['skipped']} skipped (already in results) in {stats['seconds']:.1f}s "
+          f"({stats['images_per_sec']:.1f} images/sec)")
+    print(f"📝 Results: {results}")
+    return stats
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -2,6 +2,10 @@
 Model loader utilities for compatibility with newer TensorFlow/Keras versions.
 Builds a MobileNetV2-based architecture and loads weights by name to avoid
 legacy deserialization issues in old .h5 model files.
+
+The first successful load of a legacy ``.h5`` is persisted as a native
+``.keras`` artifact with a manifest next to the source; later boots load that
+artifact directly while the source hash still matches.
 """
 from __future__ import annotations
 
@@ -9,19 +13,26 @@ from pathlib import Path
 from typing import Iterable, Optional
 
 import os
+import threading
+
+import numpy as np
 import tensorflow as tf
+
+from core.backends import (file_sha256, host_preprocess_mode, model_normalizes_input,  # noqa: F401 (re-exported)
+                           read_manifest, write_manifest)
 from tensorflow import keras
 from tensorflow.keras import layers
 from tensorflow.keras.layers import DepthwiseConv2D as KDepthwiseConv2D, Layer
 
 
-def build_compat_model(input_shape=(224, 224, 3), classes: int = 2) -> keras.Model:
+def build_compat_model(input_shape=(224, 224, 3), classes: int = 2,
+                       weights: Optional[str] = "imagenet") -> keras.Model:
     inputs = keras.Input(shape=input_shape, name="input_layer_1")
     x = layers.Rescaling(1.0 / 127.5, offset=-1.0, name="preprocessing")(inputs)
 
     base = keras.applications.MobileNetV2(
         include_top=False,
-        weights="imagenet",
+        weights=weights,
         input_shape=input_shape,
         pooling=None,
         alpha=1.0,
@@ -82,6 +93,7 @@ def resolve_model_path(configured_path: Path | str,
 def TrueDivide(x, denom=127.5, **kwargs):
     return (x / denom) - 1.0
 
+
 class CompatibleDepthwiseConv2D(KDepthwiseConv2D):
     @classmethod
     def from_config(cls, config):
@@ -131,22 +143,134 @@ def _infer_classes_from_h5(model_path: Path) -> Optional[int]:
     return None
 
 
-def load_mask_model(model_path: Path | str) -> keras.Model | None:
+def load_mask_model(model_path: Path | str, backend: str = "keras",
+                    num_threads: Optional[int] = None,
+                    inter_op_threads: Optional[int] = None,
+                    graph_optimization: str = "all",
+                    persist_artifact: bool = True):
+    """Load the mask classifier with the requested inference backend.
+
+    ``backend`` is ``"keras"`` (default), ``"tflite"`` or ``"onnx"``. Whatever
+    is returned exposes ``predict(x, verbose=0)``, so callers don't care which
+    backend is active. ``num_threads`` sets the TFLite interpreter threads or
+    the ONNX Runtime intra-op threads; ``inter_op_threads`` and
+    ``graph_optimization`` only apply to ONNX Runtime. ``persist_artifact``
+    writes/reuses the normalized ``.keras`` artifact of a legacy ``.h5``.
+    Returns ``None`` when the model cannot be loaded.
+    """
+    backend = (backend or "keras").lower()
+
+    def keras_loader(path):
+        return _load_keras_model(path, persist_artifact=persist_artifact)
+
+    if backend == "keras":
+        return keras_loader(model_path)
+
+    from core.backends import BACKENDS, load_onnx_classifier, load_tflite_classifier
+    try:
+        if backend == "tflite":
+            return load_tflite_classifier(Path(model_path), keras_loader, num_threads=num_threads)
+        if backend == "onnx":
+            return load_onnx_classifier(Path(model_path), keras_loader,
+                                        intra_op_threads=num_threads,
+                                        inter_op_threads=inter_op_threads,
+                                        graph_optimization=graph_optimization)
+        raise ValueError(f"Unknown inference backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+    except Exception as e:
+        print(f"❌ {backend} backend failed to load: {e}")
+        return None
+
+
+_CUSTOM_OBJECTS = {
+    'TrueDivide': TrueDivide,
+    'CompatibleDepthwiseConv2D': CompatibleDepthwiseConv2D,
+    'DepthwiseConv2D': CompatibleDepthwiseConv2D,
+}
+
+
+def normalized_artifact_path(model_path: Path | str) -> Path:
+    """``models/x.h5`` -> ``models/x.keras``."""
+    return Path(model_path).with_suffix(".keras")
+
+
+def _load_normalized_artifact(model_path: Path, source_hash: str):
+    """The persisted ``.keras`` artifact of ``model_path`` if its manifest matches the source."""
+    artifact = normalized_artifact_path(model_path)
+    manifest = read_manifest(artifact)
+    if not artifact.exists() or manifest.get("source_sha256") != source_hash:
+        return None
+    try:
+        # safe_mode=False: legacy Lambda layers (TrueDivide) are stored as code;
+        # the artifact is only ever written by this loader.
+        model = keras.models.load_model(str(artifact), compile=False,
+                                        custom_objects=_CUSTOM_OBJECTS, safe_mode=False)
+        print(f"✅ Loaded normalized model artifact: {artifact} (built via {manifest.get('strategy')})")
+        return model
+    except Exception as e:
+        print(f"⚠️ Normalized model artifact unusable, reloading source: {e}")
+        return None
+
+
+def _persist_normalized_artifact(model, model_path: Path, source_hash: str, strategy: str) -> None:
+    """Save ``model`` as ``<model>.keras`` plus manifest; failures only cost the next boot."""
+    if not isinstance(model, keras.Model):
+        print(f"ℹ️ Not persisting {type(model).__module__} model; only Keras 3 models are cached")
+        return
+    artifact = normalized_artifact_path(model_path)
+    tmp_path = artifact.with_name(f"{artifact.stem}.{os.getpid()}.tmp.keras")
+    try:
+        model.save(str(tmp_path))
+        os.replace(tmp_path, artifact)
+        write_manifest(artifact,
+                       source=model_path.name,
+                       source_sha256=source_hash,
+                       strategy=strategy,
+                       classes=int(model.output_shape[-1]),
+                       input_shape=[int(d) for d in model.input_shape[1:]],
+                       normalizes_input=model_normalizes_input(model),
+                       keras_version=keras.__version__)
+        print(f"💾 Saved normalized model artifact: {artifact}")
+    except Exception as e:
+        print(f"⚠️ Could not persist normalized model artifact: {e}")
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+
+
+def _load_keras_model(model_path: Path | str, persist_artifact: bool = True) -> keras.Model | None:
     model_path = Path(model_path)
 
+    from core.backends import SavedModelClassifier, is_saved_model_dir
+    if is_saved_model_dir(model_path):
+        # uint8 serving export (see export_serving_model)
+        try:
+            model = SavedModelClassifier(model_path)
+            print(f"✅ SavedModel loaded: {model_path}")
+            return model
+        except Exception as e:
+            print(f"❌ SavedModel load failed: {e}")
+            return None
+
+    persist_artifact = persist_artifact and model_path.suffix == ".h5" and model_path.is_file()
+    if persist_artifact:
+        source_hash = file_sha256(model_path)
+        model = _load_normalized_artifact(model_path, source_hash)
+        if model is not None:
+            return model
+
+    model, strategy = _load_legacy_model(model_path)
+    if model is not None and persist_artifact:
+        _persist_normalized_artifact(model, model_path, source_hash, strategy)
+    return model
+
+
+def _load_legacy_model(model_path: Path):
+    """Try the three legacy loading strategies; returns ``(model, strategy)``."""
     # 1) Prefer legacy tf.keras load with custom objects
     try:
         print("🔄 Attempting legacy model load with tf.keras (custom_objects)...")
-        legacy = keras.models.load_model(
-            str(model_path), compile=False,
-            custom_objects={
-                'TrueDivide': TrueDivide,
-                'CompatibleDepthwiseConv2D': CompatibleDepthwiseConv2D,
-                'DepthwiseConv2D': CompatibleDepthwiseConv2D,
-            }
-        )
+        legacy = keras.models.load_model(str(model_path), compile=False, custom_objects=_CUSTOM_OBJECTS)
         print("✅ Legacy model loaded successfully.")
-        return legacy
+        return legacy, "keras"
     except Exception as e1:
         print(f"❌ Legacy tf.keras load failed: {e1}")
 
@@ -156,20 +280,162 @@ def load_mask_model(model_path: Path | str) -> keras.Model | None:
         import tf_keras as keras_legacy  # type: ignore
         legacy2 = keras_legacy.models.load_model(str(model_path), compile=False)
         print("✅ Legacy tf_keras model loaded successfully.")
-        return legacy2
+        return legacy2, "tf_keras"
     except Exception as e2:
         print(f"❌ tf_keras load failed: {e2}")
 
-    # 3) Fallback: build compatible architecture and load weights by name
+    # 3) Fallback: build compatible architecture and load weights by name.
+    # The backbone weights come from the file, so skip the ImageNet download.
     inferred_classes = _infer_classes_from_h5(model_path) or 2
     if inferred_classes != 2:
         print(f"ℹ️ Building compatible model with {inferred_classes} output classes")
-    model = build_compat_model(classes=inferred_classes)
+    model = build_compat_model(classes=inferred_classes, weights=None)
     try:
         model.load_weights(str(model_path), by_name=True, skip_mismatch=True)
         print("✅ Weights loaded into compatible architecture.")
-        return model
+        return model, "compat_weights"
     except Exception as e3:
         print(f"⚠️ Could not load weights into compat architecture: {e3}")
         print("💡 Consider retraining or converting the model to a compatible format.")
-        return None
+        return None, None
+
+
+def bucket_size(n: int, max_bucket: int) -> int:
+    """Smallest power of two >= ``n``, capped at ``max_bucket``."""
+    bucket = 1
+    while bucket < n and bucket < max_bucket:
+        bucket *= 2
+    return min(bucket, max_bucket)
+
+
+class BucketedPredictor:
+    """Retrace-free fast inference path around a Keras model.
+
+    Batches are zero-padded up to the next power-of-two bucket (1, 2, 4, ...
+    ``max_bucket``) and run through a concrete ``tf.function`` traced once
+    per bucket with a fixed input signature. Larger batches are split into
+    ``max_bucket`` chunks. Exposes the same ``predict(x, verbose=0)`` call as
+    the wrapped model so callers don't care which one they hold.
+    """
+
+    def __init__(self, model: keras.Model, max_bucket: int = 32):
+        self.model = model
+        self.max_bucket = bucket_size(max(1, int(max_bucket)), 1 << 30)
+        self.input_shape = tuple(int(d) for d in model.input_shape[1:])
+        self.normalizes_input = model_normalizes_input(model)
+
+        @tf.function
+        def call(x):
+            return model(x, training=False)
+
+        self._call = call
+        self._concrete = {}
+        self._lock = threading.Lock()
+
+    @property
+    def buckets(self) -> list:
+        b, out = 1, []
+        while b <= self.max_bucket:
+            out.append(b)
+            b *= 2
+        return out
+
+    @property
+    def trace_count(self) -> int:
+        return len(self._concrete)
+
+    def _function_for(self, bucket: int):
+        fn = self._concrete.get(bucket)
+        if fn is None:
+            with self._lock:
+                fn = self._concrete.get(bucket)
+                if fn is None:
+                    spec = tf.TensorSpec((bucket,) + self.input_shape, tf.float32)
+                    fn = self._call.get_concrete_function(spec)
+                    self._concrete[bucket] = fn
+        return fn
+
+    def warmup(self) -> None:
+        """Trace every bucket up front so the first requests don't pay for it."""
+        for bucket in self.buckets:
+            self.predict(np.zeros((bucket,) + self.input_shape, dtype=np.float32))
+
+    def predict(self, x, verbose=0) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        n = len(x)
+        if n == 0:
+            return np.zeros((0,) + tuple(self.model.output_shape[1:]), dtype=np.float32)
+
+        outputs = []
+        for start in range(0, n, self.max_bucket):
+            chunk = x[start:start + self.max_bucket]
+            bucket = bucket_size(len(chunk), self.max_bucket)
+            if bucket != len(chunk):
+                padded = np.zeros((bucket,) + chunk.shape[1:], dtype=np.float32)
+                padded[:len(chunk)] = chunk
+                chunk = padded
+            out = self._function_for(bucket)(tf.constant(chunk))
+            outputs.append(np.asarray(out)[:min(self.max_bucket, n - start)])
+        return outputs[0] if len(outputs) == 1 else np.concatenate(outputs)
+
+
+def make_fast_predictor(model, max_bucket: int = 32):
+    """Wrap a Keras model in :class:`BucketedPredictor`; other objects pass through."""
+    if isinstance(model, keras.Model):
+        return BucketedPredictor(model, max_bucket=max_bucket)
+    return model
+
+
+# ----------------------------------------------------------------------
+# uint8 serving export
+# ----------------------------------------------------------------------
+class BgrUint8ToFloat(Layer):
+    """Raw OpenCV crops (uint8, BGR) -> float32 RGB, inside the serving graph."""
+
+    def call(self, inputs):
+        return keras.ops.flip(keras.ops.cast(inputs, "float32"), axis=-1)
+
+
+def build_uint8_serving_model(model: keras.Model) -> keras.Model:
+    """Wrap ``model`` so it takes uint8 ``[N, H, W, 3]`` BGR crops.
+
+    Color swap, float conversion and (unless the model already does it)
+    MobileNetV2 normalization all run in-graph.
+    """
+    input_shape = tuple(int(d) for d in model.input_shape[1:])
+    inputs = keras.Input(shape=input_shape, dtype="uint8", name="faces")
+    x = BgrUint8ToFloat(name="bgr_uint8_to_float")(inputs)
+    if not model_normalizes_input(model):
+        x = layers.Rescaling(1.0 / 127.5, offset=-1.0, name="preprocessing")(x)
+    outputs = model(x)
+    return keras.Model(inputs, outputs, name=f"{model.name}_uint8_serving")
+
+
+SERVING_FORMATS = ("savedmodel", "tflite", "onnx")
+
+
+def export_serving_model(model, output_path: Path | str, fmt: str = "savedmodel") -> Path:
+    """Export ``model`` with a uint8 BGR serving signature as a SavedModel, TFLite or ONNX file.
+
+    Load the result with ``load_mask_model`` (``INFERENCE_BACKEND`` matching
+    the format); the engine then only resizes crops on the host.
+    """
+    from core.backends import convert_to_onnx, convert_to_tflite, write_manifest
+
+    fmt = fmt.lower()
+    output_path = Path(output_path)
+    serving = build_uint8_serving_model(model)
+
+    if fmt == "savedmodel":
+        serving.export(str(output_path))
+        print(f"💾 Wrote SavedModel: {output_path}")
+    elif fmt == "tflite":
+        convert_to_tflite(serving, output_path)
+    elif fmt == "onnx":
+        convert_to_onnx(serving, output_path)
+    else:
+        raise ValueError(f"Unknown serving format '{fmt}' (expected one of {', '.join(SERVING_FORMATS)})")
+
+    write_manifest(output_path, input_dtype="uint8", color_order="bgr", normalizes_input=True,
+                   input_shape=[int(d) for d in model.input_shape[1:]])
+    return output_path
@@ -44,4 +44,43 @@ class PerformanceTracker:
         if exc_type is None:
             logger.info(f"Operation '{self.operation_name}' completed in {execution_time:.4f}s")
         else:
-            logger.error(f"Operation '{self.operation_name}' failed after {execution_time:.4f}s")
\ No newline at end of file
+            logger.error(f"Operation '{self.operation_name}' failed after {execution_time:.4f}s")
+
+# Modules that must stay out of the web app's import path (loaded lazily by the engine)
+HEAVY_MODULES = ('tensorflow', 'keras', 'tf_keras', 'onnxruntime', 'tf2onnx')
+
+
+def import_time_report(statement="from app import create_app; create_app('testing')", python=None):
+    """Run ``statement`` in a fresh interpreter under ``python -X importtime``.
+
+    Returns a dict with the total import time in milliseconds, the per-module
+    ``(name, self_ms, cumulative_ms)`` entries sorted by cumulative time, the
+    set of loaded top-level packages and the subprocess wall time.
+    """
+    import json
+    import subprocess
+    import sys
+
+    probe = f"{statement}\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))"
+    start = time.time()
+    proc = subprocess.run([python or sys.executable, '-X', 'importtime', '-c', probe],
+                          capture_output=True, text=True, check=True)
+    wall_ms = (time.time() - start) * 1000.0
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            _, self_us, cumulative_us, name = (part.strip() for part in line.replace('import time:', '|').split('|'))
+            modules.append((name, int(self_us) / 1000.0, int(cumulative_us) / 1000.0))
+        except ValueError:
+            continue
+
+    loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        'total_ms': sum(self_ms for _, self_ms, _ in modules),
+        'wall_ms': wall_ms,
+        'modules': sorted(modules, key=lambda m: m[2], reverse=True),
+        'packages': sorted({name.split('.')[0] for name in loaded}),
+    }
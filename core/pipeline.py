@@ -0,0 +1,212 @@
+"""
+Staged video pipeline for the Mask Detection System
+
+``VideoPipeline`` splits a video stream into capture, detect, classify and
+encode stages, each on its own thread with bounded queues in between:
+
+    FrameGrabber -> detect (faces, tracking) -> classify -> encode (JPEG or JSON) -> client
+
+OpenCV and TensorFlow release the GIL, so the stages overlap and a stream
+runs at roughly the rate of its slowest stage instead of the sum of all of
+them. Full queues push back on the stage before them; in latest-frame mode
+that ends at the grabber, which drops stale frames. Queue depths and stage
+counters of all live pipelines are reported by :func:`pipeline_stats`.
+"""
+import queue
+import threading
+import time
+
+from config import Config
+from core.encoding import create_frame_encoder, stream_settings
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+STAGES = ('detect', 'classify', 'encode')
+# Queue each stage writes to
+_OUTPUTS = {'detect': 'classify', 'classify': 'encode', 'encode': 'output'}
+
+# End of stream marker passed down the queues
+_END = object()
+
+_active = set()
+_totals = {stage: 0 for stage in STAGES}
+_totals.update({f'{stage}_seconds': 0.0 for stage in STAGES})
+_lock = threading.Lock()
+
+
+def pipeline_stats():
+    """Live stream count, summed queue depths and per-stage counters of this process."""
+    with _lock:
+        pipelines = list(_active)
+        totals = dict(_totals)
+    depths = [p.queue_depths() for p in pipelines]
+    stats = {'streams': len(pipelines)}
+    for name in ('detect', 'classify', 'encode', 'output'):
+        stats[f'{name}_queue_depth'] = sum(d[name] for d in depths)
+    stats.update(totals)
+    return stats
+
+
+class VideoPipeline:
+    """Detect, classify and encode the frames of ``grabber`` on three worker threads.
+
+    Iterating yields the encoded frames for ``settings`` (multipart JPEG for
+    a :func:`~core.encoding.stream_settings` tuple, the default, or detection
+    JSON for :func:`~core.encoding.metadata_settings`) until the stream ends or a stage fails; :meth:`outputs` encodes several
+    settings at once for shared streams. :meth:`close` stops the workers and
+    releases the grabber. ``tracker`` is a per-stream
+    :class:`~core.tracking.FaceTracker` or ``None``.
+    """
+
+    def __init__(self, grabber, engine, tracker=None, settings=None, queue_size=None, name='video',
+                 jpeg_encoder=None):
+        self.grabber = grabber
+        self.engine = engine
+        self.tracker = tracker
+        self.settings = settings or stream_settings()
+        self._variants = lambda: (self.settings,)
+        self._jpeg_encoder = jpeg_encoder
+        self._encoders = {}
+        size = max(1, queue_size or Config.PIPELINE_QUEUE_SIZE)
+        # Each queue holds the input of the named stage; 'output' waits for the client
+        self._queues = {name: queue.Queue(maxsize=size) for name in ('classify', 'encode', 'output')}
+        self._stop = threading.Event()
+        self.frames = {stage: 0 for stage in STAGES}
+        self.busy_seconds = {stage: 0.0 for stage in STAGES}
+
+        with _lock:
+            _active.add(self)
+        self._threads = [
+            threading.Thread(target=self._worker, args=(stage,), name=f'{name}-{stage}', daemon=True)
+            for stage in STAGES
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __iter__(self):
+        for chunks in self._results():
+            if self.settings in chunks:
+                yield chunks[self.settings]
+
+    def outputs(self, variants):
+        """Yield ``{settings: chunk}`` per frame for the settings returned by ``variants()``.
+
+        ``variants`` is called for every frame, so outputs can be added and
+        dropped while the stream runs; settings whose frame was throttled or
+        unchanged are missing from the dict.
+        """
+        self._variants = variants
+        return self._results()
+
+    def _results(self):
+        out = self._queues['output']
+        while True:
+            try:
+                item = out.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if item is _END:
+                return
+            yield item
+
+    def queue_depths(self):
+        depths = {name: q.qsize() for name, q in self._queues.items()}
+        depths['detect'] = self.grabber.pending()
+        return depths
+
+    def stats(self):
+        return {
+            'frames': dict(self.frames),
+            'stage_ms': {stage: (self.busy_seconds[stage] / self.frames[stage] * 1000.0) if self.frames[stage] else 0.0
+                         for stage in STAGES},
+            'queue_depths': self.queue_depths(),
+            'encoders': {str(settings): encoder.stats() for settings, encoder in self._encoders.items()},
+        }
+
+    def close(self, timeout=2.0):
+        """Stop every stage, release the grabber and log the stream's stats (once)."""
+        with _lock:
+            if self not in _active:
+                return
+            _active.discard(self)
+        self._stop.set()
+        self.grabber.release()
+        for thread in self._threads:
+            thread.join(timeout)
+        logger.info(f"Video pipeline stats: capture {self.grabber.stats()}, stages {self.stats()}")
+        if self.tracker is not None:
+            logger.info(f"Video pipeline tracking stats: {self.tracker.stats()}")
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+    def _detect(self, frame):
+        index, timestamp = self.frames['detect'], time.time()
+        rects, track_ids = self.engine.locate_faces(frame, tracker=self.tracker)
+        return index, timestamp, frame, rects, track_ids
+
+    def _classify(self, item):
+        index, timestamp, frame, rects, track_ids = item
+        detections = self.engine.classify_detections(frame, rects, track_ids, tracker=self.tracker)
+        return index, timestamp, frame, detections
+
+    def _encode(self, item):
+        index, timestamp, frame, detections = item
+        # One encoder per requested output; encoders of departed outputs are dropped
+        encoders = {}
+        for settings in self._variants():
+            encoders[settings] = self._encoders.get(settings) or create_frame_encoder(settings, self._jpeg_encoder)
+        self._encoders = encoders
+        chunks = {}
+        for settings, encoder in encoders.items():
+            chunk = encoder.encode(self.engine, frame, detections, index=index, timestamp=timestamp)
+            if chunk is not None:
+                chunks[settings] = chunk
+        return chunks or None
+
+    def _worker(self, stage):
+        step = getattr(self, f'_{stage}')
+        out = self._queues[_OUTPUTS[stage]]
+        try:
+            while not self._stop.is_set():
+                item = self._next(stage)
+                if item is _END:
+                    break
+                start = time.perf_counter()
+                result = step(item)
+                elapsed = time.perf_counter() - start
+                self.frames[stage] += 1
+                self.busy_seconds[stage] += elapsed
+                with _lock:
+                    _totals[stage] += 1
+                    _totals[f'{stage}_seconds'] += elapsed
+                if result is not None:
+                    self._put(out, result)
+            self._put(out, _END)
+        except Exception as e:
+            logger.exception(f"Video pipeline {stage} stage failed: {e}")
+            self._stop.set()
+
+    def _next(self, stage):
+        """Next input of ``stage``, or ``_END`` once the stream is over."""
+        if stage == 'detect':
+            ret, frame = self.grabber.read()
+            return frame if ret else _END
+        q = self._queues[stage]
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
@@ -0,0 +1,271 @@
+"""
+Face tracking between detection keyframes for the Mask Detection System
+
+``FaceTracker`` runs the face detector only on keyframes (every
+``keyframe_interval`` frames, or as soon as a track is lost) and propagates
+boxes in between with pyramidal Lucas-Kanade optical flow over a grid of
+points per face (median-flow: forward-backward filtered median translation
+and scale). Detections are associated with existing tracks by IoU so track
+ids stay stable. Track state lives in a few NumPy arrays.
+
+Each track also keeps an exponential moving average of its class
+probabilities. A track is only re-classified when its crop hash drifts,
+its smoothed prediction is ambiguous or its last classification is too old,
+which both saves classifier calls and stops labels from flickering.
+"""
+import threading
+
+import cv2
+import numpy as np
+
+from core.cache import hamming_distances
+
+_LK_PARAMS = dict(winSize=(15, 15), maxLevel=2,
+                  criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU of ``[N, 4]`` and ``[M, 4]`` ``(x, y, w, h)`` boxes -> ``[N, M]``."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(1, -1, 4)
+    iw = np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2]) - np.maximum(a[..., 0], b[..., 0])
+    ih = np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3]) - np.maximum(a[..., 1], b[..., 1])
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+def greedy_match(ious, threshold):
+    """Greedy one-to-one assignment by descending IoU; returns ``(rows, cols)`` of matches."""
+    rows, cols = [], []
+    if ious.size:
+        ious = ious.copy()
+        while True:
+            r, c = np.unravel_index(np.argmax(ious), ious.shape)
+            if ious[r, c] < threshold:
+                break
+            rows.append(r)
+            cols.append(c)
+            ious[r, :] = -1.0
+            ious[:, c] = -1.0
+    return np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)
+
+
+class FaceTracker:
+    """Keyframe detection plus optical-flow propagation for one video stream.
+
+    Boxes are ``(x, y, w, h)`` in the coordinates of the grayscale frames
+    passed to :meth:`update`. Keep one tracker per stream; classification
+    state is keyed by track id, so a pipelined stream may classify one frame
+    while :meth:`update` already follows the next.
+    """
+
+    def __init__(self, keyframe_interval=5, iou_threshold=0.3, grid_size=5,
+                 max_fb_error=2.0, min_points=5,
+                 ema_alpha=0.5, max_age=15, max_hash_distance=6, ambiguous_gap=0.2):
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.iou_threshold = iou_threshold
+        self.grid_size = grid_size
+        self.max_fb_error = max_fb_error
+        self.min_points = min_points
+        self.ema_alpha = ema_alpha
+        self.max_age = max_age
+        self.max_hash_distance = max_hash_distance
+        self.ambiguous_gap = ambiguous_gap
+
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int32)
+        # Per-track classification state (NaN probabilities = never classified)
+        self.probs = None
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.classified_at = np.zeros(0, dtype=np.int64)
+        self._next_id = 0
+        self._prev_gray = None
+        self._since_keyframe = 0
+        self._lock = threading.RLock()
+
+        self.frames = 0
+        self.keyframes = 0
+        self.lost = 0
+        self.classified = 0
+        self.reused = 0
+
+    def update(self, gray, detect):
+        """Advance the tracks to ``gray`` and return ``(boxes int32 [T, 4], ids int32 [T])``.
+
+        ``detect()`` returns detector boxes in ``gray`` coordinates and is only
+        called on keyframes.
+        """
+        with self._lock:
+            return self._update(gray, detect)
+
+    def _update(self, gray, detect):
+        self.frames += 1
+        lost = False
+        if self._prev_gray is not None and self._prev_gray.shape == gray.shape and len(self.boxes):
+            boxes, ok = self._propagate(self._prev_gray, gray, self.boxes)
+            lost = not ok.all()
+            self.lost += int((~ok).sum())
+            self.boxes = boxes[ok]
+            self._take(np.flatnonzero(ok))
+
+        self._since_keyframe += 1
+        if lost or self._prev_gray is None or self._prev_gray.shape != gray.shape \
+                or self._since_keyframe >= self.keyframe_interval:
+            self._associate(np.asarray(detect(), dtype=np.float32).reshape(-1, 4))
+            self._since_keyframe = 0
+            self.keyframes += 1
+
+        self._prev_gray = gray
+        return np.rint(self.boxes).astype(np.int32), self.ids.copy()
+
+    def stale(self, ids, hashes):
+        """Mask of the tracks ``ids`` that need a fresh classification, given their crop ``hashes``.
+
+        A track is stale when it was never classified, its crop dHash moved
+        more than ``max_hash_distance`` bits, its smoothed top-two gap is below
+        ``ambiguous_gap`` or it was classified ``max_age`` or more frames ago.
+        Ids that are no longer tracked are always stale.
+        """
+        ids = np.asarray(ids, dtype=np.int32)
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        with self._lock:
+            pos, present = self._positions(ids)
+            stale = np.ones(len(ids), dtype=bool)
+            if self.probs is None or not present.any():
+                return stale
+            probs = self.probs[pos[present]]
+            never = np.isnan(probs[:, 0])
+            drifted = hamming_distances(self.hashes[pos[present]], hashes[present]) > self.max_hash_distance
+            top_two = np.sort(np.nan_to_num(probs), axis=1)[:, -2:]
+            ambiguous = top_two[:, 1] - top_two[:, 0] < self.ambiguous_gap
+            expired = self.frames - self.classified_at[pos[present]] >= self.max_age
+            stale[present] = never | drifted | ambiguous | expired
+            return stale
+
+    def update_probabilities(self, ids, stale, preds, hashes):
+        """Blend ``preds`` (one row per ``stale`` entry of ``ids``, in order) into the moving averages.
+
+        Returns the smoothed ``[N, C]`` probabilities of the tracks ``ids``;
+        ids that are no longer tracked get their fresh prediction as is.
+        ``preds`` may be ``None`` when no track is stale.
+        """
+        ids = np.asarray(ids, dtype=np.int32)
+        stale = np.asarray(stale, dtype=bool)
+        with self._lock:
+            pos, present = self._positions(ids)
+            if preds is None or not stale.any():
+                self.reused += len(ids)
+                return None if self.probs is None else self.probs[pos]
+            preds = np.asarray(preds, dtype=np.float32)
+            if self.probs is None:
+                self.probs = np.full((len(self.ids), preds.shape[1]), np.nan, dtype=np.float32)
+            result = np.empty((len(ids), preds.shape[1]), dtype=np.float32)
+            result[stale] = preds
+            update = stale & present
+            idx = pos[update]
+            fresh, old = preds[update[stale]], self.probs[idx]
+            self.probs[idx] = np.where(np.isnan(old[:, 0])[:, None], fresh,
+                                       self.ema_alpha * fresh + (1.0 - self.ema_alpha) * old)
+            self.hashes[idx] = np.asarray(hashes, dtype=np.uint64)[update]
+            self.classified_at[idx] = self.frames
+            result[present] = self.probs[pos[present]]
+            self.classified += int(stale.sum())
+            self.reused += len(ids) - int(stale.sum())
+            return result
+
+    def reset(self):
+        with self._lock:
+            self.boxes = self.boxes[:0]
+            self._take(np.zeros(0, dtype=np.intp))
+            self._prev_gray = None
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'keyframes': self.keyframes,
+            'tracks': len(self.ids),
+            'lost': self.lost,
+            'detector_call_ratio': (self.keyframes / self.frames) if self.frames else 0.0,
+            'classified': self.classified,
+            'reused': self.reused,
+        }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _positions(self, ids):
+        """Index of every id in the current tracks and a mask of the ids still tracked."""
+        order = np.argsort(self.ids)
+        pos = order[np.clip(np.searchsorted(self.ids[order], ids), 0, max(len(order) - 1, 0))] \
+            if len(order) else np.zeros(len(ids), dtype=np.intp)
+        present = (self.ids[pos] == ids) if len(order) else np.zeros(len(ids), dtype=bool)
+        return pos, present
+
+    def _take(self, index):
+        """Reorder per-track state by ``index`` into the current tracks; ``-1`` starts a new track."""
+        new = index < 0
+        src = np.where(new, 0, index)
+        n_new = int(new.sum())
+        ids = self.ids[src] if len(self.ids) else np.zeros(len(index), dtype=np.int32)
+        ids[new] = np.arange(self._next_id, self._next_id + n_new, dtype=np.int32)
+        self._next_id += n_new
+        self.ids = ids
+        self.hashes = self.hashes[src] if len(self.hashes) else np.zeros(len(index), dtype=np.uint64)
+        self.classified_at = (self.classified_at[src] if len(self.classified_at)
+                              else np.zeros(len(index), dtype=np.int64))
+        if self.probs is not None:
+            probs = (self.probs[src] if len(self.probs)
+                     else np.zeros((len(index), self.probs.shape[1]), dtype=np.float32))
+            probs[new] = np.nan
+            self.probs = probs
+
+    def _associate(self, detections):
+        """Replace the tracks by ``detections``, keeping the state of the best IoU match."""
+        detections = detections[(detections[:, 2] >= 1) & (detections[:, 3] >= 1)]
+        index = np.full(len(detections), -1, dtype=np.intp)
+        rows, cols = greedy_match(iou_matrix(self.boxes, detections), self.iou_threshold)
+        index[cols] = rows
+        self.boxes = detections
+        self._take(index)
+
+    def _grid_points(self, boxes):
+        """``grid_size x grid_size`` points over the inner 80% of every box -> ``[T * G, 2]``."""
+        steps = (np.arange(self.grid_size, dtype=np.float32) + 0.5) / self.grid_size * 0.8 + 0.1
+        gx, gy = np.meshgrid(steps, steps)
+        offsets = np.stack([gx.ravel(), gy.ravel()], axis=1)                     # [G, 2]
+        return (boxes[:, None, :2] + offsets[None] * boxes[:, None, 2:]).reshape(-1, 2)
+
+    def _propagate(self, prev_gray, gray, boxes):
+        """Median-flow update of every box; returns ``(new boxes, ok mask)``."""
+        g = self.grid_size * self.grid_size
+        points = self._grid_points(boxes).astype(np.float32).reshape(-1, 1, 2)
+        forward, status_f, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, **_LK_PARAMS)
+        backward, status_b, _ = cv2.calcOpticalFlowPyrLK(gray, prev_gray, forward, None, **_LK_PARAMS)
+
+        points, forward = points.reshape(-1, g, 2), forward.reshape(-1, g, 2)
+        fb_error = np.linalg.norm(backward.reshape(-1, g, 2) - points, axis=2)
+        valid = ((status_f.ravel() == 1) & (status_b.ravel() == 1)).reshape(-1, g) & (fb_error < self.max_fb_error)
+
+        h_img, w_img = gray.shape[:2]
+        new_boxes = boxes.copy()
+        ok = valid.sum(axis=1) >= self.min_points
+        for t in np.flatnonzero(ok):
+            old, new = points[t][valid[t]], forward[t][valid[t]]
+            dx, dy = np.median(new - old, axis=0)
+            # scale: median ratio of pairwise point distances
+            iu = np.triu_indices(len(old), k=1)
+            d_old = np.linalg.norm(old[:, None] - old[None], axis=2)[iu]
+            d_new = np.linalg.norm(new[:, None] - new[None], axis=2)[iu]
+            keep = d_old > 1e-3
+            scale = float(np.median(d_new[keep] / d_old[keep])) if keep.any() else 1.0
+
+            x, y, w, h = boxes[t]
+            cx, cy = x + w / 2 + dx, y + h / 2 + dy
+            w, h = w * scale, h * scale
+            x0, y0 = max(0.0, cx - w / 2), max(0.0, cy - h / 2)
+            x1, y1 = min(float(w_img), cx + w / 2), min(float(h_img), cy + h / 2)
+            new_boxes[t] = (x0, y0, x1 - x0, y1 - y0)
+            # mostly outside the frame or collapsed: lost, let the next keyframe decide
+            ok[t] = (x1 - x0) >= max(0.5 * w, 1.0) and (y1 - y0) >= max(0.5 * h, 1.0)
+        return new_boxes, ok
@@ -1,7 +1,6 @@
 import os
 import cv2
-from tensorflow.keras.utils import img_to_array
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input as mv2_preprocess_input
+import numpy as np
 
 # Optional: control class order if the trained model outputs ['without_mask', 'with_mask']
 MASK_CLASS_ORDER = os.environ.get('MASK_CLASS_ORDER', 'mask_first').lower()
@@ -18,116 +17,177 @@ FORCE_ARGMAX = os.environ.get('FORCE_ARGMAX', '0').strip() == '1'
 # Optional debug for prediction vectors
 DEBUG_PRED = os.environ.get('DEBUG_PRED', '0').strip() == '1'
 
-# Preprocessing mode: 'none' or 'mobilenet_v2'
-PREPROCESS_MODE = os.environ.get('PREPROCESS_MODE', 'mobilenet_v2').strip().lower()
+# Preprocessing mode: 'auto' (normalize on the host only if the model does not
+# do it in-graph), 'none' or 'mobilenet_v2'
+PREPROCESS_MODE = os.environ.get('PREPROCESS_MODE', 'auto').strip().lower()
 
 
-def preprocess_face_frame(face_frame):
+def preprocess_face_frame(face_frame, mode=None):
+    mode = mode or PREPROCESS_MODE
+    if mode == 'raw':
+        # uint8 serving signature: color swap and normalization happen in-graph
+        return cv2.resize(face_frame, (224, 224))
     # convert to RGB
     face_frame = cv2.cvtColor(face_frame, cv2.COLOR_BGR2RGB)
     # preprocess input image for mobilenet
     face_frame_resized = cv2.resize(face_frame, (224, 224))
-    face_frame_array = img_to_array(face_frame_resized)
-    # Optional normalization to match MobileNetV2 training
-    if PREPROCESS_MODE in ('mobilenet_v2', 'mv2'):
-        face_frame_array = mv2_preprocess_input(face_frame_array)
+    face_frame_array = face_frame_resized.astype(np.float32)
+    # Optional normalization to match MobileNetV2 training (scale to [-1, 1])
+    if mode in ('mobilenet_v2', 'mv2', 'auto'):
+        face_frame_array /= 127.5
+        face_frame_array -= 1.0
     return face_frame_array
 
 
-def decode_prediction(pred):
-    """Decode model prediction into human-readable label.
+class FaceBatchBuffer:
+    """Reusable ``[N, 224, 224, 3]`` buffers for batched face preprocessing.
 
-    Supports 2-class (mask/no_mask) and 3-class (mask/no_mask/improper) outputs.
-    Uses thresholds and an ambiguity delta to flag potential improper/partial mask wear.
+    Every crop is resized straight into a preallocated uint8 slot; color swap,
+    float conversion and normalization then run once over the whole batch.
+    Slots are allocated on demand, growing to the next power of two, so a
+    thread that only ever sees one face holds one slot rather than a full
+    ``BATCH_MAX_SIZE`` batch (~0.75 MB per slot). The returned array is a view
+    into the buffer and is only valid until the next ``fill`` call, so keep
+    one buffer per thread.
     """
-    # Normalize to Python list for safety
-    probs = list(pred)
+
+    def __init__(self, max_faces=0, size=(224, 224)):
+        self.size = size
+        self._uint8 = np.empty((0, size[1], size[0], 3), dtype=np.uint8)
+        self._float = np.empty((0, size[1], size[0], 3), dtype=np.float32)
+        self._reserve(max_faces)
+
+    @property
+    def capacity(self):
+        return len(self._uint8)
+
+    def _reserve(self, n):
+        if n > len(self._uint8):
+            n = 1 << (int(n) - 1).bit_length()
+            shape = (n, self.size[1], self.size[0], 3)
+            self._uint8 = np.empty(shape, dtype=np.uint8)
+            self._float = np.empty(shape, dtype=np.float32)
+
+    def fill(self, image, rects, mode=None):
+        """Crop ``rects`` (``(x, y, w, h)``) from BGR ``image`` and preprocess them as one batch.
+
+        ``mode`` follows :func:`preprocess_face_frame`: ``'raw'`` returns the
+        resized uint8 BGR crops, ``'none'`` float32 RGB in [0, 255] and
+        ``'mobilenet_v2'``/``'auto'`` float32 RGB in [-1, 1].
+        """
+        return self.fill_many([(image, rects)], mode=mode)
+
+    def fill_many(self, crops, mode=None):
+        """Like :meth:`fill` for ``(image, rects)`` pairs of several frames, in order, as one batch."""
+        mode = mode or PREPROCESS_MODE
+        crops = list(crops)
+        n = sum(len(rects) for _, rects in crops)
+        self._reserve(n)
+        raw = self._uint8[:n]
+        i = 0
+        for image, rects in crops:
+            for (x, y, w, h) in rects:
+                cv2.resize(image[y:y + h, x:x + w], self.size, dst=raw[i])
+                i += 1
+        if mode == 'raw':
+            return raw
+
+        batch = self._float[:n]
+        np.copyto(batch, raw[..., ::-1])  # BGR -> RGB and uint8 -> float32 in one pass
+        if mode in ('mobilenet_v2', 'mv2', 'auto'):
+            batch *= 1.0 / 127.5
+            batch -= 1.0
+        return batch
+
+
+# Label ids produced by decode_predictions; unknown class counts map to
+# CLASS_LABEL_OFFSET + class index ("Class<i>")
+LABEL_MASK, LABEL_NO_MASK, LABEL_IMPROPER = 0, 1, 2
+LABEL_NAMES = ('Mask', 'No mask', 'Improper')
+CLASS_LABEL_OFFSET = 3
+
+
+def label_name(label_id):
+    label_id = int(label_id)
+    if label_id < CLASS_LABEL_OFFSET:
+        return LABEL_NAMES[label_id]
+    return f"Class{label_id - CLASS_LABEL_OFFSET}"
+
+
+def format_confidence(confidence):
+    """Probability -> percentage string as drawn on frames (``0.9512`` -> ``'95.12'``)."""
+    return f"{(confidence * 100):.2f}"
+
+
+def decode_predictions(preds):
+    """Vectorized :func:`decode_prediction` over a ``[N, C]`` probability array.
+
+    Returns ``(label_ids, confidences)``: ``int8`` label ids (``LABEL_*``) and
+    the probability of the chosen class, with the same threshold and
+    ambiguity rules as the single-vector decoder.
+    """
+    preds = np.asarray(preds)
+    if not np.issubdtype(preds.dtype, np.floating):
+        preds = preds.astype(np.float64)
+    preds = preds.reshape(len(preds), -1)
+    n, classes = preds.shape
 
     if DEBUG_PRED:
-        try:
-            print(f"🔎 Raw probs: {probs}")
-        except Exception:
-            pass
-
-    if FORCE_ARGMAX:
-        # Simple argmax selection (handles any class count)
-        top_idx = int(max(range(len(probs)), key=lambda i: probs[i]))
-        labels_map_2 = ['Mask', 'No mask'] if MASK_CLASS_ORDER != 'no_mask_first' else ['No mask', 'Mask']
-        labels_map_3 = ['Mask', 'No mask', 'Improper'] if MASK_CLASS_ORDER != 'no_mask_first' else ['No mask', 'Mask', 'Improper']
-        if len(probs) == 2:
-            lbl = labels_map_2[top_idx]
-        elif len(probs) == 3:
-            lbl = labels_map_3[top_idx]
-        else:
-            lbl = f"Class{top_idx}"
-        return lbl, f"{(probs[top_idx] * 100):.2f}"
-
-    # Helper to compute top-two gap
-    def top_gap(values):
-        if len(values) < 2:
-            return 1.0
-        sorted_vals = sorted(values, reverse=True)
-        return sorted_vals[0] - sorted_vals[1]
-
-    if len(probs) == 2:
-        # Handle possible class order differences (2-class)
-        if MASK_CLASS_ORDER == 'no_mask_first':
-            no_mask_prob, mask_prob = probs
-        else:
-            mask_prob, no_mask_prob = probs
-
-        # Ambiguity rule: if top two are close, mark as Improper
-        gap = abs(mask_prob - no_mask_prob)
-        if gap < CONF_DELTA_THRESHOLD:
-            label = "Improper"
-            confidence = f"{(max(mask_prob, no_mask_prob) * 100):.2f}"
-            return label, confidence
-
-        if mask_prob >= MASK_CONF_THRESHOLD and mask_prob > no_mask_prob:
-            label = "Mask"
-            confidence = f"{(mask_prob * 100):.2f}"
-        elif no_mask_prob >= NO_MASK_CONF_THRESHOLD and no_mask_prob > mask_prob:
-            label = "No mask"
-            confidence = f"{(no_mask_prob * 100):.2f}"
-        else:
-            label = "Improper"
-            confidence = f"{(max(mask_prob, no_mask_prob) * 100):.2f}"
-        return label, confidence
-
-    elif len(probs) == 3:
-        # Assume default order [mask, no_mask, improper]; allow swapping first two via MASK_CLASS_ORDER
-        mask_prob, no_mask_prob, improper_prob = probs
-        if MASK_CLASS_ORDER == 'no_mask_first':
-            no_mask_prob, mask_prob, improper_prob = no_mask_prob, mask_prob, improper_prob
-
-        # Ambiguity rule across all three classes
-        gap = top_gap([mask_prob, no_mask_prob, improper_prob])
-        if gap < CONF_DELTA_THRESHOLD:
-            top_val = max(mask_prob, no_mask_prob, improper_prob)
-            return "Improper", f"{(top_val * 100):.2f}"
-
-        # Prioritize explicit improper classification if high
-        if improper_prob >= IMPROPER_CONF_THRESHOLD and improper_prob >= max(mask_prob, no_mask_prob):
-            return "Improper", f"{(improper_prob * 100):.2f}"
-        if mask_prob >= MASK_CONF_THRESHOLD and mask_prob > no_mask_prob:
-            return "Mask", f"{(mask_prob * 100):.2f}"
-        if no_mask_prob >= NO_MASK_CONF_THRESHOLD and no_mask_prob > mask_prob:
-            return "No mask", f"{(no_mask_prob * 100):.2f}"
-        # Ambiguous
-        top = max(mask_prob, no_mask_prob, improper_prob)
-        if top == improper_prob:
-            return "Improper", f"{(improper_prob * 100):.2f}"
-        elif top == mask_prob:
-            return "Mask", f"{(mask_prob * 100):.2f}"
+        print(f"🔎 Raw probs: {preds.tolist()}")
+
+    no_mask_first = MASK_CLASS_ORDER == 'no_mask_first'
+    if FORCE_ARGMAX or classes not in (2, 3):
+        top_idx = preds.argmax(axis=1) if classes else np.zeros(n, dtype=np.intp)
+        confidences = preds[np.arange(n), top_idx] if classes else np.zeros(n, dtype=preds.dtype)
+        if FORCE_ARGMAX and classes in (2, 3):
+            order = [LABEL_NO_MASK, LABEL_MASK] if no_mask_first else [LABEL_MASK, LABEL_NO_MASK]
+            label_ids = np.array(order + [LABEL_IMPROPER], dtype=np.int8)[top_idx]
         else:
-            return "No mask", f"{(no_mask_prob * 100):.2f}"
+            label_ids = (CLASS_LABEL_OFFSET + top_idx).astype(np.int8)
+        return label_ids, confidences
 
+    if no_mask_first:
+        no_mask, mask = preds[:, 0], preds[:, 1]
     else:
-        # Fallback: unknown class count
-        top_idx = int(max(range(len(probs)), key=lambda i: probs[i]))
-        labels = ["Class0", "Class1", "Class2", "Class3"]
-        lbl = labels[top_idx] if top_idx < len(labels) else f"Class{top_idx}"
-        return lbl, f"{(probs[top_idx] * 100):.2f}"
+        mask, no_mask = preds[:, 0], preds[:, 1]
+
+    if classes == 2:
+        top = np.maximum(mask, no_mask)
+        conditions = [
+            np.abs(mask - no_mask) < CONF_DELTA_THRESHOLD,               # ambiguous
+            (mask >= MASK_CONF_THRESHOLD) & (mask > no_mask),
+            (no_mask >= NO_MASK_CONF_THRESHOLD) & (no_mask > mask),
+        ]
+        label_ids = np.select(conditions, [LABEL_IMPROPER, LABEL_MASK, LABEL_NO_MASK], LABEL_IMPROPER)
+        confidences = np.select(conditions, [top, mask, no_mask], top)
+        return label_ids.astype(np.int8), confidences
+
+    improper = preds[:, 2]
+    top_two = np.sort(preds, axis=1)[:, -2:]
+    top = top_two[:, 1]
+    conditions = [
+        top_two[:, 1] - top_two[:, 0] < CONF_DELTA_THRESHOLD,           # ambiguous
+        (improper >= IMPROPER_CONF_THRESHOLD) & (improper >= np.maximum(mask, no_mask)),
+        (mask >= MASK_CONF_THRESHOLD) & (mask > no_mask),
+        (no_mask >= NO_MASK_CONF_THRESHOLD) & (no_mask > mask),
+        top == improper,                                                 # below thresholds: argmax
+        top == mask,
+    ]
+    label_ids = np.select(conditions, [LABEL_IMPROPER, LABEL_IMPROPER, LABEL_MASK, LABEL_NO_MASK,
+                                       LABEL_IMPROPER, LABEL_MASK], LABEL_NO_MASK)
+    confidences = np.select(conditions, [top, improper, mask, no_mask, improper, mask], no_mask)
+    return label_ids.astype(np.int8), confidences
+
+
+def decode_prediction(pred):
+    """Decode model prediction into human-readable label.
+
+    Supports 2-class (mask/no_mask) and 3-class (mask/no_mask/improper) outputs.
+    Uses thresholds and an ambiguity delta to flag potential improper/partial mask wear.
+    Single-vector wrapper around :func:`decode_predictions`.
+    """
+    label_ids, confidences = decode_predictions(np.asarray(pred)[np.newaxis])
+    return label_name(label_ids[0]), format_confidence(confidences[0])
 
 
 def write_bb(mask_or_not, confidence, box, frame):
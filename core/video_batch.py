@@ -0,0 +1,296 @@
+"""
+Offline mask detection for recorded video
+
+    python -m core.video_batch input.mp4
+    python -m core.video_batch input.mp4 --output audited.mp4 --log detections.csv --workers 4
+
+Frames are decoded on a background thread and processed in windows of
+``--batch-frames`` frames: faces are detected on every frame, then the
+crops of the whole window are classified in one large ``predict`` call.
+The annotated video is written by a ``cv2.VideoWriter`` on its own thread
+and every frame's detections go to a JSON, JSON Lines or CSV log (by file
+extension). ``--workers N`` splits the file into N segments processed by
+a process pool and merges the results in order. Throughput is reported in
+frames per second.
+"""
+import argparse
+import csv
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+
+from core.capture import FrameGrabber
+from core.engine import get_engine
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+LOG_FORMATS = {'.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv'}
+CSV_FIELDS = ('frame', 'timestamp', 'x', 'y', 'w', 'h', 'label', 'confidence')
+
+
+class VideoWriterThread:
+    """``cv2.VideoWriter`` fed through a bounded queue from its own thread."""
+
+    def __init__(self, path, fps, size, fourcc='mp4v', max_buffered=64):
+        self.path = str(path)
+        self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self._writer.isOpened():
+            raise IOError(f"Cannot open video writer: {self.path}")
+        self._queue = queue.Queue(maxsize=max_buffered)
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name='video-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            try:
+                self._writer.write(frame)
+            except Exception as e:  # keep draining so producers never block
+                self.error = self.error or e
+        self._writer.release()
+
+    def write(self, frame):
+        self._queue.put(frame)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class _SegmentCapture:
+    """Reads at most ``count`` frames of ``cap`` (a segment of the file)."""
+
+    def __init__(self, cap, count):
+        self._cap = cap
+        self._left = count
+
+    def set(self, prop, value):
+        return self._cap.set(prop, value)
+
+    def read(self):
+        if self._left <= 0:
+            return False, None
+        self._left -= 1
+        return self._cap.read()
+
+    def release(self):
+        self._cap.release()
+
+
+def video_info(path):
+    """``(frame count, fps, (width, height))`` of a video file."""
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video: {path}")
+    try:
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    finally:
+        cap.release()
+    return count, fps, size
+
+
+def split_segments(frame_count, workers):
+    """``[(start, end), ...]`` frame ranges covering ``frame_count`` in ``workers`` near-equal parts."""
+    workers = max(1, min(workers, frame_count)) if frame_count > 0 else 1
+    bounds = [frame_count * i // workers for i in range(workers + 1)]
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start] or [(0, frame_count)]
+
+
+def _read_window(grabber, size):
+    """Up to ``size`` next frames of ``grabber`` (fewer at the end of the stream)."""
+    window = []
+    while len(window) < size:
+        ret, frame = grabber.read()
+        if not ret:
+            break
+        window.append(frame)
+    return window
+
+
+def _process_window(engine, window, first_index, fps, write=None, width=None):
+    """Detect on ``window`` and return its per-frame records; annotated frames go to ``write``."""
+    records = []
+    for index, (frame, detections) in enumerate(zip(window, engine.detect_many(window)), first_index):
+        records.append({
+            'frame': index,
+            'timestamp': round(index / fps, 3),
+            'detections': detections.to_list(),
+        })
+        if write is not None:
+            write(engine.annotate(frame, detections, width=width or frame.shape[1]))
+    return records
+
+
+def process_segment(path, start=0, end=None, output=None, fps=None, batch_frames=32,
+                    width=None, fourcc='mp4v'):
+    """Detect masks on frames ``[start, end)`` of ``path``; ``end=None`` reads to the end.
+
+    Writes the annotated frames to ``output`` (if given) and returns the
+    per-frame records ``{"frame", "timestamp", "detections"}``.
+    """
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video: {path}")
+    fps = fps or cap.get(cv2.CAP_PROP_FPS) or 25.0
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    grabber = FrameGrabber(_SegmentCapture(cap, float('inf') if end is None else end - start),
+                           latest_only=False, max_buffered=2 * batch_frames, name='video-batch')
+    engine = get_engine()
+    writer = None
+    records = []
+
+    def write(annotated):
+        # Opened on the first frame, once the output size is known
+        nonlocal writer
+        if writer is None:
+            writer = VideoWriterThread(output, fps, annotated.shape[1::-1], fourcc=fourcc)
+        writer.write(annotated)
+
+    try:
+        while True:
+            window = _read_window(grabber, batch_frames)
+            if not window:
+                break
+            records += _process_window(engine, window, start + len(records), fps,
+                                       write=None if output is None else write, width=width)
+    finally:
+        grabber.release()
+        if writer is not None:
+            writer.close()
+    return records
+
+
+def _process_segment_job(args):
+    # Process pool entry point: one engine per worker process
+    return process_segment(*args)
+
+
+def merge_videos(parts, output, fps, fourcc='mp4v'):
+    """Concatenate the ``parts`` video files into ``output`` in order and delete them."""
+    writer = None
+    try:
+        for part in parts:
+            cap = cv2.VideoCapture(str(part))
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if writer is None:
+                    writer = VideoWriterThread(output, fps, frame.shape[1::-1], fourcc=fourcc)
+                writer.write(frame)
+            cap.release()
+    finally:
+        if writer is not None:
+            writer.close()
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+
+
+def write_log(records, path):
+    """Write per-frame records as JSON, JSON Lines or CSV (one row per detection)."""
+    path = Path(path)
+    fmt = LOG_FORMATS.get(path.suffix.lower())
+    if fmt is None:
+        raise ValueError(f"Unsupported log format '{path.suffix}' (expected {', '.join(LOG_FORMATS)})")
+    with open(path, 'w', newline='') as f:
+        if fmt == 'json':
+            json.dump(records, f)
+        elif fmt == 'jsonl':
+            for record in records:
+                f.write(json.dumps(record, separators=(',', ':')) + '\n')
+        else:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            for record in records:
+                for d in record['detections']:
+                    writer.writerow([record['frame'], record['timestamp'], *d['box'],
+                                     d['label'] or '', '' if d['confidence'] is None else d['confidence']])
+
+
+def process_video(path, output=None, log=None, workers=1, batch_frames=32, width=None, fourcc='mp4v'):
+    """Run the whole job; returns ``{"frames", "faces", "seconds", "fps", "segments"}``."""
+    frame_count, fps, _ = video_info(path)
+    # Segments need a known frame count to seek; otherwise read the file in one pass
+    segments = split_segments(frame_count, workers) if workers > 1 and frame_count > 0 else [(0, None)]
+    if len(segments) == 1:
+        get_engine().load()  # keep model loading out of the throughput figure
+    started = time.perf_counter()
+    if len(segments) == 1:
+        records = process_segment(path, 0, None, output, fps, batch_frames, width, fourcc)
+    else:
+        parts = [None if output is None else f"{output}.part{i}{Path(output).suffix}"
+                 for i in range(len(segments))]
+        jobs = [(path, start, end, part, fps, batch_frames, width, fourcc)
+                for (start, end), part in zip(segments, parts)]
+        with ProcessPoolExecutor(max_workers=len(segments)) as pool:
+            records = [r for segment in pool.map(_process_segment_job, jobs) for r in segment]
+        if output is not None:
+            merge_videos(parts, output, fps, fourcc=fourcc)
+    seconds = time.perf_counter() - started
+
+    if log is not None:
+        write_log(records, log)
+    return {
+        'frames': len(records),
+        'faces': sum(len(r['detections']) for r in records),
+        'seconds': seconds,
+        'fps': len(records) / seconds if seconds else 0.0,
+        'segments': len(segments),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m core.video_batch',
+                                     description="Detect masks in a recorded video file.")
+    parser.add_argument("input", type=str, help="Input video file")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Annotated output video (default: <input>_mask_detected.mp4)")
+    parser.add_argument("--no-video", action="store_true", help="Only write the detection log")
+    parser.add_argument("--log", type=str, default=None,
+                        help="Per-frame detection log: .json, .jsonl or .csv (default: <input>_detections.json)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Split the file into this many segments processed in parallel (default: 1)")
+    parser.add_argument("--batch-frames", type=int, default=32,
+                        help="Frames whose face crops are classified in one call (default: 32)")
+    parser.add_argument("--width", type=int, default=None, help="Output video width (default: input width)")
+    parser.add_argument("--fourcc", type=str, default="mp4v", help="Output video codec (default: mp4v)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    source = Path(args.input)
+    if not source.is_file():
+        raise SystemExit(f"Video not found: {source}")
+    output = None if args.no_video else (args.output or str(source.with_name(f"{source.stem}_mask_detected.mp4")))
+    log = args.log or str(source.with_name(f"{source.stem}_detections.json"))
+
+    report = process_video(str(source), output=output, log=log, workers=max(1, args.workers),
+                           batch_frames=max(1, args.batch_frames), width=args.width, fourcc=args.fourcc)
+    print(f"✅ {report['frames']} frames, {report['faces']} faces in {report['seconds']:.1f}s "
+          f"({report['fps']:.1f} frames/sec, {report['segments']} segment(s))")
+    if output:
+        print(f"🎞️ Annotated video: {output}")
+    print(f"📝 Detection log: {log}")
+    return report
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
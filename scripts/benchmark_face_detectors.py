@@ -0,0 +1,121 @@
+"""Compare face detector backends on local sample images.
+
+Reports median latency per frame and recall for each detector, with every
+image resized to the serving detection width first (``--width``, default
+``DETECTION_WIDTH``; 0 keeps the full size) and the detector's minimum face
+size scaled along, as the engine does. Recall uses ``--annotations`` when
+given, a JSON file mapping image file names to ground-truth ``[x, y, w, h]``
+boxes in original image coordinates; a face counts as found at IoU >=
+``--iou``. Without annotations every image is assumed to contain at least
+one face and recall is the fraction of images with a detection.
+
+    python scripts/benchmark_face_detectors.py --images data/faces
+    python scripts/benchmark_face_detectors.py --images data/faces --detectors haar,lbp,yunet \\
+        --annotations data/faces/boxes.json --repeats 5
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import imutils
+import numpy as np
+
+# Ensure project root is on path for absolute imports
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from config import Config
+from core.face_detectors import FACE_DETECTORS, create_face_detector, scaled_min_size
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def iou(a, b) -> float:
+    ax1, ay1, aw, ah = a
+    bx1, by1, bw, bh = b
+    iw = max(0, min(ax1 + aw, bx1 + bw) - max(ax1, bx1))
+    ih = max(0, min(ay1 + ah, by1 + bh) - max(ay1, by1))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def load_images(images_dir: Path, width: int, annotations: dict):
+    """``(name, resized image, scale, scaled ground-truth boxes or None)`` for every image."""
+    samples = []
+    for path in sorted(p for p in images_dir.rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS):
+        image = cv2.imread(str(path))
+        if image is None:
+            print(f"⚠️ Skipping unreadable image: {path}")
+            continue
+        # Like the engine: never upscale
+        scale = width / image.shape[1] if 0 < width < image.shape[1] else 1.0
+        truth = annotations.get(path.name) if annotations else None
+        if truth is not None:
+            truth = [[v * scale for v in box] for box in truth]
+        if scale != 1.0:
+            image = imutils.resize(image, width=width, inter=cv2.INTER_AREA)
+        samples.append((path.name, image, scale, truth))
+    if not samples:
+        raise SystemExit(f"No images found in {images_dir}")
+    return samples
+
+
+def evaluate(detector, samples, repeats: int, iou_threshold: float):
+    """Median ms/frame and recall of ``detector`` over ``samples``."""
+    timings, found, total = [], 0, 0
+    for _, image, scale, truth in samples:
+        min_size = scaled_min_size(detector, scale)
+        detector.detect(image, min_size=min_size)  # warm-up (DNN allocation, input size)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            boxes = detector.detect(image, min_size=min_size)
+            timings.append((time.perf_counter() - start) * 1000.0)
+        if truth is None:
+            found += int(len(boxes) > 0)
+            total += 1
+        else:
+            found += sum(any(iou(t, b) >= iou_threshold for b in boxes) for t in truth)
+            total += len(truth)
+    return float(np.median(timings)), (found / total if total else float("nan"))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark face detector backends on local images.")
+    parser.add_argument("--images", type=str, required=True, help="Directory of sample images (searched recursively)")
+    parser.add_argument("--detectors", type=str, default=",".join(FACE_DETECTORS),
+                        help=f"Comma-separated detectors (default: {','.join(FACE_DETECTORS)})")
+    parser.add_argument("--annotations", type=str, default=None,
+                        help="JSON {image name: [[x, y, w, h], ...]} ground truth (default: one face per image)")
+    parser.add_argument("--width", type=int, default=Config.DETECTION_WIDTH,
+                        help=f"Resize width before detection, 0 = full size (default: {Config.DETECTION_WIDTH})")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for a ground-truth match (default: 0.5)")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per image (default: 3)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    annotations = json.loads(Path(args.annotations).read_text()) if args.annotations else None
+    samples = load_images(Path(args.images).expanduser().resolve(), args.width, annotations)
+    print(f"{len(samples)} images at width {args.width}"
+          f"{'' if annotations else ' (recall = images with at least one face found)'}\n")
+
+    header = f"{'detector':<8}  {'ms/frame':>9}  {'recall':>7}"
+    print(header)
+    print("-" * len(header))
+    for name in [n.strip().lower() for n in args.detectors.split(",") if n.strip()]:
+        try:
+            detector = create_face_detector(name)
+        except Exception as e:
+            print(f"{name:<8}  skipped: {e}")
+            continue
+        ms, recall = evaluate(detector, samples, args.repeats, args.iou)
+        print(f"{name:<8}  {ms:9.2f}  {recall * 100:6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
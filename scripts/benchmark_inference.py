@@ -0,0 +1,118 @@
+"""Micro-benchmark mask classifier backends on the same face batches.
+
+Reports median latency per call, per face and throughput (faces/s) for
+batches of 1, 2, 4, 8 and 16 faces. Backends:
+
+    keras   Keras ``model.predict``
+    fast    shape-bucketed ``tf.function`` path from ``core.model_loader``
+    tflite  TFLite interpreter (converted next to the model on first run)
+    onnx    ONNX Runtime CPU provider (exported next to the model on first run)
+
+    python scripts/benchmark_inference.py
+    python scripts/benchmark_inference.py --model models/mask_mobilenet_v2_compat.h5 \\
+        --backends keras,fast,onnx --threads 4 --repeats 50
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Ensure project root is on path for absolute imports
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.model_loader import BucketedPredictor, build_compat_model, load_mask_model
+
+BATCH_SIZES = (1, 2, 4, 8, 16)
+
+
+def time_calls(predict, batch, repeats: int) -> float:
+    """Median wall time in milliseconds of ``predict(batch)`` after one warm-up call."""
+    predict(batch)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(batch)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(samples))
+
+
+def run(backends: dict, repeats: int, batch_sizes=BATCH_SIZES):
+    """Print latency and throughput for every backend and batch size."""
+    rng = np.random.default_rng(0)
+    input_shape = (224, 224, 3)
+
+    header = f"{'faces':>5}  {'backend':<8}  {'ms/call':>9}  {'ms/face':>8}  {'faces/s':>9}"
+    print(header)
+    print("-" * len(header))
+    for n in batch_sizes:
+        batch = rng.uniform(0, 255, size=(n,) + input_shape).astype(np.float32)
+        for name, predict in backends.items():
+            ms = time_calls(predict, batch, repeats)
+            print(f"{n:>5}  {name:<8}  {ms:9.2f}  {ms / n:8.2f}  {n * 1000.0 / ms:9.1f}")
+
+
+def build_backends(names, model_path: Path, threads, inter_op_threads, graph_optimization) -> dict:
+    """Load each requested backend from ``model_path``."""
+    backends = {}
+    keras_model = None
+    for name in names:
+        if name in ("keras", "fast"):
+            if keras_model is None:
+                keras_model = load_mask_model(model_path)
+            if name == "keras":
+                backends[name] = lambda x, m=keras_model: m.predict(x, verbose=0)
+            else:
+                fast = BucketedPredictor(keras_model, max_bucket=max(BATCH_SIZES))
+                fast.warmup()
+                backends[name] = fast.predict
+        elif name in ("tflite", "onnx"):
+            classifier = load_mask_model(model_path, backend=name, num_threads=threads,
+                                         inter_op_threads=inter_op_threads,
+                                         graph_optimization=graph_optimization)
+            if classifier is None:
+                raise SystemExit(f"Could not load {name} backend (see errors above)")
+            backends[name] = classifier.predict
+        else:
+            raise SystemExit(f"Unknown backend: {name}")
+    return backends
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark mask classifier inference backends.")
+    parser.add_argument("--model", type=str, default=None,
+                        help="Path to a trained .h5 model (default: untrained compat architecture)")
+    parser.add_argument("--backends", type=str, default="keras,fast",
+                        help="Comma-separated backends: keras, fast, tflite, onnx (default: keras,fast)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="TFLite threads / ONNX Runtime intra-op threads (default: runtime default)")
+    parser.add_argument("--inter-op-threads", type=int, default=None,
+                        help="ONNX Runtime inter-op threads (default: runtime default)")
+    parser.add_argument("--graph-optimization", type=str, default="all",
+                        help="ONNX Runtime graph optimization level (default: all)")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed calls per batch size (default: 20)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    names = [n.strip().lower() for n in args.backends.split(",") if n.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.model:
+            model_path = Path(args.model).resolve()
+        else:
+            # Weights don't affect latency; skip the ImageNet download.
+            model_path = Path(tmp) / "benchmark_compat.h5"
+            build_compat_model(weights=None).save(model_path)
+
+        backends = build_backends(names, model_path, args.threads,
+                                  args.inter_op_threads, args.graph_optimization)
+        run(backends, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Export the mask classifier with a uint8 serving signature.
+
+The exported model takes raw OpenCV face crops (uint8 ``[N, 224, 224, 3]``,
+BGR) and does the color swap and MobileNetV2 normalization in-graph, so the
+server only crops and resizes on the host and input tensors are 4x smaller.
+
+    python scripts/export_serving_model.py --format savedmodel
+    python scripts/export_serving_model.py --format tflite --output models/mask_serving_uint8.tflite
+
+Serve the result with ``MASK_MODEL_PATH=<output>`` and ``INFERENCE_BACKEND``
+set to ``keras`` (SavedModel), ``tflite`` or ``onnx``.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure project root is on path for absolute imports
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.model_loader import SERVING_FORMATS, export_serving_model, load_mask_model
+
+DEFAULT_OUTPUTS = {
+    "savedmodel": "models/mask_serving_uint8",
+    "tflite": "models/mask_serving_uint8.tflite",
+    "onnx": "models/mask_serving_uint8.onnx",
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export the mask classifier with a uint8 serving signature.")
+    parser.add_argument("--model", type=str, default="models/mask_mobilenet_v2_compat.h5",
+                        help="Trained model (default: models/mask_mobilenet_v2_compat.h5)")
+    parser.add_argument("--format", type=str, default="savedmodel", choices=SERVING_FORMATS,
+                        help="Export format (default: savedmodel)")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Output path (default: models/mask_serving_uint8[.tflite|.onnx])")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    project_root = Path(__file__).resolve().parents[1]
+    model_path = (project_root / args.model).resolve()
+    output_path = (project_root / (args.output or DEFAULT_OUTPUTS[args.format])).resolve()
+
+    model = load_mask_model(model_path)
+    if model is None:
+        raise SystemExit(f"Could not load model: {model_path}")
+
+    export_serving_model(model, output_path, fmt=args.format)
+    print(f"✅ Exported uint8 serving model to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
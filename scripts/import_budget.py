@@ -0,0 +1,60 @@
+"""Report web app import time and enforce a cold-start budget.
+
+Imports the Flask app in a fresh interpreter under ``python -X importtime``,
+prints the slowest modules and fails when the total exceeds the budget or
+when a heavy inference package (TensorFlow, ONNX Runtime, ...) is imported
+before the first detection request.
+
+    python scripts/import_budget.py
+    python scripts/import_budget.py --budget-ms 800 --top 30
+    python scripts/import_budget.py --statement "import api.index"
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure project root is on path for absolute imports
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.performance import HEAVY_MODULES, import_time_report
+
+DEFAULT_STATEMENT = "from app import create_app; create_app('testing')"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure the web app import time against a budget.")
+    parser.add_argument("--statement", type=str, default=DEFAULT_STATEMENT,
+                        help=f"Python statement to time (default: {DEFAULT_STATEMENT!r})")
+    parser.add_argument("--budget-ms", type=float, default=2000.0,
+                        help="Fail when total import time exceeds this (default: 2000)")
+    parser.add_argument("--top", type=int, default=20, help="Slowest modules to list (default: 20)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = import_time_report(args.statement)
+
+    print(f"{'cumulative ms':>14}  {'self ms':>8}  module")
+    for name, self_ms, cumulative_ms in report['modules'][:args.top]:
+        print(f"{cumulative_ms:14.1f}  {self_ms:8.1f}  {name}")
+    print(f"\nTotal import time: {report['total_ms']:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"Interpreter wall time: {report['wall_ms']:.1f} ms")
+
+    heavy = [m for m in HEAVY_MODULES if m in report['packages']]
+    failed = False
+    if heavy:
+        print(f"❌ Heavy inference packages imported eagerly: {', '.join(heavy)}")
+        failed = True
+    if report['total_ms'] > args.budget_ms:
+        print("❌ Import time over budget")
+        failed = True
+    if failed:
+        return 1
+    print("✅ Within import budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
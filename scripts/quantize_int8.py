@@ -0,0 +1,178 @@
+"""Produce a full-integer int8 TFLite mask classifier with an accuracy gate.
+
+Calibrates post-training quantization on a local directory of representative
+face crops, then compares the int8 model against the float model on held-out
+crops. The int8 model is evaluated the way it is served (``load_mask_model``
+plus the engine's host preprocessing), and the artifact and its manifest are
+only written when the agreement rate of the ``decode_predictions`` labels
+reaches ``--min-agreement``.
+
+    python scripts/quantize_int8.py --calibration-dir data/face_crops
+    python scripts/quantize_int8.py --model models/mask_mobilenet_v2_compat.h5 \\
+        --calibration-dir data/face_crops --output models/mask_mobilenet_v2_int8.tflite \\
+        --min-agreement 0.99
+
+Serve the result with ``INFERENCE_BACKEND=tflite MASK_MODEL_PATH=<output>``.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+# Ensure project root is on path for absolute imports
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.backends import manifest_path, write_manifest
+from core.model_loader import (file_sha256, host_preprocess_mode, load_mask_model, make_fast_predictor,
+                               model_normalizes_input)
+from core.utils import decode_predictions, preprocess_face_frame
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def load_face_crops(crops_dir: Path, limit: int, seed: int = 42) -> list:
+    """Read up to ``limit`` BGR face crops (recursively) in a shuffled but reproducible order."""
+    paths = sorted(p for p in crops_dir.rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not paths:
+        raise SystemExit(f"No images found in {crops_dir}")
+    rng = np.random.default_rng(seed)
+    rng.shuffle(paths)
+
+    crops = []
+    for path in paths[:limit]:
+        image = cv2.imread(str(path))
+        if image is None:
+            print(f"⚠️ Skipping unreadable image: {path}")
+            continue
+        crops.append(image)
+    if not crops:
+        raise SystemExit(f"No readable images in {crops_dir}")
+    return crops
+
+
+def preprocess_crops(crops: list, model) -> np.ndarray:
+    """Preprocess ``crops`` the way the engine does for ``model`` (``host_preprocess_mode``)."""
+    mode = host_preprocess_mode(model)
+    return np.stack([preprocess_face_frame(crop, mode=mode) for crop in crops]).astype(np.float32)
+
+
+def quantize(model, calibration: np.ndarray) -> bytes:
+    """Full-integer int8 conversion calibrated on ``calibration`` samples."""
+
+    def representative_dataset():
+        for sample in calibration:
+            yield [sample[np.newaxis, ...]]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.int8
+    converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+def per_face_latency_ms(predict, faces: np.ndarray, repeats: int = 3) -> float:
+    """Median single-face latency over the first few evaluation crops."""
+    samples = faces[:min(len(faces), 16)]
+    predict(samples[:1])
+    timings = []
+    for _ in range(repeats):
+        for face in samples:
+            start = time.perf_counter()
+            predict(face[np.newaxis, ...])
+            timings.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(timings))
+
+
+def label_agreement(float_preds: np.ndarray, int8_preds: np.ndarray) -> float:
+    float_labels, _ = decode_predictions(float_preds)
+    int8_labels, _ = decode_predictions(int8_preds)
+    return float(np.mean(float_labels == int8_labels))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Quantize the mask classifier to full-integer int8 TFLite with an accuracy gate.",
+    )
+    parser.add_argument("--model", type=str, default="models/mask_mobilenet_v2_compat.h5",
+                        help="Trained float model (default: models/mask_mobilenet_v2_compat.h5)")
+    parser.add_argument("--calibration-dir", type=str, required=True,
+                        help="Directory of representative face crops (searched recursively)")
+    parser.add_argument("--output", type=str, default="models/mask_mobilenet_v2_int8.tflite",
+                        help="Output path (default: models/mask_mobilenet_v2_int8.tflite)")
+    parser.add_argument("--num-calibration", type=int, default=200,
+                        help="Crops used for calibration (default: 200)")
+    parser.add_argument("--num-eval", type=int, default=500,
+                        help="Held-out crops used for the agreement check (default: 500)")
+    parser.add_argument("--min-agreement", type=float, default=0.98,
+                        help="Minimum label agreement with the float model (default: 0.98)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="TFLite interpreter threads for the evaluation (default: runtime default)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    project_root = Path(__file__).resolve().parents[1]
+    model_path = (project_root / args.model).resolve()
+    output_path = (project_root / args.output).resolve()
+    crops_dir = Path(args.calibration_dir).expanduser().resolve()
+
+    model = load_mask_model(model_path)
+    if model is None:
+        raise SystemExit(f"Could not load float model: {model_path}")
+
+    crops = load_face_crops(crops_dir, args.num_calibration + args.num_eval)
+    calibration_crops = crops[:args.num_calibration]
+    eval_crops = crops[args.num_calibration:]
+    if not eval_crops:
+        print("⚠️ Not enough crops for a held-out set; evaluating on the calibration crops")
+        eval_crops = calibration_crops
+    print(f"Calibrating on {len(calibration_crops)} crops, evaluating on {len(eval_crops)} crops")
+
+    tflite_bytes = quantize(model, preprocess_crops(calibration_crops, model))
+    # Same manifest as the converted backends, so serving keeps the float model's input contract
+    manifest = dict(source=model_path.name, source_sha256=file_sha256(model_path),
+                    input_dtype="int8", normalizes_input=model_normalizes_input(model))
+
+    # Evaluated through the serving loader, so the .tflite suffix and the manifest must be in place
+    tmp_path = output_path.with_name(f"{output_path.stem}.tmp{output_path.suffix}")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path.write_bytes(tflite_bytes)
+    write_manifest(tmp_path, **manifest)
+    try:
+        int8_model = load_mask_model(tmp_path, backend="tflite", num_threads=args.threads)
+        if int8_model is None:
+            raise SystemExit("❌ Could not load the int8 model; NOT written.")
+        float_faces = preprocess_crops(eval_crops, model)
+        int8_faces = preprocess_crops(eval_crops, int8_model)
+        float_preds = model.predict(float_faces, verbose=0)
+        int8_preds = int8_model.predict(int8_faces)
+        agreement = label_agreement(float_preds, int8_preds)
+
+        float_ms = per_face_latency_ms(make_fast_predictor(model).predict, float_faces)
+        int8_ms = per_face_latency_ms(int8_model.predict, int8_faces)
+        print(f"Float latency: {float_ms:.2f} ms/face")
+        print(f"Int8 latency:  {int8_ms:.2f} ms/face ({float_ms / int8_ms:.1f}x)")
+        print(f"Label agreement: {agreement * 100:.2f}% (threshold {args.min_agreement * 100:.2f}%)")
+        print(f"Max |float - int8| probability: {np.abs(float_preds - int8_preds).max():.4f}")
+
+        if agreement < args.min_agreement:
+            raise SystemExit("❌ Agreement below threshold; int8 model NOT written.")
+
+        tmp_path.replace(output_path)
+        write_manifest(output_path, **manifest)
+        print(f"✅ Saved int8 model to {output_path} ({len(tflite_bytes) / 1e6:.1f} MB)")
+    finally:
+        tmp_path.unlink(missing_ok=True)
+        manifest_path(tmp_path).unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
 
 from config import Config
-from core.model_loader import load_mask_model
+from core.model_loader import host_preprocess_mode, load_mask_model
 from core.utils import load_cascade_detector, preprocess_face_frame, decode_prediction, write_bb
 
 
@@ -35,7 +35,7 @@ def run_image_smoke_test(image_path: Path, model, face_detector) -> Path:
 
     for (x, y, w, h) in faces:
         face_frame = clone_image[y:y + h, x:x + w]
-        face_arrays.append(preprocess_face_frame(face_frame))
+        face_arrays.append(preprocess_face_frame(face_frame, mode=host_preprocess_mode(model)))
         face_rects.append((x, y, w, h))
 
     if face_arrays and model is not None:
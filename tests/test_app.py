@@ -43,6 +43,23 @@ def test_metrics_endpoint(client):
     assert response.content_type == 'text/plain; charset=utf-8'
 
 
+def test_ready_is_503_when_model_cannot_load(client, tmp_path):
+    """Readiness stays 503 for an instance that cannot classify"""
+    from core.engine import InferenceEngine, get_engine, set_engine
+    from tests.test_engine import FakeDetector
+
+    previous = get_engine()
+    engine = set_engine(InferenceEngine(model_path=tmp_path / 'missing.h5', face_detector=FakeDetector([])))
+    try:
+        engine.start_warmup()
+        engine.wait_until_ready(timeout=10)
+        response = client.get('/api/v1/ready')
+    finally:
+        set_engine(previous)
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'degraded' and response.get_json()['error']
+
+
 def test_video_feed_camera_error(client):
     """Video feed should respond even if camera is unavailable"""
     response = client.get('/video_feed?source=camera&camera_index=999')
@@ -50,6 +67,62 @@ def test_video_feed_camera_error(client):
     assert response.mimetype.startswith('multipart/x-mixed-replace')
 
 
+def test_detection_stream_camera_error(client):
+    """Metadata stream reports an unavailable camera as an SSE error event"""
+    response = client.get('/api/v1/stream/camera?camera_index=999')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.get_data().startswith(b'event: error\ndata: {"error":')
+    assert client.get('/api/v1/stream/microphone').status_code == 404
+    assert client.get('/api/v1/stream/camera?format=xml').status_code == 400
+
+
+def test_shared_camera_streams_are_keyed_by_pipeline_options(monkeypatch):
+    from app import streaming
+    from core.tracking import FaceTracker
+
+    keys = []
+
+    def fake_subscribe(key, open_stream, settings, buffer_size=2):
+        keys.append(key)
+        return None
+
+    monkeypatch.setattr(streaming, 'subscribe', fake_subscribe)
+    for tracker, latest_only in [(None, None), (None, None), (FaceTracker(), None), (None, False)]:
+        assert list(streaming.gen_shared(0, 'small', lambda message: message,
+                                         tracker=tracker, latest_only=latest_only)) == ["Error: cannot access camera"]
+    assert keys[0] == keys[1]
+    assert len(set(keys)) == 3
+
+
+def test_detection_stream_ndjson_from_video(client, tmp_path):
+    """NDJSON stream carries one detection record per video frame"""
+    import json
+
+    import cv2
+    import numpy as np
+
+    from core.engine import InferenceEngine, get_engine, set_engine
+    from tests.test_engine import FakeDetector, FakeModel
+
+    path = str(tmp_path / 'clip.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (200, 150))
+    for _ in range(4):
+        writer.write(np.random.randint(0, 255, (150, 200, 3), dtype=np.uint8))
+    writer.release()
+
+    previous = get_engine()
+    set_engine(InferenceEngine(model=FakeModel(), face_detector=FakeDetector([(20, 20, 60, 60)]), batching=False))
+    try:
+        response = client.get(f'/api/v1/stream/video?path={path}&format=ndjson&tracking=0')
+        records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    finally:
+        set_engine(previous)
+    assert response.mimetype == 'application/x-ndjson'
+    assert [r['frame'] for r in records] == [0, 1, 2, 3]
+    assert records[0]['width'] == 200 and records[0]['detections'][0]['label'] == 'Mask'
+
+
 def test_decode_prediction_thresholds():
     """Decode prediction flags improper wear for ambiguous probabilities"""
     from core.utils import decode_prediction
@@ -57,4 +130,19 @@ def test_decode_prediction_thresholds():
     assert label in {"Improper", "Mask", "No mask"}
     # Ambiguous region should be flagged as Improper
     label2, conf2 = decode_prediction((0.7, 0.65))
-    assert label2 == "Improper"
\ No newline at end of file
+    assert label2 == "Improper"
+
+
+def test_decode_predictions_batch():
+    """Vectorized decode applies the same rules to every row at once"""
+    from core.utils import decode_predictions, format_confidence, label_name
+    cases = [
+        ([(0.95, 0.05), (0.1, 0.9), (0.7, 0.65)],
+         [("Mask", "95.00"), ("No mask", "90.00"), ("Improper", "70.00")]),
+        ([(0.1, 0.1, 0.8), (0.85, 0.1, 0.05), (0.55, 0.15, 0.30)],
+         [("Improper", "80.00"), ("Mask", "85.00"), ("Mask", "55.00")]),
+        ([(0.1, 0.2, 0.6, 0.1)], [("Class2", "60.00")]),
+    ]
+    for preds, expected in cases:
+        label_ids, confidences = decode_predictions(preds)
+        assert [(label_name(i), format_confidence(c)) for i, c in zip(label_ids, confidences)] == expected
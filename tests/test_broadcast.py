@@ -0,0 +1,90 @@
+"""
+Test shared video streams
+"""
+import threading
+
+from core.broadcast import broadcast_stats, subscribe
+
+
+class FakeStream:
+    """Encoded frame source that emits ``n`` frames once released"""
+
+    def __init__(self, n=5):
+        self.n = n
+        self.go = threading.Event()
+        self.closed = threading.Event()
+
+    def outputs(self, variants):
+        self.go.wait(2)
+        for i in range(self.n):
+            if self.closed.is_set():
+                return
+            yield {settings: b'%s:frame%d' % (settings.encode(), i) for settings in variants()}
+        self.closed.wait(2)
+
+    def close(self):
+        self.closed.set()
+
+
+def test_viewers_share_one_stream():
+    stream = FakeStream(n=3)
+    opened = []
+
+    def open_stream():
+        opened.append(1)
+        return stream
+
+    first = subscribe('test:shared', open_stream, 'small', buffer_size=8)
+    second = subscribe('test:shared', open_stream, 'small', buffer_size=8)
+    third = subscribe('test:shared', open_stream, 'large', buffer_size=8)
+    assert len(opened) == 1
+    assert broadcast_stats()['subscribers'] >= 3
+
+    stream.go.set()
+    frames = []
+    for frame in first:
+        frames.append(frame)
+        if len(frames) == 3:
+            break
+    assert frames == [b'small:frame0', b'small:frame1', b'small:frame2']
+    assert next(iter(third)) == b'large:frame0'
+
+    first.close()
+    second.close()
+    assert not stream.closed.is_set()
+    third.close()
+    # the last viewer leaving stops the stream
+    assert stream.closed.is_set()
+    assert subscribe('test:shared', lambda: None, 'small') is None
+
+
+def test_slow_viewer_drops_oldest_frames():
+    stream = FakeStream(n=10)
+    slow = subscribe('test:slow', lambda: stream, 'small', buffer_size=2)
+    stream.go.set()
+    # never read until the producer is done; only the newest two frames remain
+    slow.broadcaster._thread.join(0.5)
+    stream.close()
+    slow.broadcaster._thread.join(2)
+    assert list(slow) == [b'small:frame8', b'small:frame9']
+    assert slow.stats()['dropped'] == 8
+    slow.close()
+
+
+def test_idle_viewer_gets_last_frame_as_keepalive(monkeypatch):
+    from config import Config
+
+    monkeypatch.setattr(Config, 'STREAM_KEEPALIVE_SECONDS', 0.05)
+    # one frame, then the source stalls until closed
+    stream = FakeStream(n=1)
+    viewer = subscribe('test:keepalive', lambda: stream, 'small')
+    stream.go.set()
+    frames = iter(viewer)
+    assert [next(frames) for _ in range(3)] == [b'small:frame0'] * 3
+    assert viewer.stats()['delivered'] == 1
+    viewer.close()
+    assert stream.closed.is_set()
+
+
+def test_unopenable_source_returns_none():
+    assert subscribe('test:missing', lambda: None, 'small') is None
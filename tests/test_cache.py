@@ -0,0 +1,96 @@
+"""
+Test result caching
+"""
+import threading
+import time
+
+import pytest
+
+from core.cache import ResultCache, content_key
+
+
+def test_content_key_depends_on_fingerprint():
+    assert content_key(b'image', 'a') == content_key(b'image', 'a')
+    assert content_key(b'image', 'a') != content_key(b'image', 'b')
+
+
+def test_lru_evicts_by_bytes():
+    cache = ResultCache(max_bytes=10)
+    cache.put('a', b'12345')
+    cache.put('b', b'12345')
+    assert cache.get('a') == b'12345'  # 'a' is now most recently used
+    cache.put('c', b'12345')
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['bytes'] == 10
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    ResultCache(max_bytes=100, disk_dir=tmp_path).put('k' * 64, b'value')
+    cache = ResultCache(max_bytes=100, disk_dir=tmp_path)
+    assert cache.get('k' * 64) == b'value'
+    assert cache.stats()['disk_hits'] == 1
+
+
+def test_single_flight_computes_once():
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return b'result'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('key', compute)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [b'result'] * 5
+    stats = cache.stats()
+    assert stats['misses'] == 1 and stats['hits'] + stats['coalesced'] == 4
+
+
+def test_failed_compute_is_not_cached():
+    cache = ResultCache()
+
+    def boom():
+        raise ValueError("decode failed")
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute('key', boom)
+    assert cache.get_or_compute('key', lambda: b'ok') == b'ok'
+
+
+def test_dhash_tolerates_small_changes():
+    import numpy as np
+    from core.cache import dhash, hamming_distances
+
+    rng = np.random.default_rng(0)
+    crop = rng.integers(0, 255, size=(80, 80, 3), dtype=np.uint8)
+    noisy = np.clip(crop.astype(int) + rng.integers(-2, 3, size=crop.shape), 0, 255).astype(np.uint8)
+    other = rng.integers(0, 255, size=(80, 80, 3), dtype=np.uint8)
+
+    hashes = np.array([dhash(noisy), dhash(other)], dtype=np.uint64)
+    near, far = hamming_distances(hashes, dhash(crop))
+    assert near <= 4 < far
+
+
+def test_prediction_cache_ttl_and_hits(monkeypatch):
+    from core import cache as cache_module
+    from core.cache import PredictionCache
+
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    cache = PredictionCache(max_entries=2, ttl=1.0, max_distance=2)
+    cache.put(0b1111, (0.9, 0.1))
+    assert cache.get(0b1110) is not None      # 1 bit away
+    assert cache.get(0b1111_0000) is None     # 8 bits away
+    now[0] += 2.0
+    assert cache.get(0b1111) is None          # expired
+    assert cache.stats()['hits'] == 1
@@ -0,0 +1,63 @@
+"""
+Test threaded frame capture
+"""
+import threading
+import time
+
+import numpy as np
+
+from core.capture import FrameGrabber
+
+
+class FakeCapture:
+    """Stands in for cv2.VideoCapture producing numbered frames"""
+
+    def __init__(self, n, interval=0.0):
+        self.n = n
+        self.interval = interval
+        self.i = 0
+        self.released = threading.Event()
+
+    def set(self, prop, value):
+        return True
+
+    def read(self):
+        if self.i >= self.n:
+            return False, None
+        time.sleep(self.interval)
+        self.i += 1
+        return True, np.full((2, 2), self.i, dtype=np.uint8)
+
+    def release(self):
+        self.released.set()
+
+
+def test_latest_only_drops_stale_frames():
+    grabber = FrameGrabber(FakeCapture(50, interval=0.001), latest_only=True)
+    seen = []
+    while True:
+        ret, frame = grabber.read(timeout=2)
+        if not ret:
+            break
+        seen.append(int(frame[0, 0]))
+        time.sleep(0.01)  # slower than the camera
+    grabber.release()
+    stats = grabber.stats()
+    assert seen == sorted(seen) and seen[-1] == 50
+    assert stats['dropped'] > 0
+    assert stats['delivered'] + stats['dropped'] == stats['captured'] == 50
+
+
+def test_every_frame_mode_keeps_all_frames():
+    cap = FakeCapture(20)
+    grabber = FrameGrabber(cap, latest_only=False, max_buffered=2)
+    seen = []
+    while True:
+        ret, frame = grabber.read(timeout=2)
+        if not ret:
+            break
+        seen.append(int(frame[0, 0]))
+    grabber.release()
+    assert seen == list(range(1, 21))
+    assert grabber.stats()['dropped'] == 0
+    assert cap.released.is_set()
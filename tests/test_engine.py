@@ -0,0 +1,272 @@
+"""
+Test the shared inference engine
+"""
+import numpy as np
+import pytest
+
+from core.engine import InferenceEngine
+
+
+class FakeDetector:
+    """Stands in for a cv2.CascadeClassifier returning fixed boxes"""
+
+    def __init__(self, faces):
+        self.faces = faces
+
+    def detectMultiScale(self, gray, **kwargs):
+        return np.array(self.faces)
+
+
+class FakeModel:
+    """Stands in for the Keras classifier; records batch sizes"""
+
+    def __init__(self, probs=(0.95, 0.05)):
+        self.probs = probs
+        self.calls = []
+
+    def predict(self, batch, verbose=0):
+        self.calls.append(len(batch))
+        return np.tile(np.array(self.probs, dtype=np.float32), (len(batch), 1))
+
+
+@pytest.fixture
+def frame():
+    return np.random.randint(0, 255, (300, 400, 3), dtype=np.uint8)
+
+
+def test_engine_loads_lazily():
+    engine = InferenceEngine(model=FakeModel(), face_detector=FakeDetector([]))
+    assert engine.status == 'not_loaded'
+    engine.load()
+    assert engine.status == 'loaded'
+
+
+def test_engine_classifies_all_faces_in_one_batch(frame):
+    model = FakeModel()
+    engine = InferenceEngine(model=model, face_detector=FakeDetector([(10, 10, 60, 60), (150, 40, 80, 80)]))
+    results = engine.detect(frame)
+    assert model.calls == [2]
+    assert results.labels == ['Mask', 'Mask']
+    assert results.boxes.shape == (2, 4)
+
+
+def test_engine_process_returns_display_sized_copy(frame):
+    engine = InferenceEngine(model=FakeModel(), face_detector=FakeDetector([(10, 10, 60, 60)]))
+    annotated = engine.process(frame, width=200)
+    assert annotated.shape == (150, 200, 3)
+    assert annotated is not frame
+
+
+def test_engine_falls_back_without_model(frame, tmp_path):
+    engine = InferenceEngine(model_path=tmp_path / 'missing.h5', face_detector=FakeDetector([(10, 10, 60, 60)]))
+    results = engine.detect(frame)
+    assert engine.status == 'fallback'
+    assert results[0].label is None
+
+
+def test_micro_batcher_coalesces_concurrent_requests():
+    import threading
+    from core.batching import MicroBatcher
+
+    model = FakeModel()
+    batcher = MicroBatcher(lambda x: model.predict(x), max_batch_size=8, max_wait_ms=200)
+    results = {}
+
+    def worker(i):
+        results[i] = batcher.predict(np.full((2, 4), i, dtype=np.float32))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+
+    assert sum(model.calls) == 8
+    assert len(model.calls) < 4
+    assert all(r.shape == (2, 2) for r in results.values())
+    stats = batcher.stats()
+    assert stats['faces'] == 8 and stats['queue_depth'] == 0
+
+
+def test_micro_batcher_propagates_errors():
+    from core.batching import MicroBatcher
+
+    def boom(x):
+        raise ValueError("bad batch")
+
+    batcher = MicroBatcher(boom, max_batch_size=4, max_wait_ms=0)
+    with pytest.raises(ValueError):
+        batcher.predict(np.zeros((1, 4)))
+    batcher.close()
+
+
+@pytest.mark.parametrize("mode", ["raw", "none", "mobilenet_v2"])
+def test_face_batch_buffer_matches_per_face_preprocessing(frame, mode):
+    from core.utils import FaceBatchBuffer, preprocess_face_frame
+
+    rects = [(10, 10, 60, 80), (150, 40, 90, 70), (0, 0, 30, 30)]
+    buffer = FaceBatchBuffer(max_faces=2)
+    batch = buffer.fill(frame, rects, mode=mode)
+    expected = np.stack([preprocess_face_frame(frame[y:y + h, x:x + w], mode=mode) for (x, y, w, h) in rects])
+    assert batch.shape == (3, 224, 224, 3)
+    np.testing.assert_allclose(batch, expected, atol=1e-5)
+
+
+def test_face_batch_buffer_grows_on_demand(frame):
+    from core.utils import FaceBatchBuffer
+
+    buffer = FaceBatchBuffer()
+    assert buffer.capacity == 0
+    assert buffer.fill(frame, [(10, 10, 60, 60)], mode='raw').shape == (1, 224, 224, 3)
+    assert buffer.capacity == 1
+    buffer.fill(frame, [(10, 10, 60, 60)] * 5, mode='raw')
+    assert buffer.capacity == 8
+    buffer.fill(frame, [(10, 10, 60, 60)] * 2, mode='raw')
+    assert buffer.capacity == 8
+
+
+def test_engine_prediction_cache_skips_repeat_crops(frame):
+    from core.cache import PredictionCache
+
+    model = FakeModel()
+    engine = InferenceEngine(model=model, face_detector=FakeDetector([(10, 10, 60, 60)]),
+                             batching=False, prediction_cache=PredictionCache())
+    engine.detect(frame)
+    engine.detect(frame)
+    assert model.calls == [1]
+    assert engine.stats()['prediction_cache']['hits'] == 1
+
+
+def test_engine_fingerprint_follows_model_weights(tmp_path, monkeypatch):
+    from config import Config
+
+    model_loader = pytest.importorskip("core.model_loader")
+    monkeypatch.setattr(model_loader, 'load_mask_model', lambda path, **kwargs: FakeModel())
+    monkeypatch.setattr(Config, 'FAST_INFERENCE', False)
+    monkeypatch.delenv('MASK_MODEL_PATH', raising=False)
+    weights = tmp_path / 'mask.h5'
+
+    def fingerprint():
+        return InferenceEngine(model_path=weights, face_detector=FakeDetector([]), batching=False).fingerprint()
+
+    weights.write_bytes(b'weights v1')
+    first = fingerprint()
+    assert first == fingerprint()
+    # new weights deployed at the same path
+    weights.write_bytes(b'weights v2')
+    assert fingerprint() != first
+
+
+def test_engine_background_warmup_runs_every_bucket():
+    model = FakeModel()
+    engine = InferenceEngine(model=model, face_detector=FakeDetector([]), batching=False)
+    assert engine.readiness == 'idle'
+    engine.start_warmup()
+    assert engine.wait_until_ready(timeout=10)
+    assert engine.readiness == 'ready'
+    assert model.calls == [1, 2, 4, 8, 16, 32]
+    assert engine.start_warmup() is not None and model.calls == [1, 2, 4, 8, 16, 32]
+
+
+def test_engine_warmup_reports_degraded_and_failed_loads(tmp_path):
+    engine = InferenceEngine(model_path=tmp_path / 'missing.h5', face_detector=FakeDetector([]), batching=False)
+    engine.start_warmup()
+    assert not engine.wait_until_ready(timeout=10)
+    assert engine.readiness == 'degraded' and not engine.is_ready
+    assert engine.wait_until_ready(timeout=0, allow_degraded=True)
+
+    def broken_load():
+        raise RuntimeError("cannot load")
+
+    engine = InferenceEngine(model=FakeModel(), face_detector=FakeDetector([]), batching=False)
+    engine.load = broken_load
+    engine.start_warmup()
+    assert not engine.wait_until_ready(timeout=10, allow_degraded=True)
+    assert engine.readiness == 'failed' and engine.load_error == 'cannot load'
+
+
+def test_engine_detects_downscaled_and_crops_full_resolution(monkeypatch):
+    from config import Config
+    from core import engine as engine_module
+
+    class RecordingDetector(FakeDetector):
+        def detectMultiScale(self, gray, **kwargs):
+            self.shape = gray.shape
+            return super().detectMultiScale(gray, **kwargs)
+
+    monkeypatch.setattr(Config, 'DETECTION_WIDTH', 320)
+    monkeypatch.setattr(engine_module, 'FACE_CROP_MARGIN', 0.0)
+    detector = RecordingDetector([(32, 32, 64, 64)])
+    engine = InferenceEngine(model=FakeModel(), face_detector=detector, batching=False)
+    image = np.zeros((960, 1280, 3), dtype=np.uint8)
+
+    detections = engine.detect(image)
+    assert detector.shape == (240, 320)
+    np.testing.assert_array_equal(detections.boxes, [[128, 128, 256, 256]])
+
+    annotated = engine.process(image, width=640)
+    assert annotated.shape == (480, 640, 3)
+
+
+def test_engine_tracker_skips_detector_between_keyframes(frame):
+    from core.tracking import FaceTracker
+
+    class CountingDetector(FakeDetector):
+        calls = 0
+
+        def detectMultiScale(self, gray, **kwargs):
+            CountingDetector.calls += 1
+            return super().detectMultiScale(gray, **kwargs)
+
+    model = FakeModel()
+    engine = InferenceEngine(model=model, face_detector=CountingDetector([(100, 50, 80, 80)]), batching=False)
+    tracker = FaceTracker(keyframe_interval=4)
+    for _ in range(8):
+        assert len(engine.detect(frame, tracker=tracker)) == 1
+    assert CountingDetector.calls == 2
+    # static confident face: classified once, then reused from the track until max_age
+    assert model.calls == [1]
+    assert tracker.stats()['reused'] == 7
+
+
+def test_engine_min_face_size_is_kept_in_input_pixels(monkeypatch):
+    from config import Config
+    from core import engine as engine_module
+
+    class MinSizeDetector:
+        """Cascade stand-in that honours minSize like detectMultiScale"""
+
+        def __init__(self, faces):
+            self.faces = np.array(faces).reshape(-1, 4)
+
+        def detectMultiScale(self, gray, **kwargs):
+            min_w, min_h = kwargs['minSize']
+            return self.faces[(self.faces[:, 2] >= min_w) & (self.faces[:, 3] >= min_h)]
+
+    monkeypatch.setattr(Config, 'DETECTION_WIDTH', 320)
+    monkeypatch.setattr(Config, 'DETECTOR_MIN_SIZE', 40)
+    monkeypatch.setattr(engine_module, 'FACE_CROP_MARGIN', 0.0)
+    image = np.zeros((960, 1280, 3), dtype=np.uint8)
+    # detection frame is 1/4 size: 11 px = 44 px faces in the input, 9 px = 36 px
+    engine = InferenceEngine(model=FakeModel(), face_detector=MinSizeDetector([(8, 8, 11, 11), (100, 8, 9, 9)]),
+                             batching=False)
+    np.testing.assert_array_equal(engine.detect_faces(image), [[32, 32, 44, 44]])
+
+
+@pytest.mark.parametrize("tracking", [False, True])
+def test_engine_drops_boxes_collapsed_at_image_edge(frame, monkeypatch, tracking):
+    from config import Config
+    from core import engine as engine_module
+    from core.tracking import FaceTracker
+
+    monkeypatch.setattr(Config, 'DETECTION_WIDTH', 0)
+    monkeypatch.setattr(engine_module, 'FACE_CROP_MARGIN', 0.0)
+    # second box starts at the right edge of the 400 px frame: nothing left after clipping
+    engine = InferenceEngine(model=FakeModel(), face_detector=FakeDetector([(10, 10, 60, 60), (400, 10, 20, 20)]),
+                             batching=False)
+    tracker = FaceTracker() if tracking else None
+    for _ in range(3):
+        detections = engine.detect(frame, tracker=tracker)
+        np.testing.assert_array_equal(detections.boxes, [[10, 10, 60, 60]])
+        assert detections.labels == ['Mask']
@@ -0,0 +1,71 @@
+"""
+Test the pluggable face detectors
+"""
+import numpy as np
+import pytest
+
+from config import Config
+from core.exceptions import ModelLoadError
+from core.face_detectors import CascadeFaceDetector, as_face_detector, create_face_detector
+
+
+def test_haar_detector_returns_common_box_format():
+    detector = create_face_detector('haar')
+    boxes = detector.detect(np.zeros((120, 160, 3), dtype=np.uint8))
+    assert detector.name == 'haar'
+    assert boxes.dtype == np.int32 and boxes.shape == (0, 4)
+
+
+def test_bare_cascade_is_wrapped():
+    class Cascade:
+        def detectMultiScale(self, gray, **kwargs):
+            assert gray.ndim == 2 and kwargs['minSize'] == (Config.DETECTOR_MIN_SIZE,) * 2
+            return [(1, 2, 3, 4)]
+
+    detector = as_face_detector(Cascade())
+    assert isinstance(detector, CascadeFaceDetector)
+    np.testing.assert_array_equal(detector.detect(np.zeros((10, 10, 3), dtype=np.uint8)), [[1, 2, 3, 4]])
+
+
+def test_unknown_and_missing_detectors(tmp_path):
+    with pytest.raises(ValueError):
+        create_face_detector('mtcnn')
+    for name in ('lbp', 'yunet', 'ssd'):
+        with pytest.raises(ModelLoadError):
+            create_face_detector(name, model_path=tmp_path / 'missing.bin')
+
+
+def test_engine_falls_back_to_haar(monkeypatch):
+    from core.engine import InferenceEngine
+
+    monkeypatch.setattr(Config, 'FACE_DETECTOR', 'yunet')
+    monkeypatch.setattr(Config, 'FACE_DETECTOR_MODEL', '/nonexistent/yunet.onnx')
+    engine = InferenceEngine(model=object())
+    assert engine.face_detector.name == 'haar'
+
+
+def test_detector_settings_change_engine_fingerprint(monkeypatch):
+    from core.engine import InferenceEngine
+
+    def fingerprint():
+        return InferenceEngine(model=object(), face_detector=create_face_detector('haar')).fingerprint()
+
+    first = fingerprint()
+    assert first == fingerprint()
+    monkeypatch.setattr(Config, 'DETECTOR_MIN_NEIGHBORS', Config.DETECTOR_MIN_NEIGHBORS + 1)
+    assert fingerprint() != first
+
+
+def test_detect_downscaled_maps_boxes_to_input(monkeypatch):
+    from core.face_detectors import detect_downscaled
+
+    class Cascade:
+        def detectMultiScale(self, gray, **kwargs):
+            self.shape = gray.shape
+            return [(10, 20, 30, 40)]
+
+    monkeypatch.setattr(Config, 'DETECTION_WIDTH', 320)
+    cascade = Cascade()
+    boxes = detect_downscaled(as_face_detector(cascade), np.zeros((480, 1280, 3), dtype=np.uint8))
+    assert cascade.shape == (120, 320)
+    np.testing.assert_array_equal(boxes, [[40, 80, 120, 160]])
@@ -0,0 +1,55 @@
+"""
+Test the directory image batch CLI
+"""
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from core.engine import InferenceEngine, get_engine, set_engine
+from core.image_batch import collect_images, main
+from tests.test_engine import FakeDetector, FakeModel
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+    folder = tmp_path / 'snapshots'
+    (folder / 'kiosk2').mkdir(parents=True)
+    for i in range(3):
+        cv2.imwrite(str(folder / f'img{i}.jpg'), np.random.randint(0, 255, (120, 160, 3), dtype=np.uint8))
+    cv2.imwrite(str(folder / 'kiosk2' / 'img3.png'), np.random.randint(0, 255, (90, 100, 3), dtype=np.uint8))
+    (folder / 'broken.jpg').write_bytes(b'not an image')
+    (folder / 'notes.txt').write_text('skip me')
+    return folder
+
+
+@pytest.fixture
+def model():
+    model = FakeModel()
+    previous = get_engine()
+    set_engine(InferenceEngine(model=model, face_detector=FakeDetector([(10, 10, 40, 40)]), batching=False))
+    yield model
+    set_engine(previous)
+
+
+def test_batch_writes_results_and_resumes(snapshots, model, tmp_path):
+    results = tmp_path / 'results.jsonl'
+    out = tmp_path / 'annotated'
+    stats = main([str(snapshots), '--results', str(results), '--output-dir', str(out), '--batch-images', '2'])
+    assert (stats['processed'], stats['failed'], stats['faces']) == (4, 1, 4)
+    # crops of both readable images in a window go through one call
+    assert sum(model.calls) == 4 and max(model.calls) == 2
+    records = [json.loads(line) for line in results.read_text().splitlines()]
+    assert len(records) == 5
+    assert (out / 'kiosk2' / 'img3_mask_detected.png').exists()
+    assert next(r for r in records if r['path'].endswith('broken.jpg'))['error'] == 'unreadable image'
+
+    stats = main([str(snapshots), '--results', str(results), '--no-annotate'])
+    assert (stats['processed'], stats['skipped']) == (0, 5)
+
+
+def test_annotated_outputs_are_not_inputs(snapshots, model):
+    main([str(snapshots / '*.jpg'), '--results', str(snapshots / 'r.jsonl')])
+    assert (snapshots / 'img0_mask_detected.png').exists()
+    assert not any('_mask_detected' in p for p in collect_images(str(snapshots)))
@@ -0,0 +1,16 @@
+"""
+Test the web app's cold-start import budget
+"""
+import os
+
+from core.performance import HEAVY_MODULES, import_time_report
+
+# Generous default for CI runners; importing TensorFlow alone costs several seconds
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 2000))
+
+
+def test_app_import_is_tensorflow_free_and_within_budget():
+    report = import_time_report("from app import create_app; create_app('testing')")
+    heavy = [m for m in HEAVY_MODULES if m in report['packages']]
+    assert heavy == [], f"imported eagerly: {heavy}"
+    assert report['total_ms'] < IMPORT_BUDGET_MS, report['modules'][:10]
@@ -0,0 +1,159 @@
+"""
+Test model loading and the inference fast paths
+"""
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from tensorflow import keras
+from tensorflow.keras import layers
+
+from core.model_loader import BucketedPredictor, bucket_size
+
+
+@pytest.fixture(scope="module")
+def tiny_model():
+    """Small stand-in with the same input/output contract as the mask classifier"""
+    inputs = keras.Input(shape=(224, 224, 3), name="input_layer_1")
+    x = layers.Rescaling(1.0 / 127.5, offset=-1.0, name="preprocessing")(inputs)
+    x = layers.Conv2D(4, 3, strides=4, name="conv")(x)
+    x = layers.GlobalAveragePooling2D(name="global_average_pooling2d")(x)
+    outputs = layers.Dense(2, activation="softmax", name="dense_1")(x)
+    return keras.Model(inputs, outputs, name="tiny_mask_model")
+
+
+@pytest.fixture(scope="module")
+def sample_faces():
+    rng = np.random.default_rng(42)
+    return rng.uniform(0, 255, size=(11, 224, 224, 3)).astype(np.float32)
+
+
+def test_bucket_size():
+    assert [bucket_size(n, 16) for n in (1, 2, 3, 5, 9, 16, 40)] == [1, 2, 4, 8, 16, 16, 16]
+
+
+def test_bucketed_predictor_matches_keras(tiny_model, sample_faces):
+    fast = BucketedPredictor(tiny_model, max_bucket=8)
+    for n in (1, 3, 8, 11):
+        expected = tiny_model.predict(sample_faces[:n], verbose=0)
+        np.testing.assert_allclose(fast.predict(sample_faces[:n]), expected, atol=1e-5)
+    # 1 -> 1, 3 -> 4, 8 -> 8, 11 -> 8 + 4: three buckets traced, each once
+    assert fast.trace_count == 3
+
+
+def test_tflite_backend_matches_keras_labels(tiny_model, sample_faces, tmp_path):
+    """Labels decoded from the TFLite backend agree with the Keras backend"""
+    from core.model_loader import load_mask_model
+    from core.utils import decode_prediction
+
+    h5_path = tmp_path / "tiny.h5"
+    tiny_model.save(h5_path)
+
+    tflite = load_mask_model(h5_path, backend="tflite", num_threads=1)
+    assert tflite is not None
+    assert (tmp_path / "tiny.tflite").exists()
+
+    keras_preds = tiny_model.predict(sample_faces, verbose=0)
+    tflite_preds = tflite.predict(sample_faces)
+    np.testing.assert_allclose(tflite_preds, keras_preds, atol=1e-4)
+    assert [decode_prediction(p)[0] for p in tflite_preds] == [decode_prediction(p)[0] for p in keras_preds]
+
+
+def test_unknown_backend_returns_none(tmp_path):
+    from core.model_loader import load_mask_model
+
+    assert load_mask_model(tmp_path / "missing.h5", backend="bogus") is None
+
+
+def test_onnx_backend_matches_keras(tiny_model, sample_faces, tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("tf2onnx")
+    from core.model_loader import load_mask_model
+
+    h5_path = tmp_path / "tiny.h5"
+    tiny_model.save(h5_path)
+
+    onnx = load_mask_model(h5_path, backend="onnx", num_threads=1, inter_op_threads=1,
+                           graph_optimization="extended")
+    assert onnx is not None
+    np.testing.assert_allclose(onnx.predict(sample_faces), tiny_model.predict(sample_faces, verbose=0), atol=1e-4)
+
+
+def test_h5_load_persists_normalized_artifact(tiny_model, sample_faces, tmp_path, capsys):
+    from core.backends import read_manifest
+    from core.model_loader import load_mask_model, normalized_artifact_path
+
+    h5_path = tmp_path / "tiny.h5"
+    tiny_model.save(h5_path)
+    first = load_mask_model(h5_path)
+    artifact = normalized_artifact_path(h5_path)
+    manifest = read_manifest(artifact)
+    assert artifact.exists()
+    assert manifest["strategy"] == "keras"
+    assert manifest["classes"] == 2 and manifest["input_shape"] == [224, 224, 3]
+    assert manifest["normalizes_input"] is True
+
+    capsys.readouterr()
+    second = load_mask_model(h5_path)
+    assert "Loaded normalized model artifact" in capsys.readouterr().out
+    np.testing.assert_allclose(second.predict(sample_faces, verbose=0),
+                               first.predict(sample_faces, verbose=0), atol=1e-6)
+
+    # A changed source invalidates the artifact
+    keras.Model(tiny_model.inputs, tiny_model.outputs).save(h5_path)
+    load_mask_model(h5_path)
+    assert "Loaded normalized model artifact" not in capsys.readouterr().out
+
+
+def test_compat_model_normalization_is_detected(tiny_model):
+    from core.model_loader import host_preprocess_mode, model_normalizes_input
+
+    assert model_normalizes_input(tiny_model)
+    assert host_preprocess_mode(tiny_model) == "none"
+
+
+@pytest.mark.parametrize("fmt", ["savedmodel", "tflite", "onnx"])
+def test_uint8_serving_export_matches_host_preprocessing(tiny_model, tmp_path, fmt):
+    import cv2
+    from core.model_loader import export_serving_model, host_preprocess_mode, load_mask_model
+    from core.utils import preprocess_face_frame
+
+    if fmt == "onnx":
+        pytest.importorskip("onnxruntime")
+        pytest.importorskip("tf2onnx")
+    output = tmp_path / ("serving" if fmt == "savedmodel" else f"serving.{fmt}")
+    export_serving_model(tiny_model, output, fmt=fmt)
+    serving = load_mask_model(output, backend="keras" if fmt == "savedmodel" else fmt)
+    assert host_preprocess_mode(serving) == "raw"
+
+    rng = np.random.default_rng(0)
+    crops = [rng.integers(0, 255, size=(90, 70, 3), dtype=np.uint8) for _ in range(3)]
+    raw = np.stack([preprocess_face_frame(c, mode="raw") for c in crops])
+    host = np.stack([preprocess_face_frame(c, mode="none") for c in crops])
+    assert raw.dtype == np.uint8
+    np.testing.assert_allclose(serving.predict(raw), tiny_model.predict(host, verbose=0), atol=1e-4)
+
+
+def test_converted_artifact_follows_source_hash_not_mtime(tmp_path, monkeypatch):
+    import os
+
+    from core import backends
+
+    converted = []
+    monkeypatch.setattr(backends, "convert_to_tflite", lambda model, path: converted.append(path) or path.write_bytes(b"x"))
+    monkeypatch.setattr(backends, "TFLiteClassifier", lambda path, num_threads=None: path)
+    monkeypatch.setattr(backends, "model_normalizes_input", lambda model: True)
+    source = tmp_path / "mask.h5"
+
+    source.write_bytes(b"weights v1")
+    backends.load_tflite_classifier(source, keras_loader=lambda path: object())
+    backends.load_tflite_classifier(source, keras_loader=lambda path: object())
+    assert len(converted) == 1
+
+    # redeployed weights with an older mtime than the artifact are still picked up
+    source.write_bytes(b"weights v2")
+    os.utime(source, (0, 0))
+    backends.load_tflite_classifier(source, keras_loader=lambda path: object())
+    assert len(converted) == 2
+    assert backends.read_manifest(tmp_path / "mask.tflite")["source_sha256"] == backends.file_sha256(source)
@@ -0,0 +1,104 @@
+"""
+Test the staged video pipeline
+"""
+import time
+
+import numpy as np
+
+from core.capture import FrameGrabber
+from core.detections import Detections
+from core.encoding import FrameEncoder, stream_settings
+from core.pipeline import VideoPipeline, pipeline_stats
+from tests.test_capture import FakeCapture
+
+
+class SlowEngine:
+    """Engine stand-in whose stages each take ``delay`` seconds"""
+
+    def __init__(self, delay=0.0, fail_on=None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.classified = []
+
+    def locate_faces(self, image, tracker=None):
+        time.sleep(self.delay)
+        return np.array([[0, 0, 1, 1]], dtype=np.int32), None
+
+    def classify_detections(self, image, rects, track_ids=None, tracker=None):
+        time.sleep(self.delay)
+        if self.fail_on == int(image[0, 0]):
+            raise RuntimeError("classifier failed")
+        self.classified.append(int(image[0, 0]))
+        return Detections(rects, [0], [0.9])
+
+    def annotate(self, image, detections, width=None, out=None):
+        time.sleep(self.delay)
+        out[...] = image[0, 0]
+        return out
+
+
+def test_pipeline_keeps_every_frame_in_order():
+    engine = SlowEngine()
+    pipeline = VideoPipeline(FrameGrabber(FakeCapture(12), latest_only=False), engine)
+    chunks = list(pipeline)
+    pipeline.close()
+    assert len(chunks) == 12
+    assert all(c.startswith(b'--frame\r\nContent-Type: image/jpeg\r\n') for c in chunks)
+    assert engine.classified == list(range(1, 13))
+    assert pipeline.stats()['frames'] == {'detect': 12, 'classify': 12, 'encode': 12}
+
+
+def test_pipeline_stages_overlap():
+    n, delay = 20, 0.03
+    pipeline = VideoPipeline(FrameGrabber(FakeCapture(n), latest_only=False), SlowEngine(delay))
+    start = time.perf_counter()
+    assert len(list(pipeline)) == n
+    elapsed = time.perf_counter() - start
+    pipeline.close()
+    # sequential stages would take 3 * n * delay
+    assert elapsed < 2 * n * delay
+
+
+def test_pipeline_stage_failure_ends_stream_and_unregisters():
+    streams = pipeline_stats()['streams']
+    capture = FakeCapture(100)
+    pipeline = VideoPipeline(FrameGrabber(capture, latest_only=False), SlowEngine(fail_on=5))
+    assert pipeline_stats()['streams'] == streams + 1
+    assert len(list(pipeline)) <= 4
+    pipeline.close()
+    assert capture.released.is_set()
+    assert pipeline_stats()['streams'] == streams
+
+
+def test_frame_encoder_skips_unchanged_and_throttled_frames():
+    engine = SlowEngine()
+    frame = np.full((2, 2), 7, dtype=np.uint8)
+    encoder = FrameEncoder(stream_settings(width=64, quality=50, max_fps=0))
+    assert encoder.encode(engine, frame, None).startswith(b'--frame\r\n')
+    assert encoder.encode(engine, frame, None) is None
+    assert encoder.encode(engine, frame + 1, None) is not None
+    assert encoder.stats() == {'encoded': 2, 'throttled': 0, 'unchanged': 1}
+
+    throttled = FrameEncoder(stream_settings(width=64, max_fps=1))
+    assert throttled.encode(engine, frame, None) is not None
+    assert throttled.encode(engine, frame + 1, None) is None
+    assert throttled.stats()['throttled'] == 1
+
+
+def test_frame_encoder_resends_last_chunk_of_a_static_scene(monkeypatch):
+    from config import Config
+
+    monkeypatch.setattr(Config, 'STREAM_KEEPALIVE_SECONDS', 0.05)
+    engine = SlowEngine()
+    frame = np.full((2, 2), 7, dtype=np.uint8)
+    encoder = FrameEncoder(stream_settings(width=64, quality=50, max_fps=0))
+    first = encoder.encode(engine, frame, None)
+    assert encoder.encode(engine, frame, None) is None
+    time.sleep(0.06)
+    assert encoder.encode(engine, frame, None) == first
+    assert encoder.encode(engine, frame, None) is None
+    assert encoder.stats()['encoded'] == 1
+
+
+def test_stream_settings_are_clamped():
+    assert stream_settings(width=10, quality=500, max_fps=-1) == (64, 100, 0.0)
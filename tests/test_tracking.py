@@ -0,0 +1,98 @@
+"""
+Test keyframe face tracking
+"""
+import cv2
+import numpy as np
+
+from core.tracking import FaceTracker, greedy_match, iou_matrix
+
+
+def textured_frame(offset_x=0, offset_y=0):
+    """Gray frame with a textured 'face' patch at (100 + offset_x, 80 + offset_y)"""
+    rng = np.random.default_rng(0)
+    patch = cv2.GaussianBlur(rng.integers(0, 255, (80, 80), dtype=np.uint8), (5, 5), 0)
+    frame = np.full((240, 320), 40, dtype=np.uint8)
+    y, x = 80 + offset_y, 100 + offset_x
+    frame[y:y + 80, x:x + 80] = patch
+    return frame
+
+
+def test_iou_and_greedy_match():
+    ious = iou_matrix([(0, 0, 10, 10), (50, 50, 10, 10)], [(52, 50, 10, 10), (0, 0, 10, 10)])
+    assert ious[0, 1] == 1.0 and ious[1, 1] == 0.0
+    rows, cols = greedy_match(ious, 0.3)
+    assert list(zip(rows, cols)) == [(0, 1), (1, 0)]
+
+
+def test_tracker_detects_on_keyframes_and_follows_motion():
+    calls = []
+
+    def detect():
+        calls.append(1)
+        return [(100 + 3 * (len(calls) - 1) * 5, 80, 80, 80)]
+
+    tracker = FaceTracker(keyframe_interval=5)
+    for i in range(10):
+        boxes, ids = tracker.update(textured_frame(offset_x=3 * i), detect)
+        assert list(ids) == [0]
+        # optical flow keeps the box on the moving patch between keyframes
+        assert abs(boxes[0, 0] - (100 + 3 * i)) <= 2
+    assert len(calls) == 2
+    assert tracker.stats()['detector_call_ratio'] == 0.2
+
+
+def test_tracker_redetects_when_track_is_lost():
+    calls = []
+    tracker = FaceTracker(keyframe_interval=100)
+    tracker.update(textured_frame(), lambda: calls.append(1) or [(100, 80, 80, 80)])
+    # the patch disappears: the track is lost and the detector runs immediately
+    boxes, ids = tracker.update(np.full((240, 320), 40, dtype=np.uint8), lambda: calls.append(1) or [])
+    assert len(calls) == 2 and len(boxes) == 0
+
+
+def test_track_probabilities_are_smoothed_and_reused():
+    frame = cv2.GaussianBlur(np.random.default_rng(1).integers(0, 255, (240, 320), dtype=np.uint8), (5, 5), 0)
+    tracker = FaceTracker(keyframe_interval=100, ema_alpha=0.5, max_age=3, max_hash_distance=4, ambiguous_gap=0.2)
+    _, ids = tracker.update(frame, lambda: [(100, 80, 80, 80), (10, 10, 60, 60)])
+    hashes = [0b1111, 0]
+
+    stale = tracker.stale(ids, hashes)
+    assert stale.tolist() == [True, True]
+    tracker.update_probabilities(ids, stale, [(0.9, 0.1), (0.55, 0.45)], hashes)
+
+    tracker.update(frame, lambda: [])
+    # confident + same crop -> reused; ambiguous -> re-classified
+    stale = tracker.stale(ids, [0b1111, 0])
+    assert stale.tolist() == [False, True]
+    probs = tracker.update_probabilities(ids, stale, [(0.95, 0.05)], [0b1111, 0])
+    np.testing.assert_allclose(probs, [(0.9, 0.1), (0.75, 0.25)])
+
+    # crop drift beyond the Hamming distance forces a new classification
+    assert tracker.stale(ids, [0b1111 ^ 0xFFFF, 0]).tolist() == [True, False]
+
+
+def test_track_probabilities_follow_ids_across_updates():
+    tracker = FaceTracker(keyframe_interval=1, ambiguous_gap=0.2)
+    _, ids = tracker.update(textured_frame(), lambda: [(100, 80, 80, 80), (10, 10, 60, 60)])
+    # the tracker moves on (second face gone) before this frame is classified
+    tracker.update(textured_frame(), lambda: [(100, 80, 80, 80)])
+    stale = tracker.stale(ids, [0, 0])
+    probs = tracker.update_probabilities(ids, stale, [(0.9, 0.1), (0.2, 0.8)], [0, 0])
+    np.testing.assert_allclose(probs, [(0.9, 0.1), (0.2, 0.8)])
+    # only the surviving track keeps state
+    assert tracker.stale(ids[:1], [0]).tolist() == [False]
+
+
+def test_tracker_drops_collapsed_boxes():
+    frame = textured_frame()
+    tracker = FaceTracker(keyframe_interval=100)
+    # a detection without area never becomes a track
+    boxes, ids = tracker.update(frame, lambda: [(100, 80, 80, 80), (319.8, 80, 0.2, 80)])
+    assert len(boxes) == 1 and list(ids) == [0]
+
+    # a track pushed off the frame edge collapses and is lost, which forces a keyframe
+    tracker = FaceTracker(keyframe_interval=100)
+    tracker.update(frame, lambda: [(319, 80, 1, 80)])
+    calls = []
+    boxes, _ = tracker.update(textured_frame(offset_x=2), lambda: calls.append(1) or [])
+    assert tracker.stats()['lost'] == 1 and calls == [1] and len(boxes) == 0
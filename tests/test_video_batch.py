@@ -0,0 +1,60 @@
+"""
+Test the offline video batch CLI
+"""
+import csv
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from core.engine import InferenceEngine, get_engine, set_engine
+from core.video_batch import main, process_video, split_segments
+from tests.test_engine import FakeDetector, FakeModel
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = tmp_path / 'clip.avi'
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 10, (200, 150))
+    for _ in range(10):
+        writer.write(np.random.randint(0, 255, (150, 200, 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def model():
+    model = FakeModel()
+    previous = get_engine()
+    set_engine(InferenceEngine(model=model, face_detector=FakeDetector([(20, 20, 60, 60)]), batching=False))
+    yield model
+    set_engine(previous)
+
+
+def test_split_segments_cover_every_frame():
+    assert split_segments(10, 3) == [(0, 3), (3, 6), (6, 10)]
+    assert split_segments(2, 4) == [(0, 1), (1, 2)]
+
+
+def test_crops_are_classified_across_frames(clip, model, tmp_path):
+    output, log = tmp_path / 'out.avi', tmp_path / 'log.csv'
+    report = process_video(str(clip), output=str(output), log=str(log), batch_frames=4, fourcc='MJPG')
+    assert report['frames'] == 10 and report['faces'] == 10
+    # one forward pass per window of frames
+    assert model.calls == [4, 4, 2]
+    cap = cv2.VideoCapture(str(output))
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == 10
+    cap.release()
+    with open(log) as f:
+        rows = list(csv.DictReader(f))
+    assert [int(r['frame']) for r in rows] == list(range(10))
+    assert rows[0]['label'] == 'Mask'
+
+
+def test_parallel_segments_are_merged_in_order(clip, model, tmp_path):
+    log = tmp_path / 'log.json'
+    report = main([str(clip), '--no-video', '--log', str(log), '--workers', '3'])
+    assert report['segments'] == 3
+    records = json.loads(log.read_text())
+    assert [r['frame'] for r in records] == list(range(10))